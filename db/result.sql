@@ -50,66 +50,222 @@ CREATE TABLE microplates.image_file (
     created_at TIMESTAMPTZ   NOT NULL DEFAULT NOW()
 );
 
+-- 5.1 Result cache index: sha256(image):sample_no:model_version:thresholds -> run
+CREATE TABLE microplates.prediction_cache (
+    id         SERIAL        PRIMARY KEY,
+    cache_key  TEXT          NOT NULL,
+    run_id     INTEGER       NOT NULL REFERENCES microplates.prediction_run(id) ON DELETE CASCADE,
+    created_at TIMESTAMPTZ   NOT NULL DEFAULT NOW()
+);
+
 -- 6. ตารางเก็บผลสรุปตาม sample_no
 CREATE TABLE IF NOT EXISTS microplates.sample_summary (
   sample_no TEXT PRIMARY KEY,
   summary    JSONB NOT NULL  -- จะเก็บ {"distribution": {...}}
 );
 
--- 7. Function PL/pgSQL สำหรับ upsert สรุป
+-- 7. Incremental maintenance ของ sample_summary
+--    แต่ละ trigger บวก/ลบเฉพาะ distribution ของแถวที่เปลี่ยน แทนการรวมทุก run ของ sample ใหม่ทุกครั้ง
+--    (ส่วนที่ 7-9 รันซ้ำได้: ใช้ migrate ฐานข้อมูลเดิม แล้วรัน
+--     SELECT microplates.fn_rebuild_sample_summary(); หนึ่งครั้ง)
+
+-- 7.1 บวก dist * sign เข้า summary ของ s_no (sign = 1 เพิ่ม, -1 ลบ)
+--     เก็บทุก key รวมถึงยอด 0 (เหมือนการรวมใหม่ทั้งหมด); ตอนลบ (sign = -1) key ถูกตัดออกเฉพาะเมื่อไม่มีผลที่เหลือ
+--     ของ sample ที่มี key นั้น และแถวถูกลบเมื่อ sample ไม่เหลือผลเลย (p_skip_run: run ที่กำลังถูกลบ)
+--     SELECT ... FOR UPDATE ล็อกแถวของ sample ไว้ จึงปลอดภัยเมื่อมีหลาย run ของ sample เดียวกันเขียนพร้อมกัน
+DROP FUNCTION IF EXISTS microplates.fn_add_distribution(TEXT, JSONB, INTEGER);
+CREATE OR REPLACE FUNCTION microplates.fn_add_distribution(
+  s_no TEXT, dist JSONB, sign INTEGER, p_skip_run INTEGER DEFAULT NULL)
+RETURNS VOID AS $$
+DECLARE
+  cur       JSONB;
+  merged    JSONB;
+  remaining JSONB[];
+BEGIN
+  IF s_no IS NULL OR dist IS NULL OR jsonb_typeof(dist) <> 'object' THEN
+    RETURN;
+  END IF;
+
+  -- ล็อกแถวเดิม หรือสร้างแถวว่างแล้วล็อก (วนใหม่ถ้าแถวถูกลบ/สร้างโดย transaction อื่นระหว่างนั้น)
+  LOOP
+    SELECT ss.summary->'distribution' INTO cur
+    FROM microplates.sample_summary ss
+    WHERE ss.sample_no = s_no
+    FOR UPDATE;
+    EXIT WHEN FOUND;
+    INSERT INTO microplates.sample_summary (sample_no, summary)
+    VALUES (s_no, jsonb_build_object('distribution', '{}'::jsonb))
+    ON CONFLICT (sample_no) DO NOTHING;
+  END LOOP;
+
+  IF sign < 0 THEN
+    -- distribution ของผลที่ยังเหลืออยู่ของ sample (หลังการลบ/ย้ายนี้)
+    SELECT array_agg(ir.results->'distribution')
+      INTO remaining
+    FROM microplates.interface_results ir
+    JOIN microplates.prediction_run pr ON pr.id = ir.run_id
+    WHERE pr.sample_no = s_no
+      AND ir.run_id IS DISTINCT FROM p_skip_run
+      AND jsonb_typeof(ir.results->'distribution') = 'object';
+    IF remaining IS NULL THEN
+      DELETE FROM microplates.sample_summary ss WHERE ss.sample_no = s_no;
+      RETURN;
+    END IF;
+  END IF;
+
+  SELECT COALESCE(jsonb_object_agg(t.key, t.total), '{}'::jsonb)
+    INTO merged
+  FROM (
+    SELECT k.key,
+           COALESCE((cur->>k.key)::int, 0) + sign * COALESCE((dist->>k.key)::int, 0) AS total
+    FROM (
+      SELECT jsonb_object_keys(COALESCE(cur, '{}'::jsonb)) AS key
+      UNION
+      SELECT jsonb_object_keys(dist)
+    ) k
+  ) t
+  WHERE sign > 0
+     OR t.total <> 0
+     OR EXISTS (SELECT 1 FROM unnest(remaining) AS r(d) WHERE r.d ? t.key);
+
+  UPDATE microplates.sample_summary ss
+  SET summary = jsonb_set(COALESCE(ss.summary, '{}'::jsonb), '{distribution}', merged)
+  WHERE ss.sample_no = s_no;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 7.2 sample_no ของ run (NULL ถ้า run ถูกลบไปแล้ว เช่นตอน ON DELETE CASCADE)
+CREATE OR REPLACE FUNCTION microplates.fn_run_sample_no(p_run_id INTEGER)
+RETURNS TEXT AS $$
+  SELECT pr.sample_no FROM microplates.prediction_run pr WHERE pr.id = p_run_id;
+$$ LANGUAGE sql STABLE;
+
+-- 7.3 Trigger function ของ interface_results: INSERT บวก NEW, DELETE ลบ OLD, UPDATE ลบ OLD แล้วบวก NEW
 CREATE OR REPLACE FUNCTION microplates.fn_upsert_sample_summary()
 RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    PERFORM microplates.fn_add_distribution(
+      microplates.fn_run_sample_no(OLD.run_id), OLD.results->'distribution', -1);
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    PERFORM microplates.fn_add_distribution(
+      microplates.fn_run_sample_no(NEW.run_id), NEW.results->'distribution', 1);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 7.4 Trigger function ของ prediction_run
+--     - BEFORE DELETE: ลบ distribution ของ run ออกจาก summary ก่อน (ตอน cascade ลบ interface_results
+--       run หายไปแล้ว trigger 7.3 จึงหา sample_no ไม่เจอและข้ามไป)
+--     - AFTER UPDATE OF sample_no: ย้าย distribution ของ run ไปยัง sample ใหม่
+--     รวม distribution ทุกแถวของ run เป็นก้อนเดียวก่อน เพื่อตัด key / ลบแถวของ sample เดิมในครั้งเดียว
+CREATE OR REPLACE FUNCTION microplates.fn_run_sample_summary()
+RETURNS TRIGGER AS $$
 DECLARE
-  s_no TEXT;
   dist JSONB;
 BEGIN
-  -- 7.1 หา sample_no จาก run_id
-  SELECT pr.sample_no
-    INTO s_no
-  FROM microplates.prediction_run pr
-  WHERE pr.id = NEW.run_id
-  LIMIT 1;
-
-  -- 7.2 สร้าง subquery รวบรวมยอดแต่ละ key ของ distribution
-  SELECT jsonb_object_agg(key, total)
+  SELECT COALESCE(jsonb_object_agg(t.key, t.total) FILTER (WHERE t.key IS NOT NULL), '{}'::jsonb)
     INTO dist
   FROM (
-    SELECT
-      t.key,
-      SUM((t.value::text)::int) AS total
+    SELECT d.key, SUM((d.value::text)::int) AS total
     FROM microplates.interface_results ir
-    JOIN microplates.prediction_run pr2
-      ON pr2.id = ir.run_id
-    CROSS JOIN LATERAL
-      jsonb_each(ir.results->'distribution') AS t(key, value)
-    WHERE pr2.sample_no = s_no
-    GROUP BY t.key
-  ) sub;
-
-  -- 7.3 Upsert หรือ insert ลง sample_summary
-  INSERT INTO microplates.sample_summary(sample_no, summary)
-  VALUES (
-    s_no,
-    jsonb_build_object('distribution', dist)
-  )
-  ON CONFLICT (sample_no) DO UPDATE
-    SET summary = EXCLUDED.summary;
+    LEFT JOIN LATERAL jsonb_each(ir.results->'distribution') AS d(key, value) ON TRUE
+    WHERE ir.run_id = OLD.id
+      AND jsonb_typeof(ir.results->'distribution') = 'object'
+    GROUP BY d.key
+  ) t
+  HAVING COUNT(*) > 0;
 
+  IF dist IS NOT NULL THEN
+    PERFORM microplates.fn_add_distribution(OLD.sample_no, dist, -1, OLD.id);
+    IF TG_OP = 'UPDATE' THEN
+      PERFORM microplates.fn_add_distribution(NEW.sample_no, dist, 1);
+    END IF;
+  END IF;
+  IF TG_OP = 'DELETE' THEN
+    RETURN OLD;
+  END IF;
   RETURN NEW;
 END;
 $$ LANGUAGE plpgsql;
 
--- 8. Trigger ให้รัน function หลัง INSERT หรือ UPDATE ใน interface_results
+-- 7.5 ค่าที่ถูกต้องของ summary คำนวณจากทุก interface_results (ใช้ตรวจสอบ/rebuild)
+--     ทุก key รวมถึงยอด 0 และทุก sample ที่มีผล (ตรงกับ fn_add_distribution)
+CREATE OR REPLACE VIEW microplates.v_sample_summary_expected AS
+SELECT t.sample_no,
+       jsonb_build_object('distribution',
+         COALESCE(jsonb_object_agg(t.key, t.total) FILTER (WHERE t.key IS NOT NULL), '{}'::jsonb)) AS summary
+FROM (
+  SELECT pr.sample_no, d.key, SUM((d.value::text)::int) AS total
+  FROM microplates.interface_results ir
+  JOIN microplates.prediction_run pr ON pr.id = ir.run_id
+  LEFT JOIN LATERAL jsonb_each(ir.results->'distribution') AS d(key, value) ON TRUE
+  WHERE jsonb_typeof(ir.results->'distribution') = 'object'
+  GROUP BY pr.sample_no, d.key
+) t
+GROUP BY t.sample_no;
+
+-- 7.6 sample ที่ summary ไม่ตรงกับค่าที่คำนวณใหม่ (รวมถึง key หรือแถวที่ขาด/เกิน)
+CREATE OR REPLACE FUNCTION microplates.fn_verify_sample_summary()
+RETURNS TABLE (sample_no TEXT, expected JSONB, actual JSONB) AS $$
+  SELECT COALESCE(e.sample_no, s.sample_no), e.summary, s.summary
+  FROM microplates.v_sample_summary_expected e
+  FULL OUTER JOIN microplates.sample_summary s ON s.sample_no = e.sample_no
+  WHERE (e.summary->'distribution') IS DISTINCT FROM (s.summary->'distribution');
+$$ LANGUAGE sql STABLE;
+
+-- 7.7 คำนวณ summary ใหม่ทั้งหมด (หรือเฉพาะ p_sample_no) จาก interface_results; คืนจำนวน sample ที่เขียน
+CREATE OR REPLACE FUNCTION microplates.fn_rebuild_sample_summary(p_sample_no TEXT DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+  n INTEGER;
+BEGIN
+  DELETE FROM microplates.sample_summary ss
+  WHERE p_sample_no IS NULL OR ss.sample_no = p_sample_no;
+
+  INSERT INTO microplates.sample_summary (sample_no, summary)
+  SELECT e.sample_no, e.summary
+  FROM microplates.v_sample_summary_expected e
+  WHERE p_sample_no IS NULL OR e.sample_no = p_sample_no;
+  GET DIAGNOSTICS n = ROW_COUNT;
+  RETURN n;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 8. Triggers
+DROP TRIGGER IF EXISTS trg_upsert_sample_summary ON microplates.interface_results;
 CREATE TRIGGER trg_upsert_sample_summary
-AFTER INSERT OR UPDATE
+AFTER INSERT OR UPDATE OR DELETE
   ON microplates.interface_results
 FOR EACH ROW
 EXECUTE FUNCTION microplates.fn_upsert_sample_summary();
 
--- Indexes for performance
-CREATE INDEX ON microplates.prediction_run(sample_no);
-CREATE INDEX ON microplates.prediction_run(predict_at);
+DROP TRIGGER IF EXISTS trg_run_delete_sample_summary ON microplates.prediction_run;
+CREATE TRIGGER trg_run_delete_sample_summary
+BEFORE DELETE
+  ON microplates.prediction_run
+FOR EACH ROW
+EXECUTE FUNCTION microplates.fn_run_sample_summary();
+
+DROP TRIGGER IF EXISTS trg_run_update_sample_summary ON microplates.prediction_run;
+CREATE TRIGGER trg_run_update_sample_summary
+AFTER UPDATE OF sample_no
+  ON microplates.prediction_run
+FOR EACH ROW
+WHEN (OLD.sample_no IS DISTINCT FROM NEW.sample_no)
+EXECUTE FUNCTION microplates.fn_run_sample_summary();
+
+-- 9. Indexes for performance
+--    ตั้งชื่อเท่ากับชื่ออัตโนมัติของ Postgres (<table>_<column>_idx) เพื่อให้รันซ้ำบนฐานข้อมูลเดิมได้โดยไม่สร้างซ้ำ
+CREATE INDEX IF NOT EXISTS prediction_run_sample_no_idx   ON microplates.prediction_run(sample_no);
+CREATE INDEX IF NOT EXISTS prediction_run_predict_at_idx  ON microplates.prediction_run(predict_at);
+CREATE INDEX IF NOT EXISTS prediction_cache_cache_key_idx ON microplates.prediction_cache(cache_key);
+CREATE INDEX IF NOT EXISTS image_file_path_idx            ON microplates.image_file(path);
 
 -- GIN indexes for JSONB columns
-CREATE INDEX ON microplates.row_counts         USING GIN (counts    jsonb_path_ops);
-CREATE INDEX ON microplates.interface_results  USING GIN (results   jsonb_path_ops);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS row_counts_counts_idx
+  ON microplates.row_counts         USING GIN (counts    jsonb_path_ops);
+CREATE INDEX IF NOT EXISTS interface_results_results_idx
+  ON microplates.interface_results  USING GIN (results   jsonb_path_ops);
@@ -50,6 +50,7 @@ interface PredictResponse {
   last_positions: Record<string, number>;
   distribution: Record<string, number>;
   annotated_image: string;
+  annotated_url: string;
 }
 
 export default function LabStationPage() {
@@ -61,6 +62,7 @@ export default function LabStationPage() {
   const [loading, setLoading] = useState<boolean>(false);
   const [capturedFile, setCapturedFile] = useState<File | null>(null);
   const [capturedPreview, setCapturedPreview] = useState<string | null>(null);
+  const [annotatedUrl, setAnnotatedUrl] = useState<string | null>(null);
 
   // state for auto process
   const [autoRunning, setAutoRunning] = useState(false);
@@ -72,6 +74,31 @@ export default function LabStationPage() {
   // ล้าง blob URL เก่าเมื่อ capturedPreview เปลี่ยนหรือ unmount
   useEffect(() => {return () => {if (capturedPreview) {URL.revokeObjectURL(capturedPreview);}};}, [capturedPreview]);
 
+  // โหลดภาพ annotated (วาดฝั่ง predictor เมื่อถูกขอ) เมื่อได้ผลทำนายใหม่
+  useEffect(() => {
+    const runId = predictionResults?.run_id;
+    if (!runId) {
+      setAnnotatedUrl(null);
+      return;
+    }
+    let objectUrl: string | null = null;
+    let cancelled = false;
+    predictorApi.annotatedImage(runId)
+      .then((url) => {
+        if (cancelled) {
+          URL.revokeObjectURL(url);
+          return;
+        }
+        objectUrl = url;
+        setAnnotatedUrl(url);
+      })
+      .catch((e) => console.error(e));
+    return () => {
+      cancelled = true;
+      if (objectUrl) URL.revokeObjectURL(objectUrl);
+    };
+  }, [predictionResults?.run_id]);
+
   // Auto process handler
   const handleAutoClick = () => {
     if (autoRunning) {
@@ -210,10 +237,7 @@ export default function LabStationPage() {
                   <CardContent sx={{ p: 2, display: 'flex', flexDirection: 'column', alignItems: 'center' }}>
                     <Box
                       component="img"
-                      src={predictionResults?.annotated_image
-                          ? `/api/images?path=${encodeURIComponent(predictionResults.annotated_image)}`
-                          : capturedPreview || '/placeholder.png'
-                      }
+                      src={annotatedUrl || capturedPreview || '/placeholder.png'}
                       alt="Preview"
                       sx={{ width: '100%', height: 580, objectFit: 'contain', borderRadius: 1 }}
                     />
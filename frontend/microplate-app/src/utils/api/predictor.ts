@@ -17,6 +17,7 @@ export interface PredictResponse {
   last_positions: Record<string, number>;
   distribution: Record<string, number>;
   annotated_image: string;
+  annotated_url: string;
 }
 
 export const predictorApi = {
@@ -30,4 +31,16 @@ export const predictorApi = {
       body: formData,
     });
   },
+  // ภาพ annotated ถูกวาดเมื่อถูกขอครั้งแรก: ดึงเป็น blob แล้วคืน object URL
+  annotatedImage: async (run_id: number): Promise<string> => {
+    const baseUrl = process.env.NEXT_PUBLIC_API_BASE_URL;
+    const token = localStorage.getItem('accessToken');
+    const res = await fetch(`${baseUrl}/predictor/runs/${run_id}/annotated`, {
+      headers: token ? { Authorization: `Bearer ${token}` } : {},
+    });
+    if (!res.ok) {
+      throw new Error(`API error ${res.status}: ${await res.text()}`);
+    }
+    return URL.createObjectURL(await res.blob());
+  },
 };
@@ -7,6 +7,7 @@ from pypylon import pylon
 
 from app.config          import Config
 from app.api.v1.endpoints import router as api_router
+from app.utils.metrics import metrics_middleware, metrics_response
 
 # configure root logger for camera-service
 logging.basicConfig(
@@ -30,11 +31,20 @@ app.add_middleware(
 app.include_router(api_router, prefix="/api/v1/camera")
 
 
+# Prometheus: latency / in-flight / errors ของทุก request
+app.middleware("http")(metrics_middleware)
+
+
 @app.get("/health", tags=["Health"])
 async def health_check():
     return {"status": "alive"}
 
 
+@app.get("/metrics", tags=["Monitoring"])
+async def metrics():
+    return metrics_response()
+
+
 @app.on_event("startup")
 def startup_camera():
     factory = pylon.TlFactory.GetInstance()
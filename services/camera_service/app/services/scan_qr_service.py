@@ -4,6 +4,8 @@ from pypylon import pylon
 from pyzbar.pyzbar import decode
 import cv2
 
+from app.utils.metrics import stage_timer, ERRORS
+
 def scan_qr(cam, conv, timeout_ms: int = 2000) -> dict:
     """
     สแกน QR/Barcode จากกล้องที่เปิดไว้ครั้งเดียว:
@@ -13,20 +15,24 @@ def scan_qr(cam, conv, timeout_ms: int = 2000) -> dict:
     คืน {"codes": […]} หรือ [] ถ้าไม่เจอ
     """
     # รอดึงเฟรมเดียว
-    grab = cam.RetrieveResult(timeout_ms, pylon.TimeoutHandling_ThrowException)
+    with stage_timer('grab'):
+        grab = cam.RetrieveResult(timeout_ms, pylon.TimeoutHandling_ThrowException)
     if not grab.GrabSucceeded():
         grab.Release()
+        ERRORS.labels('grab').inc()
         return {"codes": []}
 
     # แปลงเป็น numpy
-    img = conv.Convert(grab).GetArray()
-    grab.Release()
+    with stage_timer('convert'):
+        img = conv.Convert(grab).GetArray()
+        grab.Release()
 
     # แปลงเป็นขาว-ดำ ช่วยให้ decode เร็วและแม่นขึ้น
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 
     # สแกนโค้ด
-    raw = decode(gray)
+    with stage_timer('qr_decode'):
+        raw = decode(gray)
     if not raw:
         return {"codes": []}
 
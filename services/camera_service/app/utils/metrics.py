@@ -0,0 +1,67 @@
+# app/utils/metrics.py
+import time
+import logging
+from contextlib import contextmanager
+
+from fastapi import Request, Response
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST, REGISTRY
+
+# ตั้งค่า logging
+logger = logging.getLogger(__name__)
+
+# ช่วงเวลาของ histogram (วินาที): grab/convert/encode ของกล้องอยู่ในระดับ ms
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+REQUEST_LATENCY = Histogram(
+    'camera_http_request_duration_seconds', 'HTTP request latency',
+    ['method', 'route', 'status'], buckets=BUCKETS,
+)
+IN_FLIGHT = Gauge('camera_http_requests_in_flight', 'HTTP requests currently being served')
+STAGE_LATENCY = Histogram(
+    'camera_stage_duration_seconds',
+    'Latency of one capture stage (grab, convert, encode, qr_decode)',
+    ['stage'], buckets=BUCKETS,
+)
+ERRORS = Counter('camera_errors_total', 'Errors by stage', ['stage'])
+
+
+@contextmanager
+def stage_timer(stage):
+    """จับเวลาหนึ่งขั้นของการถ่ายภาพ; ถ้ามี exception จะนับเป็น error ของขั้นนั้นด้วย"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.labels(stage).inc()
+        raise
+    finally:
+        STAGE_LATENCY.labels(stage).observe(time.perf_counter() - start)
+
+
+def _route(request):
+    # ใช้ path template ของ route เพื่อไม่ให้ label มีค่าไม่จำกัด
+    route = request.scope.get('route')
+    return getattr(route, 'path', 'unmatched')
+
+
+async def metrics_middleware(request: Request, call_next):
+    """latency / in-flight / error ของทุก request (ยกเว้น /metrics เอง)"""
+    if request.url.path == '/metrics':
+        return await call_next(request)
+    IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        IN_FLIGHT.dec()
+        if status >= 500:
+            ERRORS.labels('http').inc()
+        REQUEST_LATENCY.labels(request.method, _route(request), str(status)).observe(time.perf_counter() - start)
+
+
+def metrics_response():
+    """ข้อมูลสำหรับ Prometheus scrape"""
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
@@ -10,6 +10,7 @@ from fastapi.concurrency import run_in_threadpool
 from app.config import Config
 from app.services.dobot import DobotMG400
 from app.api.v1.endpoints import router as api_router
+from app.utils.metrics import metrics_middleware, metrics_response
 
 logger = logging.getLogger("cobot‑service")
 logging.basicConfig(
@@ -31,10 +32,17 @@ app.add_middleware(
 # mount API routes
 app.include_router(api_router, prefix="/api/v1")
 
+# Prometheus: latency / in-flight / errors ของทุก request
+app.middleware("http")(metrics_middleware)
+
 @app.get("/health", tags=["Health"])
 async def health_check():
     return {"status": "alive"}
 
+@app.get("/metrics", tags=["Monitoring"])
+async def metrics():
+    return metrics_response()
+
 @app.on_event("startup")
 async def startup_robot():
     robot = DobotMG400(
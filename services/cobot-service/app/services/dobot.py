@@ -6,6 +6,7 @@ import re
 import threading
 import logging
 from app.config import Config
+from app.utils.metrics import command_timer, stage_timer
 
 logger = logging.getLogger("cobot-service.dobot")
 
@@ -30,15 +31,17 @@ class DobotMG400:
         """
         ส่งคำสั่ง ASCII แล้วอ่านข้อความจนเจอ ';'
         """
-        sock.sendall(cmd.encode('ascii'))
-        buf = bytearray()
-        while True:
-            chunk = sock.recv(1024)
-            if not chunk:
-                break
-            buf.extend(chunk)
-            if b';' in chunk:
-                break
+        port = 'motion' if sock is getattr(self, 'motion', None) else 'dash'
+        with command_timer(port, cmd.split('(', 1)[0]):
+            sock.sendall(cmd.encode('ascii'))
+            buf = bytearray()
+            while True:
+                chunk = sock.recv(1024)
+                if not chunk:
+                    break
+                buf.extend(chunk)
+                if b';' in chunk:
+                    break
         return buf.decode('ascii')
 
     # ── Basic control commands ─────────────────────────────────────────
@@ -67,11 +70,12 @@ class DobotMG400:
 
         td = timeout or Config.ROBOT_TIMEOUT
         deadline = time.time() + td
-        while time.time() < deadline:
-            if self.robot_mode() == 5:
-                return
-            time.sleep(0.1)
-        raise TimeoutError("Timeout waiting for robot to become idle")
+        with stage_timer('wait_until_idle'):
+            while time.time() < deadline:
+                if self.robot_mode() == 5:
+                    return
+                time.sleep(0.1)
+            raise TimeoutError("Timeout waiting for robot to become idle")
 
     # ── Digital input ─────────────────────────────────────────────────
     def di_execute(self, index: int) -> int:
@@ -0,0 +1,84 @@
+# app/utils/metrics.py
+import time
+import logging
+from contextlib import contextmanager
+
+from fastapi import Request, Response
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST, REGISTRY
+
+# ตั้งค่า logging
+logger = logging.getLogger(__name__)
+
+# ช่วงเวลาของ histogram (วินาที): คำสั่ง dashboard ไม่กี่ ms จนถึงรอหุ่นยนต์เคลื่อนที่หลายสิบวินาที
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+REQUEST_LATENCY = Histogram(
+    'cobot_http_request_duration_seconds', 'HTTP request latency',
+    ['method', 'route', 'status'], buckets=BUCKETS,
+)
+IN_FLIGHT = Gauge('cobot_http_requests_in_flight', 'HTTP requests currently being served')
+STAGE_LATENCY = Histogram(
+    'cobot_stage_duration_seconds',
+    'Duration of one robot stage (wait_until_idle)',
+    ['stage'], buckets=BUCKETS,
+)
+COMMAND_LATENCY = Histogram(
+    'cobot_command_roundtrip_seconds', 'Round trip of one Dobot command (send until ; is received)',
+    ['port', 'command'], buckets=BUCKETS,
+)
+ERRORS = Counter('cobot_errors_total', 'Errors by stage', ['stage'])
+
+
+@contextmanager
+def stage_timer(stage):
+    """จับเวลาหนึ่งขั้น (เช่น wait_until_idle); ถ้ามี exception จะนับเป็น error ของขั้นนั้นด้วย"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.labels(stage).inc()
+        raise
+    finally:
+        STAGE_LATENCY.labels(stage).observe(time.perf_counter() - start)
+
+
+@contextmanager
+def command_timer(port, command):
+    """จับเวลา round trip ของคำสั่งหนึ่งคำสั่ง (ส่ง -> ได้คำตอบ); socket error / timeout นับเป็น error 'command'"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.labels('command').inc()
+        raise
+    finally:
+        COMMAND_LATENCY.labels(port, command).observe(time.perf_counter() - start)
+
+
+def _route(request):
+    # ใช้ path template ของ route (เช่น /cobot/di/{index}) เพื่อไม่ให้ label มีค่าไม่จำกัด
+    route = request.scope.get('route')
+    return getattr(route, 'path', 'unmatched')
+
+
+async def metrics_middleware(request: Request, call_next):
+    """latency / in-flight / error ของทุก request (ยกเว้น /metrics เอง)"""
+    if request.url.path == '/metrics':
+        return await call_next(request)
+    IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        IN_FLIGHT.dec()
+        if status >= 500:
+            ERRORS.labels('http').inc()
+        REQUEST_LATENCY.labels(request.method, _route(request), str(status)).observe(time.perf_counter() - start)
+
+
+def metrics_response():
+    """ข้อมูลสำหรับ Prometheus scrape"""
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
@@ -39,7 +39,7 @@ export interface PredictionRun {
     id: number;
     run_id: number;
     sample_no: string;
-    file_type: 'raw' | 'annotated';
+    file_type: 'raw' | 'original' | 'annotated' | 'thumbnail';
     path: string;
     created_at: string;
   }
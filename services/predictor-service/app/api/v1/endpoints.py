@@ -1,20 +1,46 @@
 ## Updated: app/api/v1/endpoints.py
 import os
-import uuid
-import shutil
+import hmac
+import json
+import asyncio
+import mimetypes
 import cv2
 import logging
-from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException
-from fastapi.responses import JSONResponse
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Request, UploadFile, File, Form, Depends, HTTPException, Query, Header
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError
-from sqlalchemy.orm import Session
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_db
-from app.models.predict_result_model import (PredictionRun,RawPredict,RowCounts,InterfaceResults,WellPrediction,ImageFile)
+from app.database import get_db, SessionLocal
+from app.models.predict_result_model import PredictionRun, ImageFile
 from app.services.grid_builder_service import GridBuilder
 from app.services.predictor_service import Predictor
+from app.services.inference_backend_service import BACKENDS
+from app.services.model_registry_service import ModelRegistry, model_path_in_dir
 from app.services.result_processor_service import ResultProcessor
+from app.services.inference_scheduler_service import InferenceScheduler, SchedulerStoppedError
+from app.services.inference_executor_service import InferenceExecutor, QueueFullError
+from app.services.run_persistence_service import (persist_run, persist_failed_run,
+                                                  create_pending_run, set_run_status, forget_image_files,
+                                                  claim_interrupted_runs, unfinished_originals)
+from app.services.job_service import JobManager, FINAL_STATUSES
+from app.services.result_cache_service import ResultCache, find_cached_run, content_hash
+from app.services.annotation_service import render_annotated
+from app.services.plate_locator_service import PlateLocator, parse_roi
+from app.services.run_query_service import list_runs, get_run as query_run
+from app.utils.http_cache import TTLCache, make_etag, conditional_json
+from app.services.image_writer_service import ImageWriter
+from app.services.image_store_service import ImageStore, RetentionSweeper
+from app.utils.image_io import decode_image
+from app.utils.metrics import stage_timer, timed, ERRORS
+from app.utils.profiling import current_log, record_stage
+from app.utils.process_stats import snapshot, read_reports, summarize
+from app.services.profiling_service import RequestProfiler, FORMATS as PROFILE_FORMATS
 from app.config import Config
 
 # Initialize logger for this module
@@ -43,102 +69,871 @@ def verify_token(creds: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
 # APIRouter with global dependency for security
 router = APIRouter(dependencies=[Depends(verify_token)])
 
-# define model path from config
-model_path = getattr(Config, 'MODEL_PATH', None)
+# define model path from config (ONNX backend reads ONNX_MODEL_PATH, falling back to MODEL_PATH with .onnx)
+backend_name = Config.INFERENCE_BACKEND.lower()
+if backend_name == 'onnx':
+    model_path = Config.ONNX_MODEL_PATH or (os.path.splitext(Config.MODEL_PATH)[0] + '.onnx' if Config.MODEL_PATH else '')
+else:
+    model_path = getattr(Config, 'MODEL_PATH', None)
 if not model_path:
     logger.error("MODEL_PATH not configured in Config")
     raise RuntimeError("MODEL_PATH not configured in Config")
 
-# initialize services
+
+def _build_predictor(path, backend):
+    """Factory used by the model registry to load one model version."""
+    kwargs = {
+        'conf': Config.CONF_THRESHOLD,
+        'iou': Config.IOU_THRESHOLD,
+        'imgsz': Config.INFERENCE_IMGSZ or None,
+    }
+    if backend == 'onnx':
+        kwargs['threads'] = Config.ONNX_INTRA_OP_THREADS
+    # โมเดลรันบนภาพขนาดจริง; พิกัดถูกขยายเข้าสู่ระบบพิกัดของกริด
+    return Predictor(path, backend=backend, box_scale=grid_builder.scale, **kwargs)
+
+
+# initialize services (the model itself is loaded lazily by the registry)
 grid_builder = GridBuilder()
-predictor = Predictor(model_path)
+plate_locator = PlateLocator(
+    mode=Config.PLATE_ROI_MODE,
+    roi=parse_roi(Config.PLATE_ROI),
+    refresh=Config.PLATE_ROI_REFRESH,
+    padding=Config.PLATE_ROI_PADDING,
+    reference=parse_roi(Config.PLATE_ROI_REFERENCE),
+)
+registry = ModelRegistry(_build_predictor, warmup_shape=(Config.WARMUP_HEIGHT, Config.WARMUP_WIDTH),
+                         state_path=Config.MODEL_STATE_FILE or None, model_dir=Config.MODEL_DIR or None)
+registry.register(Config.MODEL_VERSION, model_path, backend_name)
 processor = ResultProcessor()
+executor = InferenceExecutor(
+    workers=Config.INFERENCE_WORKERS,
+    max_pending=Config.INFERENCE_MAX_PENDING,
+    retry_after=Config.INFERENCE_RETRY_AFTER,
+)
+scheduler = InferenceScheduler(
+    registry,
+    max_batch_size=Config.INFER_MAX_BATCH_SIZE,
+    max_wait_ms=Config.INFER_MAX_WAIT_MS,
+    executor=executor,
+)
+cache = ResultCache(max_entries=Config.RESULT_CACHE_SIZE, ttl_seconds=Config.RESULT_CACHE_TTL)
+read_cache = TTLCache(ttl_seconds=Config.RUNS_CACHE_TTL)
+image_writer = ImageWriter(
+    fmt=Config.IMAGE_FORMAT,
+    jpeg_quality=Config.IMAGE_JPEG_QUALITY,
+    webp_quality=Config.IMAGE_WEBP_QUALITY,
+    png_compression=Config.IMAGE_PNG_COMPRESSION,
+    thumbnail_width=Config.THUMBNAIL_WIDTH,
+    thumbnail_quality=Config.THUMBNAIL_QUALITY,
+    workers=Config.IMAGE_WRITER_WORKERS,
+    max_pending=Config.IMAGE_WRITER_MAX_PENDING,
+)
+image_store = ImageStore(
+    Config.IMAGE_STORE_DIR,
+    image_writer,
+    max_age_seconds=Config.IMAGE_RETENTION_DAYS * 86400,
+    max_bytes=Config.IMAGE_STORE_MAX_MB * 2**20,
+    grace_seconds=Config.IMAGE_STORE_GRACE_SECONDS,
+)
+profiler = RequestProfiler(
+    Config.PROFILE_DIR,
+    per_minute=Config.PROFILE_RATE_PER_MINUTE,
+    interval=Config.PROFILE_INTERVAL,
+    keep=Config.PROFILE_KEEP,
+    enabled=Config.PROFILING_ENABLED,
+)
+
+
+async def _forget_evicted(paths):
+    """Keep image_file consistent with the image store: drop rows of files the retention sweep removed."""
+    async with SessionLocal() as db:
+        await forget_image_files(db, paths)
+
+
+async def _unfinished_originals():
+    """Originals of runs that are still pending/running must survive the sweep (an interrupted job re-runs from them)."""
+    async with SessionLocal() as db:
+        return await unfinished_originals(db)
+
+
+sweeper = RetentionSweeper(image_store, _forget_evicted, interval=Config.IMAGE_STORE_SWEEP_SECONDS,
+                           protected=_unfinished_originals)
+
+
+DEFAULT_API_KEY = "default_api_key"
+
+
+def verify_admin(x_api_key: str = Header(None)):
+    """
+    Admin endpoints additionally require ADMIN_API_KEY in X-API-Key. They are refused altogether
+    while no admin key is configured (or it is the default placeholder), since they can load models.
+    """
+    admin_key = Config.ADMIN_API_KEY
+    if not admin_key or admin_key == DEFAULT_API_KEY:
+        raise HTTPException(status_code=403, detail="Admin API is disabled (ADMIN_API_KEY is not configured)")
+    if not x_api_key or not hmac.compare_digest(x_api_key.encode(), admin_key.encode()):
+        raise HTTPException(status_code=403, detail="Admin API key required")
+    return True
+
+
+def _allowed_model_path(path):
+    """
+    Resolve a model file for activation. Loading a torch model unpickles it, so only files under MODEL_DIR
+    (after resolving symlinks and '..') may be activated by path.
+    """
+    if not Config.MODEL_DIR:
+        raise HTTPException(status_code=403, detail="Activating a model by path requires MODEL_DIR")
+    resolved = model_path_in_dir(path, Config.MODEL_DIR)
+    if resolved is None:
+        raise HTTPException(status_code=400, detail="Model path must be inside MODEL_DIR")
+    if not os.path.isfile(resolved):
+        raise HTTPException(status_code=404, detail="Model file not found in MODEL_DIR")
+    return resolved
+
+
+class ActivateModelRequest(BaseModel):
+    version: str
+    path: Optional[str] = None
+    backend: Optional[str] = None
+
+
+def _busy(err: QueueFullError):
+    return HTTPException(
+        status_code=429,
+        detail=str(err),
+        headers={"Retry-After": str(err.retry_after)},
+    )
+
+
+def _failure(err):
+    """HTTP error ของ prediction ที่ล้มเหลว: 503 ถ้า service กำลังหยุด (ลองใหม่ได้) มิฉะนั้น 500"""
+    if isinstance(err, SchedulerStoppedError):
+        return HTTPException(status_code=503, detail=str(err),
+                             headers={"Retry-After": str(Config.INFERENCE_RETRY_AFTER)})
+    return HTTPException(status_code=500, detail=str(err))
+
+
+def _cache_key(digest, sample_no):
+    """Same image + sample + model version + thresholds -> same result."""
+    params = (Config.CONF_THRESHOLD, Config.IOU_THRESHOLD, Config.INFERENCE_IMGSZ,
+              Config.PLATE_ROI_MODE, Config.PLATE_ROI, Config.PLATE_ROI_REFERENCE)
+    return cache.key(digest, sample_no, registry.active_version, params)
+
+
+async def _load_indexed_body(cache_key):
+    """Rebuild a cached response body from the Postgres cache index (fresh session)."""
+    async with SessionLocal() as db:
+        run = await find_cached_run(db, cache_key)
+        if run is None:
+            return None
+        body = _run_body(run)
+    return {k: body[k] for k in ('run_id', 'counts', 'last_positions', 'distribution',
+                                 'annotated_image', 'annotated_url', 'model_version')}
+
+
+async def _cached_body(cache_key):
+    return await cache.lookup(cache_key, _load_indexed_body if Config.RESULT_CACHE_DB_INDEX else None)
+
+
+def _annotated_url(run_id):
+    return f"/api/v1/predictor/runs/{run_id}/annotated"
+
+
+def _save_thumbnail(digest, img):
+    """Queue a list-view thumbnail of the plate in the image store; returns its path (None if disabled)."""
+    if not Config.THUMBNAIL_WIDTH:
+        return None
+    return image_store.save_thumbnail(digest, img)
+
+
+def _finish_plate(cache_key, wells, model_version, shift=None):
+    """
+    Process results (runs on the inference pool); the annotated image is rendered on demand
+    into a store path derived from the cache key, which fixes its content. The grid shift the
+    wells were assigned with is stored with the run so the annotated image draws the same grid.
+    """
+    annotated_path = image_store.derived_path(cache_key, 'annotated')
+
+    counts, last_positions, distribution = processor.process(wells)
+    return {
+        'wells': wells,
+        'annotated_path': annotated_path,
+        'counts': counts,
+        'last_positions': last_positions,
+        'distribution': distribution,
+        'model_version': model_version,
+        'grid_shift': list(shift) if shift is not None else None,
+    }
+
+
+async def _save_plate(db, sample_no, file_path, result, run=None, cache_key=None):
+    """Persist the run and all child rows in one transaction; return the response body."""
+    with stage_timer('db_write'):
+        return await _persist_plate(db, sample_no, file_path, result, run, cache_key)
+
+
+async def _persist_plate(db, sample_no, file_path, result, run, cache_key):
+    annotated_path = result['annotated_path']
+    # a pending (async) run already has its original image recorded;
+    # the annotated image is recorded once GET /runs/{id}/annotated renders it
+    image_files = [] if run is not None else [('original', file_path)]
+    if result.get('thumbnail_path'):
+        image_files.append(('thumbnail', result['thumbnail_path']))
+    run = await persist_run(
+        db,
+        sample_no=sample_no,
+        wells=result['wells'],
+        counts=result['counts'],
+        last_positions=result['last_positions'],
+        distribution=result['distribution'],
+        image_files=image_files,
+        annotated_image_path=annotated_path,
+        model_version=result['model_version'],
+        grid_shift=result.get('grid_shift'),
+        run=run,
+        cache_key=cache_key if Config.RESULT_CACHE_DB_INDEX else None,
+    )
+    return {
+        'run_id': run.id,
+        'counts': result['counts'],
+        'last_positions': result['last_positions'],
+        'distribution': result['distribution'],
+        'annotated_image': annotated_path,
+        'annotated_url': _annotated_url(run.id),
+        'model_version': result['model_version'],
+    }
+
+
+async def _fail_plate(db, sample_no, file_path, err):
+    """Record a failed run (status 'error'); returns its id or None if even that failed."""
+    with stage_timer('db_write'):
+        run = await persist_failed_run(
+            db, sample_no, err,
+            image_files=[('original', file_path)],
+            model_version=registry.active_version,
+        )
+    return run.id if run is not None else None
+
 
 @router.post("/predict")
 async def predict_endpoint(
     sample_no: str = Form(...),
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    mode: str = Query("sync", pattern="^(sync|async)$"),
+    profile: bool = Query(False),
+    x_profile: Optional[str] = Header(None),
+    x_api_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db)
 ):
-    logger.info("Starting prediction for sample_no=%s", sample_no)
-
-    # 1. Save uploaded file to disk
-    upload_dir = getattr(Config, 'UPLOAD_DIR', '/tmp')
-    os.makedirs(upload_dir, exist_ok=True)
-    image_id = uuid.uuid4().hex
-    filename = f"{image_id}_{file.filename}"
-    file_path = os.path.join(upload_dir, filename)
-    with open(file_path, 'wb') as f:
-        shutil.copyfileobj(file.file, f)
-    logger.info("Uploaded file saved to %s", file_path)
-
-    # 2. Create a new PredictionRun record (initial status 'running')
-    run = PredictionRun.create(
-        db,
-        sample_no=sample_no,
-        description=None,
-        annotated_image_path=file_path,
-        model_version=Config.MODEL_VERSION if hasattr(Config, 'MODEL_VERSION') else None,
-        status='running',
-        error_msg=None
-    )
-    logger.info("Created PredictionRun id=%s", run.id)
+    if profile or (x_profile or '').lower() in ('1', 'true', 'yes'):
+        verify_admin(x_api_key)
+        if not profiler.enabled:
+            raise HTTPException(status_code=403, detail="Profiling is disabled (PROFILING_ENABLED)")
+        return await _profiled(_predict_request(sample_no, file, mode, db),
+                               {'sample_no': sample_no, 'mode': mode, 'filename': file.filename})
+    return await _predict_request(sample_no, file, mode, db)
+
+
+async def _profiled(request, meta):
+    """
+    Run a /predict request under the sampling profiler (rate limited, one at a time) and store the
+    profile with the run_id; the response carries X-Profile-Id, or X-Profile with the reason it was skipped.
+    """
+    active, reason = profiler.begin()
+    if active is None:
+        response = await request
+        response.headers['X-Profile'] = reason
+        return response
+    response, status = None, 500
+    try:
+        response = await request
+        status = response.status_code
+        return response
+    except HTTPException as err:
+        status = err.status_code
+        raise
+    finally:
+        profiler.stop(active)
+        run_id = json.loads(response.body).get('run_id') if response is not None else None
+        try:
+            profile_id = await run_in_threadpool(profiler.save, active, run_id, status, meta)
+            if response is not None:
+                response.headers['X-Profile-Id'] = profile_id
+        except Exception:
+            logger.exception("Failed to save profile for run_id=%s", run_id)
+
+
+async def _predict_request(sample_no, file, mode, db):
+    logger.info("Starting prediction for sample_no=%s (mode=%s)", sample_no, mode)
+    try:
+        with stage_timer('upload'):
+            data = await file.read()
+        digest = content_hash(data)
+        cache_key = _cache_key(digest, sample_no)
+        cached = await _cached_body(cache_key)
+        if mode == "async":
+            return await _enqueue_one(sample_no, file.filename, data, digest, cache_key, cached, db)
+        if cached is not None:
+            logger.info("Cache hit for sample_no=%s, returning run_id=%s", sample_no, cached['run_id'])
+            return JSONResponse(status_code=200, content={**cached, 'cached': True})
+        with executor.admission(1):
+            return await _predict_one(sample_no, file.filename, data, digest, cache_key, db)
+    except QueueFullError as err:
+        raise _busy(err)
 
-    # record original image in ImageFile
-    ImageFile.create(db, run.id, sample_no, 'original', file_path)
-    logger.debug("Original image logged in ImageFile for run_id=%s", run.id)
+
+async def _infer_plate(img, digest, cache_key):
+    """Inference and result processing for one decoded plate."""
+    # Run prediction on the plate ROI of the native-resolution frame; boxes are mapped into grid space
+    # and the wells follow the plate when it moved from its calibrated position
+    roi_img, origin, shift = await executor.run(timed('plate_roi', plate_locator.crop), img)
+    timings = {} if current_log() is not None else None
+    with stage_timer('inference'):
+        wells, model_version = await scheduler.submit(roi_img, grid_builder.wells(shift), origin, timings)
+    _record_batch(timings)
+    logger.info("Prediction completed with model %s, processing results", model_version)
+    # Process results: count by row and last positions
+    result = await executor.run(_finish_plate, cache_key, wells, model_version, shift)
+    result['thumbnail_path'] = _save_thumbnail(digest, img)
+    return result
+
+
+def _record_batch(timings):
+    """Add the model's share of the inference stage (from the scheduler) to the request profile."""
+    if timings:
+        record_stage('predict', timings['started'], timings['predict_ms'] / 1000,
+                     batch_size=timings['batch_size'], queue_ms=timings['queue_ms'])
+
+
+async def _predict_one(sample_no, filename, data, digest, cache_key, db):
+    # identical uploads arriving while this one runs wait for its result
+    cache.begin(cache_key)
+    try:
+        return await _predict_uncached(sample_no, filename, data, digest, cache_key, db)
+    finally:
+        cache.end(cache_key)
+
+
+async def _predict_uncached(sample_no, filename, data, digest, cache_key, db):
+    # 1. Decode the upload straight from memory; persist the original in the image store
+    img = await executor.run(timed('decode', decode_image), data)
+    if img is None:
+        ERRORS.labels('decode').inc()
+        logger.warning("Could not decode uploaded file for sample_no=%s", sample_no)
+        raise HTTPException(status_code=400, detail="Uploaded file is not a valid image")
+
+    file_path = image_store.save_original(data, digest, filename)
+    logger.info("Uploaded file decoded, stored as %s", file_path)
 
     try:
-        # 3. Load image and draw grid
-        img = cv2.imread(file_path)
-        grid_img, wells = grid_builder.draw(img)
-        logger.info("Grid drawn: %d wells detected", len(wells))
-        # 4. Run prediction and annotate
-        annotated_img, wells = predictor.predict(grid_img, wells)
-        logger.info("Prediction completed, saving raw results")
-        for well in wells:
-            for pred in well.get('predictions', []):
-                WellPrediction.create(
-                    db,
-                    run_id=run.id,
-                    label=well['label'],
-                    class_name=pred['class'],
-                    confidence=int(pred['confidence'] * 100),
-                    bbox=pred['bbox']
-                )
-        logger.debug("Well predictions saved for run_id=%s", run.id)
-
-        # 5. Save annotated image to disk and update run
-        annotated_path = os.path.join(upload_dir, f"{image_id}_annotated.jpg")
-        cv2.imwrite(annotated_path, annotated_img)
-        ImageFile.create(db, run.id, sample_no, 'annotated', annotated_path)
-        logger.info("Annotated image saved to %s and logged", annotated_path)
-
-        run.annotated_image_path = annotated_path
-        db.commit()
-
-        # 6. Process results: count by row and last positions
-        counts = processor.count_by_row(wells)
-        last_positions = processor.last_positions(counts)
-        RowCounts.create(db, run.id, {'raw_count': counts,'last_positions': last_positions})
-        distribution = processor.to_dataframe(last_positions)
-        InterfaceResults.create(db, run.id, {'distribution': distribution})
-        logger.info("Results processed: row_counts and interface_results saved")
-
-        # 7. Prepare response
-        response = {
-            'run_id': run.id,
-            'counts': counts,
-            'last_positions': last_positions,
-            'distribution': distribution,
-            'annotated_image': annotated_path
-        }
-        logger.info("Prediction endpoint completed successfully for run_id=%s", run.id)
+        # 2. Grid, inference and result processing
+        result = await _infer_plate(img, digest, cache_key)
+        # 3. Persist the run and all child rows in one transaction
+        response = await _save_plate(db, sample_no, file_path, result, None, cache_key)
+        cache.put(cache_key, response)
+        logger.info("Prediction endpoint completed successfully for run_id=%s", response['run_id'])
         return JSONResponse(status_code=200, content=response)
 
     except Exception as e:
-        logger.exception("Error during prediction for run_id=%s: %s", run.id, e)
-        run.status = 'error'
-        run.error_msg = str(e)
-        db.commit()
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        run_id = await _fail_plate(db, sample_no, file_path, e)
+        logger.exception("Error during prediction for run_id=%s: %s", run_id, e)
+        raise _failure(e)
+
+
+async def _enqueue_one(sample_no, filename, data, digest, cache_key, cached, db):
+    """mode=async: store the upload, create a pending run and return 202 immediately."""
+    if cached is not None:
+        # ผลลัพธ์มีอยู่แล้ว: ไม่ต้องสร้าง run ซ้ำ
+        return JSONResponse(status_code=200, content={
+            **cached,
+            'status': 'done',
+            'cached': True,
+            'status_url': f"/api/v1/predictor/runs/{cached['run_id']}",
+            'events_url': f"/api/v1/predictor/runs/{cached['run_id']}/events",
+        })
+    # admission control ของงาน async อยู่ที่นี่: งานที่ตอบ 202 แล้วจะรอ executor จนได้รัน ไม่ถูกปฏิเสธภายหลัง
+    jobs.admit()
+    file_path = image_store.save_original(data, digest, filename)
+
+    with stage_timer('db_write'):
+        run = await create_pending_run(db, sample_no, file_path, registry.active_version)
+    try:
+        await jobs.submit(run.id, sample_no=sample_no, file_path=file_path, digest=digest,
+                          data=data, cache_key=cache_key)
+    except QueueFullError:
+        await persist_failed_run(db, sample_no, "Job queue is full", (), run.model_version, run)
+        raise
+    logger.info("Queued async prediction run_id=%s", run.id)
+    return JSONResponse(status_code=202, content={
+        'run_id': run.id,
+        'status': 'pending',
+        'status_url': f"/api/v1/predictor/runs/{run.id}",
+        'events_url': f"/api/v1/predictor/runs/{run.id}/events",
+    })
+
+
+async def _process_job(job):
+    """Worker side of mode=async: drive a pending run through running to done/error."""
+    run_id, sample_no = job['run_id'], job['sample_no']
+    async with SessionLocal() as db:
+        run = await db.get(PredictionRun, run_id)
+        if run is None:
+            raise RuntimeError(f"PredictionRun {run_id} not found")
+        # อ่านไว้ก่อน: rollback จะ expire attribute ของ run (async session โหลดซ้ำแบบ lazy ไม่ได้)
+        model_version = run.model_version
+        await set_run_status(db, run, 'running')
+        try:
+            # งานนี้ถูกรับไว้แล้ว (202): รอที่ว่างใน executor แทนการถูกปฏิเสธเมื่อ request แบบ sync เต็มคิว
+            async with executor.reserve(1):
+                img = await executor.run(timed('decode', decode_image), job['data'])
+                if img is None:
+                    ERRORS.labels('decode').inc()
+                    raise ValueError("Uploaded file is not a valid image")
+                result = await _infer_plate(img, job['digest'], job['cache_key'])
+            response = await _save_plate(db, sample_no, job['file_path'], result, run, job['cache_key'])
+            cache.put(job['cache_key'], response)
+        except Exception as e:
+            ERRORS.labels('async_job').inc()
+            await persist_failed_run(db, sample_no, e, (), model_version, run)
+            raise
+
+
+jobs = JobManager(
+    _process_job,
+    workers=Config.ASYNC_WORKERS,
+    max_queue=Config.ASYNC_MAX_QUEUE,
+    retry_after=Config.INFERENCE_RETRY_AFTER,
+)
+
+
+def _read_original(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except (OSError, TypeError):
+        return None
+
+
+async def recover_jobs():
+    """
+    Startup: async runs left pending/running by a previous process (its in-memory job queue is gone)
+    are re-queued from their stored original, or marked 'error' with the reason when that is not possible.
+    Runs are claimed atomically, so workers starting together do not re-queue the same run twice.
+    Returns the number of re-queued runs.
+    """
+    marker = f"Resumed after a restart (started {Config.STARTED_AT:.6f})"
+    started_before = datetime.utcfromtimestamp(Config.STARTED_AT)
+    requeued = 0
+    async with SessionLocal() as db:
+        for run, file_path in await claim_interrupted_runs(db, started_before, marker):
+            data = await run_in_threadpool(_read_original, file_path)
+            if data is None:
+                await persist_failed_run(db, run.sample_no, "Interrupted by a restart; the original image is "
+                                         "no longer available", (), run.model_version, run)
+                continue
+            digest = content_hash(data)
+            try:
+                await jobs.submit(run.id, sample_no=run.sample_no, file_path=file_path, digest=digest,
+                                  data=data, cache_key=_cache_key(digest, run.sample_no))
+            except QueueFullError:
+                await persist_failed_run(db, run.sample_no, "Interrupted by a restart and the job queue is "
+                                         "full; resubmit the image", (), run.model_version, run)
+                continue
+            requeued += 1
+    if requeued:
+        logger.info("Re-queued %d async runs interrupted by a restart", requeued)
+    return requeued
+
+
+@router.post("/predict/batch")
+async def predict_batch_endpoint(
+    sample_nos: List[str] = Form(...),
+    files: List[UploadFile] = File(...),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    ทำนายหลายเพลตในคำขอเดียว: files[i] คู่กับ sample_nos[i]
+    รันโมเดลครั้งเดียวทั้ง batch แล้วคืนผลลัพธ์ทีละเพลตตามลำดับ
+    """
+    if len(files) != len(sample_nos):
+        raise HTTPException(status_code=400, detail="files and sample_nos must have the same length")
+    if len(files) > Config.MAX_BATCH_IMAGES:
+        raise HTTPException(status_code=400, detail=f"At most {Config.MAX_BATCH_IMAGES} images per batch")
+    logger.info("Starting batch prediction for %d plates", len(files))
+    try:
+        with executor.admission(len(files)):
+            return await _predict_many(sample_nos, files, db)
+    except QueueFullError as err:
+        raise _busy(err)
+
+
+async def _predict_many(sample_nos, files, db):
+    # 1. Decode every upload first so a bad file rejects the whole batch
+    plates = []
+    results = [None] * len(files)
+    for index, (sample_no, file) in enumerate(zip(sample_nos, files)):
+        with stage_timer('upload'):
+            data = await file.read()
+        digest = content_hash(data)
+        cache_key = _cache_key(digest, sample_no)
+        cached = await _cached_body(cache_key)
+        if cached is not None:
+            results[index] = {'sample_no': sample_no, **cached, 'cached': True}
+            continue
+        img = await executor.run(timed('decode', decode_image), data)
+        if img is None:
+            ERRORS.labels('decode').inc()
+            logger.warning("Could not decode uploaded file for sample_no=%s", sample_no)
+            raise HTTPException(status_code=400, detail=f"Uploaded file for {sample_no} is not a valid image")
+        plates.append((index, sample_no, digest, file.filename, data, img, cache_key))
+    if not plates:
+        logger.info("Batch prediction served entirely from cache (%d plates)", len(results))
+        return JSONResponse(status_code=200, content={'results': results})
+
+    # 2. Store the originals (identical uploads share one file)
+    plates = [(index, sample_no, digest, image_store.save_original(data, digest, filename), data, img, cache_key)
+              for index, sample_no, digest, filename, data, img, cache_key in plates]
+
+    for plate in plates:
+        cache.begin(plate[-1])
+    try:
+        await _infer_many(plates, results, db)
+    finally:
+        for plate in plates:
+            cache.end(plate[-1])
+
+    logger.info("Batch prediction endpoint completed for %d plates", len(results))
+    return JSONResponse(status_code=200, content={'results': results})
+
+
+async def _infer_many(plates, results, db):
+
+    # 3. Run a single batched inference on the plate ROIs of the native-resolution frames
+    try:
+        crops = [await executor.run(timed('plate_roi', plate_locator.crop), plate[5]) for plate in plates]
+        with stage_timer('inference'):
+            outputs, model_version = await scheduler.submit_many(
+                [c for c, _, _ in crops], [grid_builder.wells(shift) for _, _, shift in crops],
+                [o for _, o, _ in crops]
+            )
+        logger.info("Batch prediction completed for %d plates with model %s", len(plates), model_version)
+    except Exception as e:
+        logger.exception("Error during batch prediction: %s", e)
+        for _, sample_no, _, file_path, _, _, _ in plates:
+            await _fail_plate(db, sample_no, file_path, e)
+        raise _failure(e)
+
+    # 4. Persist per plate (one transaction each); one failing plate does not fail the others
+    for (index, sample_no, digest, file_path, _, img, cache_key), wells, (_, _, shift) in zip(plates, outputs, crops):
+        try:
+            result = await executor.run(_finish_plate, cache_key, wells, model_version, shift)
+            result['thumbnail_path'] = _save_thumbnail(digest, img)
+            response = await _save_plate(db, sample_no, file_path, result, None, cache_key)
+            cache.put(cache_key, response)
+            results[index] = {'sample_no': sample_no, **response}
+        except Exception as e:
+            run_id = await _fail_plate(db, sample_no, file_path, e)
+            logger.exception("Error saving results for run_id=%s: %s", run_id, e)
+            results[index] = {'sample_no': sample_no, 'run_id': run_id, 'error': str(e)}
+
+
+@router.get("/scheduler/stats")
+async def scheduler_stats():
+    """สถิติของ inference scheduler และ executor: ความลึกคิว ขนาด batch และงานที่ถูกปฏิเสธ"""
+    return {**scheduler.stats(), 'executor': executor.stats(), 'jobs': jobs.stats(), 'cache': cache.stats(),
+            'image_writer': image_writer.stats(), 'plate_roi': plate_locator.stats(),
+            'read_cache': read_cache.stats(), 'profiling': profiler.stats(), 'image_store': image_store.stats()}
+
+
+def _run_body(run):
+    body = {
+        'run_id': run.id,
+        'sample_no': run.sample_no,
+        'status': run.status,
+        'error_msg': run.error_msg,
+        'model_version': run.model_version,
+        'predict_at': run.predict_at.isoformat() if run.predict_at else None,
+    }
+    if run.status == 'done':
+        counts = run.row_counts[-1].counts if run.row_counts else {}
+        results = run.interface_results[-1].results if run.interface_results else {}
+        body.update({
+            'counts': counts.get('raw_count'),
+            'last_positions': counts.get('last_positions'),
+            'distribution': results.get('distribution'),
+            'annotated_image': run.annotated_image_path,
+            'annotated_url': _annotated_url(run.id),
+        })
+    return body
+
+
+def _run_summary(run):
+    """Row of GET /runs: metadata and distribution only."""
+    results = run.interface_results[-1].results if run.interface_results else {}
+    return {
+        'run_id': run.id,
+        'sample_no': run.sample_no,
+        'status': run.status,
+        'model_version': run.model_version,
+        'predict_at': run.predict_at.isoformat() if run.predict_at else None,
+        'distribution': results.get('distribution'),
+        'annotated_url': _annotated_url(run.id) if run.status == 'done' else None,
+    }
+
+
+def _run_detail(run):
+    body = _run_body(run)
+    body['well_predictions'] = [
+        {'label': wp.label, 'class': wp.class_name, 'confidence': wp.confidence, 'bbox': wp.bbox}
+        for wp in run.well_predictions
+    ]
+    body['image_files'] = [{'file_type': f.file_type, 'path': f.path} for f in run.image_files]
+    return body
+
+
+async def _load_run_body(db, run_id, details=False):
+    run = await query_run(db, run_id, details=details)
+    if run is None:
+        return None
+    return _run_detail(run) if details else _run_body(run)
+
+
+async def _list_runs_body(db, sample_no, status, since, until, cursor, limit):
+    runs, next_cursor = await list_runs(db, sample_no=sample_no, status=status, since=since,
+                                  until=until, cursor=cursor, limit=limit)
+    return {'items': [_run_summary(run) for run in runs], 'next_cursor': next_cursor}
+
+
+def _read_cache_key(request):
+    return f"{request.url.path}?{sorted(request.query_params.multi_items())}"
+
+
+async def _poll_run_body(run_id):
+    """Load a run with a fresh session so repeated polls see committed changes."""
+    async with SessionLocal() as db:
+        return await _load_run_body(db, run_id)
+
+
+@router.get("/runs")
+async def get_runs(
+    request: Request,
+    sample_no: Optional[str] = None,
+    status: Optional[str] = Query(None, pattern="^(pending|running|done|error)$"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(Config.RUNS_PAGE_SIZE, ge=1, le=Config.RUNS_PAGE_MAX),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    รายการ run (ใหม่ -> เก่า) กรองตาม sample_no / ช่วงเวลา / status
+    แบ่งหน้าแบบ keyset: ส่ง next_cursor ของหน้าก่อนเป็น cursor เพื่อขอหน้าถัดไป
+    """
+    key = _read_cache_key(request)
+    entry = read_cache.get(key)
+    if entry is None:
+        try:
+            body = await _list_runs_body(db, sample_no, status, since, until, cursor, limit)
+        except ValueError as err:
+            raise HTTPException(status_code=400, detail=str(err))
+        entry = (body, make_etag(body))
+        read_cache.put(key, entry)
+    return conditional_json(request, *entry, max_age=Config.RUNS_CACHE_TTL)
+
+
+@router.get("/runs/{run_id}")
+async def get_run(run_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    """สถานะและผลลัพธ์ของ run พร้อม well_predictions (ใช้ติดตามงาน mode=async ได้ด้วย)"""
+    key = _read_cache_key(request)
+    entry = read_cache.get(key)
+    if entry is None:
+        body = await _load_run_body(db, run_id, True)
+        if body is None:
+            raise HTTPException(status_code=404, detail="Run not found")
+        entry = (body, make_etag(body))
+        # run ที่ยังไม่จบสถานะเปลี่ยนได้ตลอด จึงไม่ cache
+        if body['status'] in FINAL_STATUSES:
+            read_cache.put(key, entry)
+    return conditional_json(request, *entry, max_age=Config.RUNS_CACHE_TTL)
+
+
+def _render_annotated(original, path, predictions, shift=None):
+    """
+    Draw the stored predictions on the original image (thread pool); returns the encoded bytes or None.
+    shift is the grid shift stored with the run, so the grid matches the wells the counts came from.
+    """
+    img = cv2.imread(original) if original else None
+    if img is None:
+        return None
+    with stage_timer('grid'):
+        annotated = render_annotated(img, grid_builder, predictions, registry.class_ids(), shift)
+    data = image_writer.encode(annotated)
+    image_writer.submit_bytes(path, data)
+    return data
+
+
+async def _annotated_image(db, run_id):
+    """
+    Annotated image of a finished run as (path, None) when already on disk, or (None, bytes)
+    right after rendering it from the original image and the stored well_prediction rows;
+    the rendered bytes are then written to annotated_image_path by the image writer.
+    """
+    run = await db.get(PredictionRun, run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    if run.status != 'done':
+        raise HTTPException(status_code=409, detail=f"Run is {run.status}")
+    path = run.annotated_image_path
+    if image_store.touch(path):
+        return path, None
+
+    run = await query_run(db, run_id, details=True)
+    original = next((f.path for f in run.image_files if f.file_type == 'original'), None)
+    if original:
+        image_store.touch(original)
+    predictions = [
+        {'class': wp.class_name, 'confidence': wp.confidence / 100, 'bbox': wp.bbox}
+        for wp in run.well_predictions
+    ]
+    results = run.interface_results[-1].results if run.interface_results else {}
+    data = await run_in_threadpool(_render_annotated, original, path, predictions, results.get('grid_shift'))
+    if data is None:
+        raise HTTPException(status_code=404, detail="Original image is not available")
+    if not any(f.file_type == 'annotated' for f in run.image_files):
+        db.add(ImageFile(run_id=run.id, sample_no=run.sample_no, file_type='annotated', path=path))
+        await db.commit()
+    logger.info("Rendered annotated image for run_id=%s, writing to %s", run_id, path)
+    return None, data
+
+
+@router.get("/runs/{run_id}/annotated")
+async def get_annotated_image(run_id: int, db: AsyncSession = Depends(get_db)):
+    """ภาพ annotated ของ run: วาดจาก well_prediction เมื่อถูกขอครั้งแรก แล้ว cache เป็นไฟล์"""
+    path, data = await _annotated_image(db, run_id)
+    headers = {"Cache-Control": "private, max-age=86400"}
+    if data is not None:
+        return Response(content=data, media_type=image_writer.media_type, headers=headers)
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+
+@router.get("/runs/{run_id}/events")
+async def run_events(run_id: int):
+    """
+    Server-sent events ของสถานะ run: ส่ง event 'status' ทุกครั้งที่สถานะเปลี่ยน
+    และปิด stream หลังส่งผลลัพธ์สุดท้าย (done/error)
+    """
+    body = await _poll_run_body(run_id)
+    if body is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+
+    async def stream():
+        current = body
+        last_status = None
+        state = jobs.get(run_id)
+        while True:
+            if current['status'] != last_status:
+                last_status = current['status']
+                yield f"event: status\ndata: {json.dumps(current)}\n\n"
+            if last_status in FINAL_STATUSES:
+                return
+            if state is not None:
+                # งานอยู่ใน process นี้: รอการแจ้งเตือนจาก JobManager
+                state = await jobs.wait_for_change(run_id, state, Config.SSE_POLL_SECONDS * 10)
+            else:
+                # งานอยู่ใน worker process อื่น: poll DB
+                await asyncio.sleep(Config.SSE_POLL_SECONDS)
+            if state is not None and state['status'] not in FINAL_STATUSES:
+                current = {**current, 'status': state['status']}
+            else:
+                current = await _poll_run_body(run_id) or current
+            if current['status'] == last_status:
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.post("/admin/plate-roi/reset", dependencies=[Depends(verify_admin)])
+async def reset_plate_roi():
+    """ล้าง ROI ของเพลตที่ cache ไว้ (หลังปรับตำแหน่งกล้อง) ให้หาใหม่ในเฟรมถัดไป"""
+    plate_locator.reset()
+    return plate_locator.stats()
+
+
+@router.get("/admin/models", dependencies=[Depends(verify_admin)])
+async def list_models():
+    """รายการโมเดลใน registry และเวอร์ชันที่ active"""
+    return registry.list()
+
+
+@router.post("/admin/models/activate", dependencies=[Depends(verify_admin)])
+async def activate_model(req: ActivateModelRequest):
+    """
+    โหลด + warm-up โมเดลเวอร์ชันใหม่ แล้วสลับมาใช้แบบ atomic โดยไม่ต้อง restart
+    request ที่กำลังรันอยู่จะจบด้วยโมเดลเดิม
+    path (ถ้าส่ง) ต้องเป็นไฟล์ใน MODEL_DIR (relative กับ MODEL_DIR หรือ absolute); ไม่ส่ง = เวอร์ชันที่ลงทะเบียนไว้แล้ว
+    """
+    if not registry.state_path and len(_worker_reports()) > 1:
+        # สลับได้แค่ใน worker ที่รับ request นี้: worker อื่นจะยังใช้โมเดลเดิม
+        raise HTTPException(status_code=409, detail="Activating a model with several workers requires MODEL_STATE_FILE")
+    path = _allowed_model_path(req.path) if req.path is not None else None
+    if req.backend is not None and req.backend.lower() not in BACKENDS:
+        raise HTTPException(status_code=400, detail=f"backend must be one of {sorted(BACKENDS)}")
+    try:
+        entry = await run_in_threadpool(registry.activate, req.version, path, req.backend)
+    except KeyError as err:
+        raise HTTPException(status_code=404, detail=str(err))
+    except Exception as err:
+        raise HTTPException(status_code=500, detail=f"Failed to activate model {req.version}: {err}")
+    # worker อื่นสลับตามภายใน MODEL_SYNC_SECONDS (+ เวลาโหลด / warm-up)
+    return {'active': entry.version, 'model': entry.info(),
+            'workers_sync_seconds': Config.MODEL_SYNC_SECONDS if registry.state_path else None}
+
+
+@router.get("/admin/profiles", dependencies=[Depends(verify_admin)])
+async def list_profiles(run_id: Optional[int] = None, limit: int = Query(50, ge=1, le=500)):
+    """รายการ profile ที่บันทึกไว้ (ใหม่ -> เก่า) กรองตาม run_id ได้"""
+    return {'items': await run_in_threadpool(profiler.list, run_id, limit), **profiler.stats()}
+
+
+@router.get("/admin/profiles/{profile_id}", dependencies=[Depends(verify_admin)])
+async def download_profile(profile_id: str, format: str = Query("html", pattern="^(html|json|pyisession)$")):
+    """ดาวน์โหลด profile: html (call tree), json (stages + metadata) หรือ pyisession (pyinstrument --load)"""
+    try:
+        path = profiler.path(profile_id, format)
+    except ValueError as err:
+        raise HTTPException(status_code=400, detail=str(err))
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type=PROFILE_FORMATS[format][1], filename=os.path.basename(path))
+
+
+@router.get("/admin/storage", dependencies=[Depends(verify_admin)])
+async def storage_stats():
+    """สถิติของ image store: จำนวนไฟล์ที่เก็บ / dedup / ถูกลบตาม retention และผลของ sweep ล่าสุด"""
+    return {**image_store.stats(), 'sweeper': sweeper.enabled, 'sweep_interval': sweeper.interval}
+
+
+@router.post("/admin/storage/sweep", dependencies=[Depends(verify_admin)])
+async def sweep_storage():
+    """ใช้ retention policy ทันที (ลบไฟล์ที่หมดอายุ / เกินงบขนาด และแถว image_file ที่อ้างถึง)"""
+    removed = await sweeper.run_once()
+    return {'removed': len(removed), **image_store.stats()}
+
+
+def _worker_reports():
+    if Config.WORKER_STATS_DIR:
+        return [r for r in read_reports(Config.WORKER_STATS_DIR) if r['role'] == 'worker'] or [snapshot()]
+    return [snapshot()]
+
+
+@router.get("/admin/workers", dependencies=[Depends(verify_admin)])
+async def worker_stats():
+    """หน่วยความจำ (rss / pss / shared / private) และจำนวน thread ของแต่ละ worker process"""
+    if Config.WORKER_STATS_DIR:
+        reports = await run_in_threadpool(read_reports, Config.WORKER_STATS_DIR)
+    else:
+        reports = [snapshot()]
+    return {'served_by': os.getpid(), 'processes': reports, 'total': summarize(reports)}
@@ -1,6 +1,7 @@
 # utils/config.py
 from dotenv import load_dotenv
 import os
+import time
 from pathlib import Path
 
 # 1. หาโฟลเดอร์ services (สองระดับเหนือไฟล์นี้)
@@ -29,6 +30,20 @@ class Config:
     
     # Full Database URL
     FULL_DATABASE_URL: str = f"postgresql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    # Async driver URL; DATABASE_URL overrides it (e.g. sqlite+aiosqlite:///./test.db for local tests)
+    ASYNC_DATABASE_URL: str = os.getenv(
+        "DATABASE_URL",
+        f"postgresql+asyncpg://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
+    )
+
+    # Connection pool (async engine)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds waiting for a connection
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds, -1 = never
+    # prepared statements cached per connection; 0 when running behind pgbouncer (transaction pooling)
+    DB_STATEMENT_CACHE_SIZE: int = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+    DB_ECHO: bool = os.getenv("DB_ECHO", "false").lower() in ("1", "true", "yes")
    
     # CORS Settings
     CORS_ALLOWED_ORIGINS: list = os.getenv("CORS_ALLOWED_ORIGINS", "").split(",")
@@ -38,6 +53,8 @@ class Config:
     
     # API Key and Secrets
     API_KEY: str = os.getenv("API_KEY", "default_api_key")
+    # admin routes (/admin/*, profiling) are disabled unless ADMIN_API_KEY is set to a non-default value
+    ADMIN_API_KEY: str = os.getenv("ADMIN_API_KEY", "")
     JWT_SECRET_KEY: str = os.getenv("JWT_SECRET_KEY", "")
     SECRET_KEY: str = os.getenv("SECRET_KEY", "")
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
@@ -51,4 +68,97 @@ class Config:
     MODEL_VERSION : str = os.getenv("MODEL_VERSION", "0.0")
     UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "/tmp")
     MODEL_PATH: str = os.getenv("MODEL_PATH", "")
+    # POST /admin/models/activate only loads model files under this directory (empty = registered versions only)
+    MODEL_DIR: str = os.getenv("MODEL_DIR", "")
+
+    # Inference backend: "torch" (ultralytics/PyTorch) or "onnx" (ONNX Runtime CPU)
+    INFERENCE_BACKEND: str = os.getenv("INFERENCE_BACKEND", "torch")
+    ONNX_MODEL_PATH: str = os.getenv("ONNX_MODEL_PATH", "")
+    ONNX_INTRA_OP_THREADS: int = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+    CONF_THRESHOLD: float = float(os.getenv("CONF_THRESHOLD", "0.4"))
+    IOU_THRESHOLD: float = float(os.getenv("IOU_THRESHOLD", "0.7"))
+    INFERENCE_IMGSZ: int = int(os.getenv("INFERENCE_IMGSZ", "0"))  # 0 = model default
+
+    # Plate ROI before inference: off | fixed (PLATE_ROI="x0,y0,x1,y1") | auto
+    PLATE_ROI_MODE: str = os.getenv("PLATE_ROI_MODE", "off").lower()
+    PLATE_ROI: str = os.getenv("PLATE_ROI", "")
+    PLATE_ROI_REFRESH: str = os.getenv("PLATE_ROI_REFRESH", "once").lower()  # once | per_frame
+    PLATE_ROI_PADDING: float = float(os.getenv("PLATE_ROI_PADDING", "0.02"))  # fraction of frame size
+    # plate ROI "x0,y0,x1,y1" where the grid was calibrated; auto mode moves the wells with the detected plate
+    PLATE_ROI_REFERENCE: str = os.getenv("PLATE_ROI_REFERENCE", "")
+
+    # Read APIs (GET /runs, GET /runs/{id})
+    RUNS_PAGE_SIZE: int = int(os.getenv("RUNS_PAGE_SIZE", "50"))
+    RUNS_PAGE_MAX: int = int(os.getenv("RUNS_PAGE_MAX", "200"))
+    RUNS_CACHE_TTL: float = float(os.getenv("RUNS_CACHE_TTL", "2"))  # seconds, 0 = no cache
+
+    # Result cache: sha256(image) + sample_no + model version + thresholds -> stored result
+    RESULT_CACHE_SIZE: int = int(os.getenv("RESULT_CACHE_SIZE", "1024"))  # 0 = disabled
+    RESULT_CACHE_TTL: int = int(os.getenv("RESULT_CACHE_TTL", "3600"))  # seconds
+    # also index results in microplates.prediction_cache (shared across workers/restarts)
+    RESULT_CACHE_DB_INDEX: bool = os.getenv("RESULT_CACHE_DB_INDEX", "false").lower() in ("1", "true", "yes")
+
+    # Image persistence (background writer): jpeg | webp | png
+    IMAGE_FORMAT: str = os.getenv("IMAGE_FORMAT", "jpeg")
+    IMAGE_JPEG_QUALITY: int = int(os.getenv("IMAGE_JPEG_QUALITY", "90"))
+    IMAGE_WEBP_QUALITY: int = int(os.getenv("IMAGE_WEBP_QUALITY", "80"))
+    IMAGE_PNG_COMPRESSION: int = int(os.getenv("IMAGE_PNG_COMPRESSION", "3"))  # 0-9
+    THUMBNAIL_WIDTH: int = int(os.getenv("THUMBNAIL_WIDTH", "320"))  # 0 = no thumbnail
+    THUMBNAIL_QUALITY: int = int(os.getenv("THUMBNAIL_QUALITY", "75"))
+    IMAGE_WRITER_WORKERS: int = int(os.getenv("IMAGE_WRITER_WORKERS", "1"))
+    IMAGE_WRITER_MAX_PENDING: int = int(os.getenv("IMAGE_WRITER_MAX_PENDING", "256"))
+
+    # Content-addressed image store (originals, thumbnails, annotated images), sharded by hash prefix
+    IMAGE_STORE_DIR: str = os.getenv("IMAGE_STORE_DIR", os.path.join(UPLOAD_DIR, "images"))
+    IMAGE_RETENTION_DAYS: float = float(os.getenv("IMAGE_RETENTION_DAYS", "0"))  # since last use, 0 = keep
+    IMAGE_STORE_MAX_MB: int = int(os.getenv("IMAGE_STORE_MAX_MB", "0"))  # size budget (LRU eviction), 0 = unlimited
+    IMAGE_STORE_SWEEP_SECONDS: int = int(os.getenv("IMAGE_STORE_SWEEP_SECONDS", "3600"))  # 0 = no background sweep
+    IMAGE_STORE_GRACE_SECONDS: int = int(os.getenv("IMAGE_STORE_GRACE_SECONDS", "600"))  # never evict newer files
+
+    # Model registry: load + warm up the active model in the background at startup
+    PRELOAD_MODEL: bool = os.getenv("PRELOAD_MODEL", "true").lower() in ("1", "true", "yes")
+    # active model version shared by all workers: /admin/models/activate writes it, every worker polls it
+    # and loads + switches when it changes. Anyone who can write it can switch models, so keep it in a
+    # directory only the service writes (not /tmp). Empty (default) = no sharing; activation is then
+    # refused with several workers
+    MODEL_STATE_FILE: str = os.getenv("MODEL_STATE_FILE", "")
+    MODEL_SYNC_SECONDS: float = float(os.getenv("MODEL_SYNC_SECONDS", "2"))
+    # warm-up frame size
+    WARMUP_HEIGHT: int = int(os.getenv("WARMUP_HEIGHT", "1080"))
+    WARMUP_WIDTH: int = int(os.getenv("WARMUP_WIDTH", "1440"))
     PORT: int = int(os.getenv("PORT", "3104"))
+
+    # Prefork serving (python -m app.serve): the model is loaded in the parent and shared copy-on-write
+    PREFORK_WORKERS: int = int(os.getenv("PREFORK_WORKERS", "2"))
+    TORCH_THREADS_PER_WORKER: int = int(os.getenv("TORCH_THREADS_PER_WORKER", "0"))  # 0 = cpu_count // workers
+    PREFORK_TIMEOUT: int = int(os.getenv("PREFORK_TIMEOUT", "120"))  # seconds before a stuck worker is restarted
+    # per-worker memory / thread snapshots (GET /admin/workers); set by app.serve
+    WORKER_STATS_DIR: str = os.getenv("WORKER_STATS_DIR", "")
+    WORKER_STATS_SECONDS: float = float(os.getenv("WORKER_STATS_SECONDS", "15"))
+
+    # Opt-in profiling of POST /predict (?profile=true or X-Profile: 1, ADMIN_API_KEY in X-API-Key required)
+    PROFILING_ENABLED: bool = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", os.path.join(UPLOAD_DIR, "profiles"))
+    PROFILE_RATE_PER_MINUTE: float = float(os.getenv("PROFILE_RATE_PER_MINUTE", "6"))
+    PROFILE_INTERVAL: float = float(os.getenv("PROFILE_INTERVAL", "0.001"))  # sampling interval, seconds
+    PROFILE_KEEP: int = int(os.getenv("PROFILE_KEEP", "200"))  # profiles kept on disk
+
+    # Batch prediction
+    MAX_BATCH_IMAGES: int = int(os.getenv("MAX_BATCH_IMAGES", "16"))
+
+    # Inference scheduler (dynamic micro-batching)
+    INFER_MAX_BATCH_SIZE: int = int(os.getenv("INFER_MAX_BATCH_SIZE", "8"))
+    INFER_MAX_WAIT_MS: float = float(os.getenv("INFER_MAX_WAIT_MS", "10"))
+
+    # Inference executor and admission control
+    INFERENCE_WORKERS: int = int(os.getenv("INFERENCE_WORKERS", "2"))
+    INFERENCE_MAX_PENDING: int = int(os.getenv("INFERENCE_MAX_PENDING", "32"))
+    INFERENCE_RETRY_AFTER: int = int(os.getenv("INFERENCE_RETRY_AFTER", "2"))
+
+    # Async prediction jobs (mode=async)
+    ASYNC_WORKERS: int = int(os.getenv("ASYNC_WORKERS", "2"))
+    ASYNC_MAX_QUEUE: int = int(os.getenv("ASYNC_MAX_QUEUE", "64"))
+    SSE_POLL_SECONDS: float = float(os.getenv("SSE_POLL_SECONDS", "1.0"))
+    # start time of this deployment (set once for all workers by app.serve / app.main); async runs left
+    # pending/running from before it are re-queued from their stored original at startup
+    STARTED_AT: float = float(os.getenv("PREDICTOR_STARTED_AT") or time.time())
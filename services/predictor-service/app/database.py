@@ -1,22 +1,52 @@
 ## app/database.py
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from app.config import Config
+from app.models.predict_result_model import SCHEMA
 
-# Create SQLAlchemy Engine
-engine = create_engine(Config.FULL_DATABASE_URL, pool_pre_ping=True)
+
+def make_engine(url=None):
+    """
+    Create the async SQLAlchemy engine.
+    - postgresql+asyncpg: pooled connections (size/overflow/timeout/recycle) and per-connection
+      prepared statement caches sized by DB_STATEMENT_CACHE_SIZE
+    - sqlite+aiosqlite: local stand-in for tests; SQLite has no schemas, so "microplates" is mapped away
+    """
+    url = url or Config.ASYNC_DATABASE_URL
+    if url.startswith("sqlite"):
+        return create_async_engine(
+            url,
+            echo=Config.DB_ECHO,
+            execution_options={"schema_translate_map": {SCHEMA: None}},
+        )
+    return create_async_engine(
+        url,
+        echo=Config.DB_ECHO,
+        pool_size=Config.DB_POOL_SIZE,
+        max_overflow=Config.DB_MAX_OVERFLOW,
+        pool_timeout=Config.DB_POOL_TIMEOUT,
+        pool_recycle=Config.DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+        connect_args={
+            # SQLAlchemy's own cache of prepared statements and asyncpg's statement cache
+            "prepared_statement_cache_size": Config.DB_STATEMENT_CACHE_SIZE,
+            "statement_cache_size": Config.DB_STATEMENT_CACHE_SIZE,
+        },
+    )
+
+
+# Create SQLAlchemy Engine (connections are opened lazily on first use)
+engine = make_engine()
 
 # Create Session Factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: ORM objects stay readable after commit without an implicit (blocking) refresh
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 # Base Model for SQLAlchemy (ใช้ร่วมกันกับโมเดลทั้งหมด)
 Base = declarative_base()
 
-def get_db():
-    """Provide a database session and ensure proper cleanup."""
-    db = SessionLocal()
-    try:
+async def get_db():
+    """Provide an async database session and ensure proper cleanup."""
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -1,10 +1,21 @@
 ## /app/main.py
+import time
+# เวลาเริ่ม import ของ app (ใช้รายงานเวลา startup ใน /ready)
+_import_started = time.perf_counter()
+
 import os
+import asyncio
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 from app.config import Config
-from app.api.v1.endpoints import router as api_router
+from app.database import engine
+from app.api.v1.endpoints import (router as api_router, scheduler, executor, jobs, registry, image_writer,
+                                  cache, sweeper, recover_jobs)
+from app.utils.metrics import (metrics_middleware, metrics_response, register_gauges, refresh_gauges,
+                               observe_process)
+from app.utils import process_stats
 
 # Initialize FastAPI app
 app = FastAPI()
@@ -12,6 +23,16 @@ app = FastAPI()
 # Initialize Logger
 logger = logging.getLogger(__name__)
 
+# เวลา startup (วินาที): import ของ app, จนถึง startup event เสร็จ, และจนโมเดล warm
+startup = {
+    'import_seconds': round(time.perf_counter() - _import_started, 3),
+    'started': False,
+    'startup_seconds': None,
+    'model_ready_seconds': None,
+}
+# background task ของ process นี้ (ยกเลิกตอน shutdown)
+_tasks = []
+
 # Configure CORS Middleware
 app.add_middleware(
     CORSMiddleware,
@@ -21,19 +42,127 @@ app.add_middleware(
     allow_headers=Config.CORS_ALLOW_HEADERS,
 )
 
+# Prometheus: latency / in-flight / errors ของทุก request
+app.middleware("http")(metrics_middleware)
+register_gauges({
+    'inference_pending': lambda: executor.stats()['pending'],
+    'inference_rejected': lambda: executor.stats()['rejected'],
+    'scheduler_queue_depth': lambda: scheduler.stats()['queue_depth'],
+    'async_jobs_queued': lambda: jobs.stats()['queued'],
+    'image_writer_pending': lambda: image_writer.stats()['pending'],
+    'result_cache_entries': lambda: cache.stats()['entries'],
+})
+
 # Health Check Endpoint
 @app.get("/health", tags=["Health Check"])
 async def health_check():
     logger.debug("Health check endpoint called.")
     return {"status": "healthy"}
 
+@app.get("/ready", tags=["Health Check"])
+async def readiness():
+    """
+    Readiness (ต่างจาก /health ซึ่งบอกแค่ว่า process ยังทำงาน): 200 เมื่อ startup เสร็จและโมเดล active
+    ถูกโหลด + warm-up แล้ว (ถ้าปิด PRELOAD_MODEL จะ ready ทันทีและโหลดโมเดลใน request แรก) มิฉะนั้น 503
+    """
+    model = registry.active_info()
+    ready = startup['started'] and (registry.is_ready() or not Config.PRELOAD_MODEL)
+    if ready:
+        status = 'ready'
+    else:
+        status = 'failed' if model and model['status'] == 'failed' else 'starting'
+    return JSONResponse(status_code=200 if ready else 503,
+                        content={'status': status, 'model': model, 'startup': startup})
+
+@app.get("/metrics", tags=["Monitoring"])
+async def metrics():
+    return metrics_response()
+
+@app.on_event("startup")
+async def start_scheduler():
+    await scheduler.start()
+    await jobs.start()
+    try:
+        # run แบบ async ที่ค้างจาก process ก่อนหน้า (restart / crash)
+        await recover_jobs()
+    except Exception:
+        logger.exception("Could not recover interrupted async runs")
+    # retention ของ image store (ถ้าตั้ง IMAGE_RETENTION_DAYS / IMAGE_STORE_MAX_MB)
+    await sweeper.start()
+    _tasks.append(asyncio.create_task(_report_worker_stats()))
+    if registry.state_path and Config.MODEL_SYNC_SECONDS > 0:
+        _tasks.append(asyncio.create_task(_sync_model()))
+    if Config.PRELOAD_MODEL:
+        # โหลด + warm-up โมเดลใน background เพื่อไม่ให้ plate แรกต้องรอ cold start
+        asyncio.get_running_loop().run_in_executor(None, _preload_model)
+    startup['started'] = True
+    startup['startup_seconds'] = round(time.perf_counter() - _import_started, 3)
+    logger.info("Predictor started in %.2fs (imports %.2fs)", startup['startup_seconds'], startup['import_seconds'])
+
+
+async def _report_worker_stats():
+    """หน่วยความจำ / thread ของ worker นี้ -> Prometheus และไฟล์ใน WORKER_STATS_DIR (prefork)"""
+    while True:
+        # แยก try: probe ที่ล้มเหลวไม่ทำให้ gauge ตัวอื่นหยุดอัปเดต
+        try:
+            refresh_gauges()
+        except Exception:
+            logger.exception("Failed to refresh gauges")
+        try:
+            snap = process_stats.snapshot()
+            observe_process(snap)
+            if Config.WORKER_STATS_DIR:
+                process_stats.write_report(Config.WORKER_STATS_DIR, snap)
+        except Exception:
+            logger.exception("Failed to report worker stats")
+        await asyncio.sleep(Config.WORKER_STATS_SECONDS)
+
+
+async def _sync_model():
+    """สลับตามเวอร์ชันโมเดลที่ worker อื่น activate ไว้ (MODEL_STATE_FILE)"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(Config.MODEL_SYNC_SECONDS)
+        try:
+            # โหลด + warm-up อยู่ใน thread: event loop ยังรับ request ด้วยโมเดลเดิม
+            await loop.run_in_executor(None, registry.sync)
+        except Exception:
+            logger.exception("Failed to sync the active model version")
+
+
+def _preload_model():
+    try:
+        # เริ่มจากเวอร์ชันที่ activate ไว้ล่าสุด (ถ้ามี) แทน MODEL_VERSION ใน config
+        registry.sync()
+        registry.acquire()
+    except Exception:
+        logger.exception("Model preload failed; it will be retried on the first request")
+        return
+    startup['model_ready_seconds'] = round(time.perf_counter() - _import_started, 3)
+    logger.info("Model warm after %.2fs, predictor is ready", startup['model_ready_seconds'])
+
+@app.on_event("shutdown")
+async def stop_scheduler():
+    for task in _tasks:
+        task.cancel()
+    if Config.WORKER_STATS_DIR:
+        process_stats.remove_report(Config.WORKER_STATS_DIR, os.getpid())
+    await sweeper.stop()
+    await jobs.stop()
+    await scheduler.stop()
+    executor.shutdown()
+    image_writer.shutdown()
+    await engine.dispose()
+
 # Route Registration
 app.include_router(api_router, prefix="/api/v1/predictor")
 
-# Main entry point for development
+# Main entry point for development (production: python -m app.serve shares one model across workers)
 if __name__ == "__main__":
     import uvicorn
     HOST = os.getenv("HOST", "0.0.0.0")
     PORT = Config.PORT
     logger.info(f"Starting server at {HOST}:{PORT}")
+    # เวลา start เดียวกันทุก worker (ใช้แยก run ที่ค้างจาก process ก่อนหน้าออกจากงานของ worker อื่น)
+    os.environ.setdefault("PREDICTOR_STARTED_AT", str(time.time()))
     uvicorn.run("app.main:app", host=HOST, port=PORT, reload=True, workers=2)
@@ -1,11 +1,13 @@
 ## app/models/predict_result_model.py
-from sqlalchemy import (Column, Integer, String, DateTime, Text, ForeignKey)
+from sqlalchemy import (Column, Integer, String, DateTime, Text, ForeignKey, JSON)
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime
 
 Base = declarative_base()
 SCHEMA = "microplates"
+# JSONB บน Postgres, JSON บน SQLite (ใช้แทน Postgres ตอนทดสอบ)
+JSONType = JSONB().with_variant(JSON(), 'sqlite')
 
 class PredictionRun(Base):
     __tablename__ = 'prediction_run'
@@ -27,7 +29,7 @@ class PredictionRun(Base):
     image_files = relationship('ImageFile', back_populates='run', cascade='all, delete-orphan')
 
     @staticmethod
-    def create(db, sample_no, description, annotated_image_path,
+    async def create(db, sample_no, description, annotated_image_path,
                model_version=None, status='pending', error_msg=None):
         run = PredictionRun(
             sample_no=sample_no,
@@ -38,8 +40,8 @@ class PredictionRun(Base):
             error_msg=error_msg
         )
         db.add(run)
-        db.commit()
-        db.refresh(run)
+        await db.commit()
+        await db.refresh(run)
         return run
 
 class RawPredict(Base):
@@ -48,17 +50,17 @@ class RawPredict(Base):
 
     id = Column(Integer, primary_key=True)
     run_id = Column(Integer, ForeignKey(f"{SCHEMA}.prediction_run.id", ondelete='CASCADE'), nullable=False)
-    raw_data = Column(JSONB, nullable=False)
+    raw_data = Column(JSONType, nullable=False)
     created_at = Column(DateTime(timezone=True), nullable=False, default=datetime.utcnow)
 
     run = relationship('PredictionRun', back_populates='raw_predicts')
 
     @staticmethod
-    def create(db, run_id, raw_data):
+    async def create(db, run_id, raw_data):
         rp = RawPredict(run_id=run_id, raw_data=raw_data)
         db.add(rp)
-        db.commit()
-        db.refresh(rp)
+        await db.commit()
+        await db.refresh(rp)
         return rp
 
 class RowCounts(Base):
@@ -67,17 +69,17 @@ class RowCounts(Base):
 
     id = Column(Integer, primary_key=True)
     run_id = Column(Integer, ForeignKey(f"{SCHEMA}.prediction_run.id", ondelete='CASCADE'), nullable=False)
-    counts = Column(JSONB, nullable=False)
+    counts = Column(JSONType, nullable=False)
     created_at = Column(DateTime(timezone=True), nullable=False, default=datetime.utcnow)
 
     run = relationship('PredictionRun', back_populates='row_counts')
 
     @staticmethod
-    def create(db, run_id, counts):
+    async def create(db, run_id, counts):
         rc = RowCounts(run_id=run_id, counts=counts)
         db.add(rc)
-        db.commit()
-        db.refresh(rc)
+        await db.commit()
+        await db.refresh(rc)
         return rc
 
 class InterfaceResults(Base):
@@ -86,17 +88,17 @@ class InterfaceResults(Base):
 
     id = Column(Integer, primary_key=True)
     run_id = Column(Integer, ForeignKey(f"{SCHEMA}.prediction_run.id", ondelete='CASCADE'), nullable=False)
-    results = Column(JSONB, nullable=False)
+    results = Column(JSONType, nullable=False)
     created_at = Column(DateTime(timezone=True), nullable=False, default=datetime.utcnow)
 
     run = relationship('PredictionRun', back_populates='interface_results')
 
     @staticmethod
-    def create(db, run_id, results):
+    async def create(db, run_id, results):
         ir = InterfaceResults(run_id=run_id, results=results)
         db.add(ir)
-        db.commit()
-        db.refresh(ir)
+        await db.commit()
+        await db.refresh(ir)
         return ir
 
 class WellPrediction(Base):
@@ -108,13 +110,13 @@ class WellPrediction(Base):
     label = Column(String, nullable=False)
     class_name = Column('class', String, nullable=False)
     confidence = Column(Integer, nullable=False)
-    bbox = Column(JSONB, nullable=False)
+    bbox = Column(JSONType, nullable=False)
     created_at = Column(DateTime(timezone=True), nullable=False, default=datetime.utcnow)
 
     run = relationship('PredictionRun', back_populates='well_predictions')
 
     @staticmethod
-    def create(db, run_id, label, class_name, confidence, bbox):
+    async def create(db, run_id, label, class_name, confidence, bbox):
         wp = WellPrediction(
             run_id=run_id,
             label=label,
@@ -123,8 +125,8 @@ class WellPrediction(Base):
             bbox=bbox
         )
         db.add(wp)
-        db.commit()
-        db.refresh(wp)
+        await db.commit()
+        await db.refresh(wp)
         return wp
 
 class ImageFile(Base):
@@ -135,13 +137,13 @@ class ImageFile(Base):
     run_id = Column(Integer, ForeignKey(f"{SCHEMA}.prediction_run.id", ondelete='CASCADE'), nullable=False)
     sample_no = Column(String, nullable=False)
     file_type = Column(String, nullable=False)
-    path = Column(String, nullable=False)
+    path = Column(String, nullable=False, index=True)
     created_at = Column(DateTime(timezone=True), nullable=False, default=datetime.utcnow)
 
     run = relationship('PredictionRun', back_populates='image_files')
 
     @staticmethod
-    def create(db, run_id, sample_no, file_type, path):
+    async def create(db, run_id, sample_no, file_type, path):
         img = ImageFile(
             run_id=run_id,
             sample_no=sample_no,
@@ -149,6 +151,15 @@ class ImageFile(Base):
             path=path
         )
         db.add(img)
-        db.commit()
-        db.refresh(img)
-        return img
\ No newline at end of file
+        await db.commit()
+        await db.refresh(img)
+        return img
+
+class PredictionCache(Base):
+    __tablename__ = 'prediction_cache'
+    __table_args__ = {'schema': SCHEMA}
+
+    id = Column(Integer, primary_key=True)
+    cache_key = Column(String, nullable=False, index=True)
+    run_id = Column(Integer, ForeignKey(f"{SCHEMA}.prediction_run.id", ondelete='CASCADE'), nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=datetime.utcnow)
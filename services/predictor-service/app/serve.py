@@ -0,0 +1,134 @@
+## app/serve.py
+"""
+Prefork serving: โหลด + warm-up โมเดลใน process แม่ แล้วค่อย fork worker (gunicorn + UvicornWorker)
+worker ทุกตัวใช้ weights ชุดเดียวกันแบบ copy-on-write แทนการโหลดคนละชุด (uvicorn --workers โหลดแยกทุก worker)
+
+    python -m app.serve
+    PREFORK_WORKERS=4 TORCH_THREADS_PER_WORKER=2 python -m app.serve
+
+- torch ใน process แม่ใช้ 1 thread ระหว่าง warm-up (thread pool ของ OpenMP ไม่รอดการ fork)
+  แล้วแต่ละ worker ตั้ง thread ของ torch / OpenCV เป็น TORCH_THREADS_PER_WORKER (0 = cpu_count // workers)
+  เพื่อไม่ให้ worker แย่ง core กัน
+- gc.freeze() ก่อน fork: garbage collector จะไม่เขียนทับ object ของ process แม่ (ซึ่งทำให้หน้าถูก copy)
+- ONNX backend: session ของ ONNX Runtime มี thread pool ของตัวเองซึ่งใช้หลัง fork ไม่ได้
+  จึงให้แต่ละ worker โหลด session เอง (จำกัด thread ตาม TORCH_THREADS_PER_WORKER เช่นกัน)
+- Prometheus รวมค่าจากทุก worker ผ่าน PROMETHEUS_MULTIPROC_DIR และแต่ละ worker รายงานหน่วยความจำ / thread
+  ที่ GET /api/v1/predictor/admin/workers
+"""
+import os
+import gc
+import sys
+import glob
+import time
+import tempfile
+import logging
+
+# ต้องตั้งก่อน import prometheus_client (ผ่าน app.main): โหมด multiprocess ถูกเลือกตอน import
+if not os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='predictor-metrics-')
+for _stale in glob.glob(os.path.join(os.environ['PROMETHEUS_MULTIPROC_DIR'], '*.db')):
+    os.remove(_stale)
+os.environ.setdefault('WORKER_STATS_DIR', os.path.join(os.environ['PROMETHEUS_MULTIPROC_DIR'], 'workers'))
+# เวลา start ของทั้งกลุ่ม: worker ที่ถูก fork ใหม่ภายหลังจะไม่นำงาน async ของ worker อื่นกลับเข้าคิวซ้ำ
+os.environ.setdefault('PREDICTOR_STARTED_AT', str(time.time()))
+
+from gunicorn.app.base import BaseApplication
+from prometheus_client import multiprocess
+
+from app.config import Config
+from app.utils import process_stats
+
+# ตั้งค่า logging
+logger = logging.getLogger(__name__)
+
+
+def threads_per_worker(workers):
+    return Config.TORCH_THREADS_PER_WORKER or max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def preload(registry, backend):
+    """โหลด + warm-up โมเดลที่ active ใน process แม่; คืน False ถ้า backend นี้ต้องโหลดในแต่ละ worker"""
+    if backend != 'torch':
+        logger.warning("Backend %s is loaded per worker (its thread pools do not survive fork)", backend)
+        return False
+    import torch
+
+    torch.set_num_threads(1)
+    # เวอร์ชันที่ activate ไว้ล่าสุด (MODEL_STATE_FILE) ถ้ามี: worker ที่ fork ออกไปจะไม่ต้องโหลดซ้ำ
+    registry.sync()
+    registry.acquire()
+    return True
+
+
+def post_fork(threads):
+    def hook(server, worker):
+        torch = sys.modules.get('torch')
+        if torch is not None:
+            torch.set_num_threads(threads)
+        cv2 = sys.modules.get('cv2')
+        if cv2 is not None:
+            cv2.setNumThreads(threads)
+        if not Config.ONNX_INTRA_OP_THREADS:
+            Config.ONNX_INTRA_OP_THREADS = threads
+    return hook
+
+
+def child_exit(server, worker):
+    multiprocess.mark_process_dead(worker.pid)
+    process_stats.remove_report(Config.WORKER_STATS_DIR, worker.pid)
+
+
+def on_exit(server):
+    process_stats.remove_report(Config.WORKER_STATS_DIR, os.getpid(), 'parent')
+
+
+class PreforkServer(BaseApplication):
+    """gunicorn ที่รัน app ซึ่งถูก import (และโหลดโมเดล) ไว้แล้วใน process แม่"""
+    def __init__(self, application, options):
+        self.application = application
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+def main():
+    logging.basicConfig(level=Config.LOG_LEVEL)
+    workers = max(1, Config.PREFORK_WORKERS)
+    threads = threads_per_worker(workers)
+
+    from app.main import app
+    from app.api.v1.endpoints import registry, backend_name
+
+    if Config.PRELOAD_MODEL and preload(registry, backend_name):
+        logger.info("Model %s loaded in the parent, forking %d workers", registry.active_version, workers)
+    snap = process_stats.snapshot('parent')
+    process_stats.write_report(Config.WORKER_STATS_DIR, snap)
+    logger.info("Parent process: rss %.1f MiB before fork", snap['rss_kb'] / 1024)
+
+    # object ที่มีอยู่ตอนนี้ (รวม model) ไม่ถูก gc สแกน/เขียนหลัง fork -> หน้ายัง share กับ worker
+    gc.collect()
+    gc.freeze()
+
+    options = {
+        'bind': f"{os.getenv('HOST', '0.0.0.0')}:{Config.PORT}",
+        'workers': workers,
+        'worker_class': 'uvicorn.workers.UvicornWorker',
+        'preload_app': True,
+        'timeout': Config.PREFORK_TIMEOUT,
+        'graceful_timeout': Config.PREFORK_TIMEOUT,
+        'post_fork': post_fork(threads),
+        'child_exit': child_exit,
+        'on_exit': on_exit,
+    }
+    logger.info("Starting %d workers with %d torch/OpenCV threads each", workers, threads)
+    PreforkServer(app, options).run()
+
+
+if __name__ == "__main__":
+    main()
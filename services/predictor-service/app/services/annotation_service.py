@@ -0,0 +1,32 @@
+## app/services/annotation_service.py
+import cv2
+import logging
+
+# ตั้งค่า logging
+logger = logging.getLogger(__name__)
+
+# กำหนดสีสำหรับแต่ละคลาส
+COLORS = {0: (255, 0, 0), 1: (0, 255, 0), 2: (0, 0, 255)}
+DEFAULT_COLOR = (0, 255, 255)
+
+
+def draw_predictions(image, predictions, class_ids):
+    """
+    วาด bbox + ชื่อคลาส/ความมั่นใจ ลงภาพ (in place)
+    predictions: list ของ {'class', 'confidence' (0-1), 'bbox' [x1, y1, x2, y2]} ในพิกัดกริด
+    class_ids: ชื่อคลาส -> class id (ใช้เลือกสี)
+    """
+    for pred in predictions:
+        x1, y1, x2, y2 = (int(v) for v in pred['bbox'])
+        color = COLORS.get(class_ids.get(pred['class']), DEFAULT_COLOR)
+        cv2.rectangle(image, (x1, y1), (x2, y2), color, 2)
+        cv2.putText(image, f"{pred['class']} {pred['confidence']:.2f}",
+                    (x1, y1-10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+    return image
+
+
+def render_annotated(original, grid_builder, predictions, class_ids, shift=None):
+    """สร้างภาพ annotated จากภาพต้นฉบับ: วาดกริด (เลื่อนตาม shift ของ run) แล้ววาด prediction ทับ"""
+    grid_img, _ = grid_builder.draw(original, shift)
+    return draw_predictions(grid_img, predictions, class_ids)
@@ -2,14 +2,11 @@
 import os
 import cv2
 import warnings
-import tempfile
-from ultralytics import YOLO
-from collections import defaultdict
-import pandas as pd
-import uuid
+import threading
+import numpy as np
+from collections import OrderedDict
 
 import logging
-from app.config import Config
 
 # ตั้งค่า logging
 logger = logging.getLogger(__name__)
@@ -23,33 +20,101 @@ COLORS = {0: (255, 0, 0), 1: (0, 255, 0), 2: (0, 0, 255)}
 class GridBuilder:
     """
     สร้างและวาดกริดบนภาพ
+    - ตำแหน่ง well และ overlay (เส้นกริด + label) คำนวณครั้งเดียวต่อ (ขนาดภาพ, scale, rows, cols)
+      แล้วเก็บใน LRU cache; แต่ละ request แค่ copy pixel ของ overlay ลงภาพ
     """
-    def __init__(self, rows=8, cols=12, scale=1.2):
+    def __init__(self, rows=8, cols=12, scale=1.2, cache_size=4):
         self.rows = rows
         self.cols = cols
         self.scale = scale
+        self.cache_size = cache_size
+        self._templates = OrderedDict()  # (h, w, c, scale, rows, cols) -> pre-rendered overlay
+        self._lock = threading.Lock()
+        self._geometry = self._build_geometry()
 
     def resize_image(self, image):
         h, w = image.shape[:2]
         new_dims = (int(w * self.scale), int(h * self.scale))
         return cv2.resize(image, new_dims, interpolation=cv2.INTER_LINEAR)
 
-    def draw(self, image):
-        resized = self.resize_image(image)
+    def _build_geometry(self):
+        """ตำแหน่งของทุก well: [(label, top_left, bottom_right), ...]"""
         cw = int(127 * self.scale)
         ch = int(126 * self.scale)
         ox, oy = cw, ch - 1
 
         labels = list("ABCDEFGH")
-        wells = []
+        geometry = []
         for i in range(self.rows):
             for j in range(self.cols):
                 tl = (j * cw + ox, i * ch + oy)
                 br = ((j + 1) * cw + ox, (i + 1) * ch + oy)
-                label = f"{labels[i]}{j+1}"
-                cv2.rectangle(resized, tl, br, (0, 0, 255), 2)
-                cv2.putText(resized, label, (tl[0]+10, tl[1]+30),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.75, (255, 0, 0), 2)
-                wells.append({"label": label, "top_left": tl, "bottom_right": br, "predictions": []})
-        logger.info("Grid drawn successfully.")
-        return resized, wells
\ No newline at end of file
+                geometry.append((f"{labels[i]}{j+1}", tl, br))
+        return geometry
+
+    def _render_template(self, shape, geometry):
+        """
+        วาดกริดลงภาพเปล่าหนึ่งครั้ง แล้วแยก pixel ที่ถูกวาดเป็น 2 กลุ่ม
+        - ทึบ (เส้นกริดและกลางตัวอักษร): copy สีตรง ๆ ด้วย mask
+        - ขอบตัวอักษรที่ anti-alias: เก็บ index, alpha และสีที่คูณ alpha แล้ว ไว้ blend กับภาพ
+        """
+        canvas = np.zeros(shape, dtype=np.uint8)
+        alpha = np.zeros(shape[:2], dtype=np.uint8)
+        for label, tl, br in geometry:
+            cv2.rectangle(canvas, tl, br, (0, 0, 255), 2)
+            cv2.rectangle(alpha, tl, br, 255, 2)
+            cv2.putText(canvas, label, (tl[0]+10, tl[1]+30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.75, (255, 0, 0), 2)
+            cv2.putText(alpha, label, (tl[0]+10, tl[1]+30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.75, 255, 2)
+        opaque = np.where(alpha == 255, 255, 0).astype(np.uint8)
+        index = np.flatnonzero((alpha > 0) & (alpha < 255))
+        edge_alpha = alpha.reshape(-1)[index].astype(np.uint16)[:, None]
+        edge_color = canvas.reshape(-1, shape[2])[index].astype(np.uint16) * 255
+        return canvas, opaque, index, 255 - edge_alpha, edge_color
+
+    def _template(self, shape, shift=None):
+        if shift is not None:
+            # กริดที่เลื่อนตามเพลตต่างกันแทบทุกภาพ: วาดใหม่โดยไม่ cache (ไม่ไล่ template ปกติออกจาก cache)
+            return self._render_template(shape, self._shifted(shift))
+        key = (*shape, self.scale, self.rows, self.cols)
+        with self._lock:
+            template = self._templates.get(key)
+            if template is not None:
+                self._templates.move_to_end(key)
+                return template
+        template = self._render_template(shape, self._geometry)
+        with self._lock:
+            self._templates[key] = template
+            while len(self._templates) > self.cache_size:
+                self._templates.popitem(last=False)
+        logger.info("Grid template cached for shape %s", shape)
+        return template
+
+    def wells(self, shift=None):
+        """
+        list ของ well ใหม่ (predictions ว่าง) จาก geometry ที่คำนวณไว้
+        shift: (sx, sy, dx, dy) ในพิกัดเฟรม เมื่อเพลตขยับจากตำแหน่งที่ calibrate ไว้ (PlateLocator.grid_shift)
+        """
+        geometry = self._geometry if shift is None else self._shifted(shift)
+        return [{"label": label, "top_left": tl, "bottom_right": br, "predictions": []}
+                for label, tl, br in geometry]
+
+    def _shifted(self, shift):
+        # พิกัดกริด = พิกัดเฟรม * scale: x' = x * sx + dx * scale
+        sx, sy, dx, dy = shift
+
+        def move(point):
+            return (int(round(point[0] * sx + dx * self.scale)), int(round(point[1] * sy + dy * self.scale)))
+        return [(label, move(tl), move(br)) for label, tl, br in self._geometry]
+
+    def draw(self, image, shift=None):
+        """วาดกริดบนภาพ (shift: เหมือน wells()); คืน (ภาพที่วาดแล้ว, wells)"""
+        shift = tuple(shift) if shift is not None else None
+        resized = self.resize_image(image)
+        canvas, opaque, index, inv_alpha, edge_color = self._template(resized.shape, shift)
+        cv2.copyTo(canvas, opaque, resized)
+        flat = resized.reshape(-1, resized.shape[2])
+        flat[index] = ((flat[index] * inv_alpha + edge_color + 127) // 255).astype(np.uint8)
+        logger.debug("Grid drawn successfully.")
+        return resized, self.wells(shift)
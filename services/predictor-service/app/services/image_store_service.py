@@ -0,0 +1,257 @@
+## app/services/image_store_service.py
+import os
+import time
+import fcntl
+import asyncio
+import hashlib
+import threading
+import logging
+
+# ตั้งค่า logging
+logger = logging.getLogger(__name__)
+
+# magic bytes -> นามสกุลไฟล์ (ใช้ตั้งชื่อไฟล์ต้นฉบับตามเนื้อหา ไม่ใช่ตามชื่อไฟล์ที่อัปโหลด)
+SIGNATURES = (
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'BM', '.bmp'),
+    (b'II*\x00', '.tif'),
+    (b'MM\x00*', '.tif'),
+)
+LOCK_FILE = '.sweep.lock'
+
+
+def sniff_extension(data, filename=None):
+    """นามสกุลจากเนื้อไฟล์ (fallback: นามสกุลของชื่อไฟล์ที่อัปโหลด)"""
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return '.webp'
+    for magic, ext in SIGNATURES:
+        if data.startswith(magic):
+            return ext
+    ext = os.path.splitext(filename or '')[1].lower()
+    return ext if ext.isascii() and ext[1:].isalnum() else '.bin'
+
+
+class ImageStore:
+    """
+    ที่เก็บไฟล์ภาพแบบ content-addressed แบ่ง shard ตาม prefix ของ hash: <root>/ab/cd/<hash><suffix><ext>
+    - ต้นฉบับใช้ sha256 ของไฟล์: อัปโหลดภาพเดิมซ้ำจะใช้ไฟล์เดิม (dedup) ไม่เขียนใหม่
+    - ไฟล์ที่สร้างจากต้นฉบับ (thumbnail, annotated) ใช้ key ของสิ่งที่กำหนดเนื้อหา เช่น cache key ของผลลัพธ์
+    - mtime ของไฟล์คือเวลาใช้งานล่าสุด (touch เมื่อถูกใช้ซ้ำ / ถูกอ่าน) ใช้ทำ retention และ LRU
+    - sweep(): ลบไฟล์ที่ไม่ได้ใช้เกิน max_age_seconds แล้วลบไฟล์ที่ใช้ล่าสุดนานที่สุดจนขนาดรวมไม่เกิน max_bytes
+      ไฟล์ที่อายุน้อยกว่า grace_seconds ไม่ถูกลบ (run ที่กำลังประมวลผลอาจยังอ้างถึงอยู่)
+    การเขียนไฟล์ทำผ่าน ImageWriter (background, atomic)
+    """
+    def __init__(self, root, writer, max_age_seconds=0, max_bytes=0, grace_seconds=600):
+        self.root = os.path.abspath(root)
+        self.writer = writer
+        self.max_age_seconds = max_age_seconds
+        self.max_bytes = max_bytes
+        self.grace_seconds = grace_seconds
+        self._lock = threading.Lock()
+        # สถิติ
+        self._stored = 0
+        self._deduplicated = 0
+        self._evicted = 0
+        self._evicted_bytes = 0
+        self._last_sweep = None
+
+    def path_for(self, digest, suffix='', ext=''):
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}{suffix}{ext}")
+
+    def derived_path(self, key, kind):
+        """path ของไฟล์ที่สร้างจากต้นฉบับ (kind เช่น 'annotated', 'thumb') ตาม key ที่กำหนดเนื้อหาของไฟล์"""
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return self.path_for(digest, f"_{kind}", self.writer.extension)
+
+    def contains(self, path):
+        return os.path.abspath(path).startswith(self.root + os.sep)
+
+    def touch(self, path):
+        """บันทึกการใช้งาน (LRU); คืน False ถ้าไฟล์ไม่มีแล้ว"""
+        try:
+            os.utime(path)
+        except OSError:
+            return False
+        return True
+
+    def _reuse(self, path):
+        if os.path.exists(path) and self.touch(path):
+            with self._lock:
+                self._deduplicated += 1
+            return True
+        return False
+
+    def save_original(self, data, digest, filename=None):
+        """เก็บไฟล์ที่อัปโหลด (ถ้ามีไฟล์เนื้อหาเดียวกันอยู่แล้วจะใช้ไฟล์นั้น); คืน path"""
+        path = self.path_for(digest, ext=sniff_extension(data, filename))
+        if not self._reuse(path):
+            self.writer.submit_bytes(path, data)
+            with self._lock:
+                self._stored += 1
+        return path
+
+    def save_thumbnail(self, digest, image):
+        """thumbnail ของต้นฉบับ digest (ย่อ + encode บน image writer); คืน path"""
+        path = self.derived_path(f"{digest}:{self.writer.thumbnail_width}", 'thumb')
+        if not self._reuse(path):
+            self.writer.submit_thumbnail(path, image)
+            with self._lock:
+                self._stored += 1
+        return path
+
+    def _scan(self):
+        """คืน [(mtime, size, path), ...] ของไฟล์ใน store; ลบไฟล์ .tmp ที่ค้างจากการเขียนไม่สำเร็จ"""
+        files = []
+        stale = time.time() - max(self.grace_seconds, 3600)
+        for shard in _subdirs(self.root):
+            for sub in _subdirs(shard):
+                with os.scandir(sub) as it:
+                    for entry in it:
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+                        try:
+                            st = entry.stat(follow_symlinks=False)
+                        except FileNotFoundError:
+                            continue
+                        if entry.name.endswith('.tmp'):
+                            if st.st_mtime < stale:
+                                _remove(entry.path)
+                            continue
+                        files.append((st.st_mtime, st.st_size, entry.path))
+        return files
+
+    def sweep(self, keep=()):
+        """
+        ใช้ retention policy หนึ่งรอบ (ทีละ process ผ่าน file lock); คืน list ของ path ที่ถูกลบ
+        เพื่อให้ผู้เรียกลบแถว image_file ที่อ้างถึง
+        keep: path ที่ห้ามลบ (เช่นต้นฉบับของ run ที่ยังไม่จบ)
+        """
+        if not os.path.isdir(self.root):
+            return []
+        with open(os.path.join(self.root, LOCK_FILE), 'a') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                logger.info("Another process is sweeping %s, skipping", self.root)
+                return []
+            try:
+                return self._sweep(keep)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _sweep(self, keep):
+        start = time.perf_counter()
+        now = time.time()
+        files = sorted(self._scan())  # ใช้ล่าสุดนานที่สุดก่อน
+        total = sum(size for _, size, _ in files)
+        protected_after = now - self.grace_seconds
+        expire_before = now - self.max_age_seconds if self.max_age_seconds else None
+
+        removed, freed = [], 0
+        for mtime, size, path in files:
+            if mtime >= protected_after:
+                break
+            expired = expire_before is not None and mtime < expire_before
+            over_budget = self.max_bytes and total - freed > self.max_bytes
+            if not (expired or over_budget):
+                # เรียงตาม mtime แล้ว: ไฟล์ที่เหลือใหม่กว่า ไม่หมดอายุ และขนาดรวมอยู่ในงบแล้ว
+                break
+            if path in keep:
+                continue
+            if _remove(path):
+                removed.append(path)
+                freed += size
+        with self._lock:
+            self._evicted += len(removed)
+            self._evicted_bytes += freed
+            self._last_sweep = {
+                'files': len(files) - len(removed),
+                'bytes': total - freed,
+                'evicted': len(removed),
+                'evicted_bytes': freed,
+                'duration_ms': round((time.perf_counter() - start) * 1000, 1),
+                'at': now,
+            }
+        if removed:
+            logger.info("Image store sweep removed %d files (%.1f MiB), %d files (%.1f MiB) remain",
+                        len(removed), freed / 2**20, len(files) - len(removed), (total - freed) / 2**20)
+        return removed
+
+    def stats(self):
+        return {
+            'root': self.root,
+            'max_age_seconds': self.max_age_seconds,
+            'max_bytes': self.max_bytes,
+            'stored': self._stored,
+            'deduplicated': self._deduplicated,
+            'evicted': self._evicted,
+            'evicted_bytes': self._evicted_bytes,
+            'last_sweep': self._last_sweep,
+        }
+
+
+def _subdirs(path):
+    try:
+        with os.scandir(path) as it:
+            return [entry.path for entry in it if entry.is_dir(follow_symlinks=False)]
+    except FileNotFoundError:
+        return []
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return False
+    except OSError as err:
+        logger.warning("Could not remove %s: %s", path, err)
+        return False
+    return True
+
+
+class RetentionSweeper:
+    """
+    รัน store.sweep() เป็นระยะบน thread pool แล้วส่ง path ที่ถูกลบให้ on_evicted (coroutine)
+    เพื่ออัปเดต DB ให้ตรงกับไฟล์ที่เหลือ
+    protected: coroutine ที่คืน path ที่ต้องเก็บไว้ในรอบนี้ (อ่านใหม่ทุกรอบ)
+    """
+    def __init__(self, store, on_evicted, interval=3600, protected=None):
+        self.store = store
+        self.on_evicted = on_evicted
+        self.interval = interval
+        self.protected = protected
+        self._task = None
+
+    @property
+    def enabled(self):
+        return self.interval > 0 and bool(self.store.max_age_seconds or self.store.max_bytes)
+
+    async def run_once(self):
+        keep = await self.protected() if self.protected is not None else ()
+        removed = await asyncio.get_running_loop().run_in_executor(None, self.store.sweep, keep)
+        if removed:
+            await self.on_evicted(removed)
+        return removed
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Image store sweep failed")
+
+    async def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+            logger.info("Image store retention sweeper started (every %ss)", self.interval)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
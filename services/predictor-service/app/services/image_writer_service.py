@@ -0,0 +1,161 @@
+## app/services/image_writer_service.py
+import os
+import cv2
+import time
+import uuid
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from app.utils.image_io import save_bytes
+from app.utils.metrics import stage_timer
+
+# ตั้งค่า logging
+logger = logging.getLogger(__name__)
+
+# format -> (นามสกุลไฟล์, media type)
+FORMATS = {
+    'jpeg': ('.jpg', 'image/jpeg'),
+    'webp': ('.webp', 'image/webp'),
+    'png':  ('.png', 'image/png'),
+}
+
+
+class ImageWriter:
+    """
+    เขียนไฟล์ภาพนอก request thread: encode (JPEG/WebP/PNG ตาม config) + เขียนไฟล์บน thread pool ของตัวเอง
+    - เขียนลงไฟล์ชั่วคราวแล้ว rename เพื่อไม่ให้ผู้อ่านเห็นไฟล์ที่เขียนไม่ครบ
+    - ถ้างานค้างเกิน max_pending จะเขียนทันทีใน thread ผู้เรียก (backpressure แทนการใช้หน่วยความจำไม่จำกัด)
+    """
+    def __init__(self, fmt='jpeg', jpeg_quality=90, webp_quality=80, png_compression=3,
+                 thumbnail_width=320, thumbnail_quality=75, workers=1, max_pending=256):
+        fmt = fmt.lower()
+        if fmt == 'jpg':
+            fmt = 'jpeg'
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown image format '{fmt}', expected one of {sorted(FORMATS)}")
+        self.format = fmt
+        self.jpeg_quality = jpeg_quality
+        self.webp_quality = webp_quality
+        self.png_compression = png_compression
+        self.thumbnail_width = thumbnail_width
+        self.thumbnail_quality = thumbnail_quality
+        self.max_pending = max(1, int(max_pending))
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="image-writer")
+        self._lock = threading.Lock()
+        self._pending = 0
+        # สถิติ
+        self._written = 0
+        self._failed = 0
+        self._bytes = 0
+        self._encode_ms = 0.0
+        self._encoded = 0
+
+    @property
+    def extension(self):
+        return FORMATS[self.format][0]
+
+    @property
+    def media_type(self):
+        return FORMATS[self.format][1]
+
+    def _params(self, quality=None):
+        if self.format == 'jpeg':
+            return [cv2.IMWRITE_JPEG_QUALITY, int(quality or self.jpeg_quality)]
+        if self.format == 'webp':
+            return [cv2.IMWRITE_WEBP_QUALITY, int(quality or self.webp_quality)]
+        return [cv2.IMWRITE_PNG_COMPRESSION, int(self.png_compression)]
+
+    def encode(self, image, quality=None):
+        """encode ndarray (BGR) ตาม format ที่ตั้งไว้ คืน bytes"""
+        start = time.perf_counter()
+        with stage_timer('image_encode'):
+            ok, buf = cv2.imencode(self.extension, image, self._params(quality))
+            if not ok:
+                raise ValueError(f"Failed to encode image as {self.format}")
+        with self._lock:
+            self._encode_ms += (time.perf_counter() - start) * 1000
+            self._encoded += 1
+        return buf.tobytes()
+
+    def thumbnail(self, image):
+        """ย่อภาพให้กว้าง thumbnail_width (รักษาสัดส่วน)"""
+        h, w = image.shape[:2]
+        if w <= self.thumbnail_width:
+            return image
+        size = (self.thumbnail_width, max(1, round(h * self.thumbnail_width / w)))
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+    def write_bytes(self, path, data):
+        """เขียน bytes แบบ atomic (ไฟล์ชั่วคราว + rename) ใน thread ปัจจุบัน"""
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            save_bytes(tmp_path, data)
+            os.replace(tmp_path, path)
+        except OSError as err:
+            with self._lock:
+                self._failed += 1
+            logger.error("Failed to write image %s: %s", path, err)
+            return False
+        with self._lock:
+            self._written += 1
+            self._bytes += len(data)
+        return True
+
+    def _write_image(self, path, image, quality=None):
+        try:
+            data = self.encode(image, quality)
+        except Exception as err:
+            with self._lock:
+                self._failed += 1
+            logger.error("Failed to encode image for %s: %s", path, err)
+            return False
+        return self.write_bytes(path, data)
+
+    def _write_thumbnail(self, path, image):
+        return self._write_image(path, self.thumbnail(image), self.thumbnail_quality)
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            inline = self._pending >= self.max_pending
+            if not inline:
+                self._pending += 1
+        if inline:
+            logger.warning("Image writer backlog full (%d), writing inline", self.max_pending)
+            fn(*args)
+            return
+
+        def task():
+            try:
+                fn(*args)
+            finally:
+                with self._lock:
+                    self._pending -= 1
+        self._pool.submit(task)
+
+    def submit_bytes(self, path, data):
+        """เขียนไฟล์ที่ encode แล้ว (เช่นไฟล์อัปโหลดต้นฉบับ) ใน background"""
+        self._submit(self.write_bytes, path, data)
+
+    def submit_image(self, path, image):
+        """encode + เขียนภาพใน background"""
+        self._submit(self._write_image, path, image)
+
+    def submit_thumbnail(self, path, image):
+        """ย่อ + encode + เขียน thumbnail ใน background"""
+        self._submit(self._write_thumbnail, path, image)
+
+    def shutdown(self):
+        # รอให้ไฟล์ที่ค้างอยู่เขียนเสร็จก่อนปิด
+        self._pool.shutdown(wait=True)
+
+    def stats(self):
+        return {
+            'format': self.format,
+            'pending': self._pending,
+            'max_pending': self.max_pending,
+            'written': self._written,
+            'failed': self._failed,
+            'bytes_written': self._bytes,
+            'avg_encode_ms': round(self._encode_ms / self._encoded, 2) if self._encoded else 0.0,
+        }
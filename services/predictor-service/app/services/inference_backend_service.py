@@ -0,0 +1,200 @@
+## app/services/inference_backend_service.py
+import ast
+import cv2
+import numpy as np
+import logging
+
+# ตั้งค่า logging
+logger = logging.getLogger(__name__)
+
+
+class Detections:
+    """
+    ผลลัพธ์การตรวจจับของหนึ่งภาพ ในรูปแบบเดียวกันทุก backend
+    - xyxy: (N, 4) float พิกัดบนภาพ input
+    - cls:  (N,)  int   class id
+    - conf: (N,)  float ความมั่นใจ
+    """
+    __slots__ = ('xyxy', 'cls', 'conf')
+
+    def __init__(self, xyxy, cls, conf):
+        self.xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        self.cls = np.asarray(cls, dtype=int).reshape(-1)
+        self.conf = np.asarray(conf, dtype=np.float32).reshape(-1)
+
+    def __len__(self):
+        return len(self.cls)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros((0, 4)), np.zeros(0), np.zeros(0))
+
+
+class InferenceBackend:
+    """
+    Interface ของ inference backend: รับ list ของภาพ BGR (ndarray) คืน list ของ Detections ตามลำดับ
+    """
+    name = 'base'
+    names = {}
+
+    def predict_batch(self, images):
+        raise NotImplementedError
+
+
+class TorchBackend(InferenceBackend):
+    """
+    backend เดิม: ultralytics YOLO (PyTorch) บน CPU
+    """
+    name = 'torch'
+
+    def __init__(self, model_path, conf=0.4, iou=0.7, imgsz=None):
+        from ultralytics import YOLO
+
+        self.model = YOLO(model_path)
+        self.model.to('cpu')  # บังคับใช้ CPU
+        self.conf = conf
+        self.iou = iou
+        self.imgsz = imgsz
+        self.names = dict(self.model.names)
+
+    def predict_batch(self, images):
+        # ส่ง ndarray (BGR) เข้าโมเดลโดยตรง ไม่ต้องเขียนไฟล์ชั่วคราว
+        # imgsz=None -> ใช้ขนาดที่โมเดลถูก train มา (ค่าเดิมของ ultralytics)
+        kwargs = {'imgsz': self.imgsz} if self.imgsz else {}
+        results = self.model.predict(source=list(images), conf=self.conf, iou=self.iou,
+                                     device='cpu', verbose=False, **kwargs)
+        return [
+            Detections(res.boxes.xyxy.cpu().numpy(), res.boxes.cls.cpu().numpy(), res.boxes.conf.cpu().numpy())
+            for res in results
+        ]
+
+
+class OnnxBackend(InferenceBackend):
+    """
+    ONNX Runtime บน CPU สำหรับโมเดลที่ export จาก ultralytics
+    (yolo export model=best.pt format=onnx dynamic=True)
+    - pre-process: letterbox (เหมือน ultralytics), BGR->RGB, /255, NCHW
+    - post-process: output (B, 4+nc, N) -> กรอง conf -> NMS แยกตาม class -> แปลงพิกัดกลับสู่ภาพเดิม
+    """
+    name = 'onnx'
+
+    def __init__(self, model_path, conf=0.4, iou=0.7, imgsz=None, threads=0, max_det=300):
+        import onnxruntime as ort
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            opts.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, sess_options=opts, providers=['CPUExecutionProvider'])
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(meta['names']) if 'names' in meta else {}
+
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        # static batch/size ถ้า export แบบไม่ dynamic
+        self.static_batch = inp.shape[0] if isinstance(inp.shape[0], int) else None
+        h, w = inp.shape[2], inp.shape[3]
+        if isinstance(h, int) and isinstance(w, int):
+            self.imgsz = (h, w)
+        else:
+            size = imgsz or (ast.literal_eval(meta['imgsz'])[0] if 'imgsz' in meta else 640)
+            self.imgsz = (int(size), int(size))
+        logger.info("ONNX model loaded: %s (input %s, batch=%s)", model_path, self.imgsz, self.static_batch or 'dynamic')
+
+    @staticmethod
+    def letterbox(image, new_shape, color=(114, 114, 114)):
+        """ย่อ/ขยายรักษาสัดส่วนแล้วเติมขอบให้ได้ new_shape (h, w); คืน (ภาพ, ratio, (pad_w, pad_h))"""
+        h, w = image.shape[:2]
+        r = min(new_shape[0] / h, new_shape[1] / w)
+        new_unpad = (int(round(w * r)), int(round(h * r)))
+        dw = (new_shape[1] - new_unpad[0]) / 2
+        dh = (new_shape[0] - new_unpad[1]) / 2
+        if (w, h) != new_unpad:
+            image = cv2.resize(image, new_unpad, interpolation=cv2.INTER_LINEAR)
+        top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+        left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+        image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+        return image, r, (left, top)
+
+    def _preprocess(self, images):
+        blobs, metas = [], []
+        for img in images:
+            boxed, r, pad = self.letterbox(img, self.imgsz)
+            blobs.append(boxed[:, :, ::-1].transpose(2, 0, 1))
+            metas.append((r, pad, img.shape[:2]))
+        batch = np.ascontiguousarray(np.stack(blobs), dtype=np.float32) / 255.0
+        return batch, metas
+
+    @staticmethod
+    def nms(boxes, scores, iou):
+        """Greedy NMS บน xyxy คืน index ที่เก็บไว้ เรียงตาม score มากไปน้อย"""
+        order = scores.argsort()[::-1]
+        areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+        keep = []
+        while order.size:
+            i = order[0]
+            keep.append(i)
+            xx1 = np.maximum(boxes[i, 0], boxes[order[1:], 0])
+            yy1 = np.maximum(boxes[i, 1], boxes[order[1:], 1])
+            xx2 = np.minimum(boxes[i, 2], boxes[order[1:], 2])
+            yy2 = np.minimum(boxes[i, 3], boxes[order[1:], 3])
+            inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+            ious = inter / (areas[i] + areas[order[1:]] - inter + 1e-9)
+            order = order[1:][ious <= iou]
+        return np.array(keep, dtype=int)
+
+    def _postprocess(self, pred, meta):
+        """pred: (4+nc, N) ของหนึ่งภาพ"""
+        pred = pred.T
+        scores_all = pred[:, 4:]
+        cls = scores_all.argmax(axis=1)
+        conf = scores_all[np.arange(len(cls)), cls]
+        mask = conf > self.conf
+        if not mask.any():
+            return Detections.empty()
+        xywh, cls, conf = pred[mask, :4], cls[mask], conf[mask]
+        xyxy = np.empty_like(xywh)
+        xyxy[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+        xyxy[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+
+        # NMS แยกตาม class โดยเลื่อนกล่องของแต่ละ class ออกจากกัน
+        offset = cls[:, None] * 7680.0
+        keep = self.nms(xyxy + offset, conf, self.iou)[:self.max_det]
+        xyxy, cls, conf = xyxy[keep], cls[keep], conf[keep]
+
+        # แปลงพิกัดจากภาพ letterbox กลับสู่ภาพเดิม
+        r, (pad_w, pad_h), (h, w) = meta
+        xyxy[:, [0, 2]] = ((xyxy[:, [0, 2]] - pad_w) / r).clip(0, w)
+        xyxy[:, [1, 3]] = ((xyxy[:, [1, 3]] - pad_h) / r).clip(0, h)
+        return Detections(xyxy, cls, conf)
+
+    def predict_batch(self, images):
+        if not images:
+            return []
+        batch, metas = self._preprocess(images)
+        step = self.static_batch or len(images)
+        outputs = []
+        for i in range(0, len(images), step):
+            outputs.append(self.session.run(None, {self.input_name: batch[i:i + step]})[0])
+        preds = np.concatenate(outputs, axis=0)
+        return [self._postprocess(p, m) for p, m in zip(preds, metas)]
+
+
+BACKENDS = {
+    TorchBackend.name: TorchBackend,
+    OnnxBackend.name: OnnxBackend,
+}
+
+
+def create_backend(name, model_path, **kwargs):
+    """สร้าง backend ตามชื่อใน config ('torch' หรือ 'onnx')"""
+    try:
+        backend_cls = BACKENDS[name.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown inference backend '{name}', expected one of {sorted(BACKENDS)}")
+    logger.info("Creating %s inference backend from %s", backend_cls.name, model_path)
+    return backend_cls(model_path, **kwargs)
@@ -0,0 +1,89 @@
+## app/services/inference_executor_service.py
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, asynccontextmanager
+
+# ตั้งค่า logging
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """คิวงาน inference เต็ม ผู้เรียกควรลองใหม่หลัง retry_after วินาที"""
+    def __init__(self, retry_after):
+        super().__init__(f"Inference queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """
+    Thread pool ขนาดจำกัดสำหรับงาน CPU หนัก (decode, grid, inference) ไม่ให้ block event loop
+    พร้อม admission control: รับงานค้างได้ไม่เกิน max_pending เฟรม ถ้าเกินจะ raise QueueFullError
+    งานที่รับไว้แล้ว (เช่น async job ที่ตอบ 202 ไปแล้ว) ใช้ reserve() ซึ่งรอจนมีที่แทนการถูกปฏิเสธ
+    และเฟรมที่รออยู่ถูกนับรวมตอนพิจารณา request ใหม่ เพื่อไม่ให้ request แบบ sync แซงงานที่รับไว้ได้เรื่อย ๆ
+    """
+    def __init__(self, workers=2, max_pending=32, retry_after=2):
+        self.workers = max(1, int(workers))
+        self.max_pending = max(1, int(max_pending))
+        self.retry_after = retry_after
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        self._pending = 0
+        self._waiting = 0
+        self._rejected = 0
+        self._released = None   # asyncio.Event ของ reserve() ที่รอที่ว่าง
+
+    @contextmanager
+    def admission(self, frames=1):
+        """จองที่ในคิวสำหรับ frames เฟรมตลอดช่วงของ request"""
+        if self._pending + self._waiting + frames > self.max_pending:
+            self._rejected += 1
+            logger.warning("Rejecting %d frame(s): %d pending, %d waiting (max %d)",
+                           frames, self._pending, self._waiting, self.max_pending)
+            raise QueueFullError(self.retry_after)
+        self._pending += frames
+        try:
+            yield
+        finally:
+            self._release(frames)
+
+    @asynccontextmanager
+    async def reserve(self, frames=1):
+        """จองที่สำหรับงานที่รับไว้แล้ว: รอจนมีที่ว่าง (ไม่ raise QueueFullError)"""
+        frames = min(frames, self.max_pending)
+        self._waiting += frames
+        try:
+            while self._pending + frames > self.max_pending:
+                if self._released is None:
+                    self._released = asyncio.Event()
+                await self._released.wait()
+        finally:
+            self._waiting -= frames
+        self._pending += frames
+        try:
+            yield
+        finally:
+            self._release(frames)
+
+    def _release(self, frames):
+        self._pending -= frames
+        if self._released is not None:
+            released, self._released = self._released, None
+            released.set()
+
+    async def run(self, fn, *args, **kwargs):
+        """รัน fn บน inference pool แล้วรอผลแบบ async"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, functools.partial(fn, *args, **kwargs))
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'pending': self._pending,
+            'waiting': self._waiting,
+            'max_pending': self.max_pending,
+            'rejected': self._rejected,
+        }
@@ -0,0 +1,183 @@
+## app/services/inference_scheduler_service.py
+import asyncio
+import time
+import logging
+from collections import Counter
+
+# ตั้งค่า logging
+logger = logging.getLogger(__name__)
+
+
+class SchedulerStoppedError(RuntimeError):
+    """scheduler หยุดทำงาน (เช่นตอน shutdown) ก่อนเฟรมนี้จะถูกรัน"""
+    def __init__(self):
+        super().__init__("Inference scheduler stopped")
+
+
+class InferenceScheduler:
+    """
+    รวมเฟรมจากหลาย request เข้าเป็น batch เดียวก่อนส่งเข้าโมเดล (dynamic micro-batching)
+    - flush เมื่อครบ max_batch_size เฟรม หรือรอครบ max_wait_ms นับจากเฟรมแรกของ batch
+    - แต่ละ request ได้ผลลัพธ์ของตัวเองกลับผ่าน future พร้อมเวอร์ชันโมเดลที่ใช้จริง
+    registry: ModelRegistry (predict_batch คืน (outputs, version))
+    """
+    def __init__(self, registry, max_batch_size=8, max_wait_ms=10, executor=None):
+        self.registry = registry
+        self.executor = executor
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0, max_wait_ms) / 1000.0
+        self._queue = None
+        self._task = None
+        self._carry = None
+        self._running = None
+        self._pending_frames = 0
+        # สถิติ
+        self._batches = 0
+        self._frames = 0
+        self._batch_sizes = Counter()
+        self._max_queue_depth = 0
+        self._last_batch_ms = 0.0
+
+    async def start(self):
+        # สร้าง worker ใหม่ถ้ายังไม่มี หรือ worker เดิมผูกกับ event loop อื่น/หยุดไปแล้ว
+        if self._task is None or self._task.done() or self._task.get_loop() is not asyncio.get_running_loop():
+            self._carry = None
+            self._running = None
+            self._pending_frames = 0
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+            logger.info("Inference scheduler started (max_batch_size=%d, max_wait_ms=%.1f)",
+                        self.max_batch_size, self.max_wait * 1000)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            failed = self._fail_pending()
+            logger.info("Inference scheduler stopped (%d waiting requests failed)", failed)
+
+    def _fail_pending(self):
+        """แจ้ง SchedulerStoppedError ให้ทุก request ที่ยังรอผล (batch ที่รันค้าง, carry และในคิว) แทนการค้างไว้"""
+        items = list(self._running or [])
+        if self._carry is not None:
+            items.append(self._carry)
+        while self._queue is not None and not self._queue.empty():
+            items.append(self._queue.get_nowait())
+        self._running, self._carry, self._pending_frames = None, None, 0
+        failed = 0
+        for *_, fut in items:
+            if not fut.done():
+                fut.set_exception(SchedulerStoppedError())
+                failed += 1
+        return failed
+
+    async def submit(self, image, wells, origin=(0, 0), timings=None):
+        """
+        ส่งเฟรมเดียวเข้าคิว แล้วรอ (wells, model_version)
+        origin: ตำแหน่ง (x, y) ของภาพนี้ในเฟรมเต็ม เมื่อภาพเป็น ROI ที่ตัดมา
+        """
+        outputs, version = await self.submit_many([image], [wells], [origin], timings)
+        return outputs[0], version
+
+    async def submit_many(self, images, wells_list, origins=None, timings=None):
+        """
+        ส่งหลายเฟรมเข้าคิวเป็นกลุ่มเดียว กลุ่มจะไม่ถูกแยกข้าม batch
+        (กลุ่มที่ใหญ่กว่า max_batch_size จะถูกรันเป็น batch ของตัวเอง)
+        timings: dict (ถ้าส่งมา) จะถูกเติม started / queue_ms / predict_ms / batch_size ของ batch ที่กลุ่มนี้ถูกรัน
+        คืน ([wells, ...], model_version)
+        """
+        if not images:
+            return [], None
+        await self.start()
+        fut = asyncio.get_running_loop().create_future()
+        self._pending_frames += len(images)
+        self._max_queue_depth = max(self._max_queue_depth, self._pending_frames)
+        origins = list(origins) if origins is not None else [(0, 0)] * len(images)
+        await self._queue.put((list(images), list(wells_list), origins, (timings, time.perf_counter()), fut))
+        return await fut
+
+    async def _collect(self):
+        """ดึง item จากคิวจนเต็ม batch หรือหมดเวลารอ"""
+        loop = asyncio.get_running_loop()
+        if self._carry is not None:
+            batch, self._carry = [self._carry], None
+        else:
+            batch = [await self._queue.get()]
+        # item ที่ถูกดึงออกจากคิวแล้ว (รวมระหว่างรอเติม batch) ต้องถูกแจ้งผลถ้า scheduler หยุด
+        self._running = batch
+        size = len(batch[0][0])
+        deadline = loop.time() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if size + len(item[0]) > self.max_batch_size:
+                # ไม่แยกกลุ่ม: เก็บไว้เป็นหัว batch ถัดไป
+                self._carry = item
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch, size
+
+    async def _infer(self, images, wells_list, origins):
+        if self.executor is not None:
+            return await self.executor.run(self.registry.predict_batch, images, wells_list, origins)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.registry.predict_batch, images, wells_list, origins)
+
+    async def _run(self):
+        while True:
+            batch, size = await self._collect()
+            self._pending_frames -= size
+            images = [img for item in batch for img in item[0]]
+            wells_list = [w for item in batch for w in item[1]]
+            origins = [o for item in batch for o in item[2]]
+            start = time.perf_counter()
+            try:
+                outputs, version = await self._infer(images, wells_list, origins)
+            except Exception as err:
+                logger.exception("Batched inference failed for %d frames: %s", size, err)
+                for *_, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(err)
+                self._running = None
+                continue
+            self._last_batch_ms = (time.perf_counter() - start) * 1000
+            for *_, (timings, enqueued), _ in batch:
+                if timings is not None:
+                    timings.update(started=start, queue_ms=round((start - enqueued) * 1000, 3),
+                                   predict_ms=round(self._last_batch_ms, 3), batch_size=size)
+            self._batches += 1
+            self._frames += size
+            self._batch_sizes[size] += 1
+            logger.debug("Ran batch of %d frames from %d requests in %.1f ms",
+                         size, len(batch), self._last_batch_ms)
+
+            offset = 0
+            for item_images, *_, fut in batch:
+                n = len(item_images)
+                if not fut.done():
+                    fut.set_result((outputs[offset:offset + n], version))
+                offset += n
+            self._running = None
+
+    def stats(self):
+        return {
+            'queue_depth': self._pending_frames,
+            'max_queue_depth': self._max_queue_depth,
+            'batches': self._batches,
+            'frames': self._frames,
+            'avg_batch_size': round(self._frames / self._batches, 2) if self._batches else 0.0,
+            'batch_size_histogram': {str(k): v for k, v in sorted(self._batch_sizes.items())},
+            'last_batch_ms': round(self._last_batch_ms, 2),
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+        }
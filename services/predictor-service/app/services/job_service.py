@@ -0,0 +1,118 @@
+## app/services/job_service.py
+import asyncio
+import time
+import logging
+from collections import OrderedDict
+
+from app.services.inference_executor_service import QueueFullError
+
+# ตั้งค่า logging
+logger = logging.getLogger(__name__)
+
+FINAL_STATUSES = ('done', 'error')
+
+
+class JobManager:
+    """
+    คิวงาน prediction แบบ async (mode=async) พร้อม worker pool
+    - submit() ใส่งานลงคิวแล้วคืนทันที งานจะเดินสถานะ pending -> running -> done/error
+    - handler(job) เป็น coroutine ที่ทำงานจริง; raise exception = error
+    - เก็บสถานะล่าสุดไว้ในหน่วยความจำเพื่อให้ SSE รอการเปลี่ยนแปลงได้โดยไม่ต้อง poll DB
+    """
+    def __init__(self, handler, workers=2, max_queue=64, retry_after=2, keep_finished=1000):
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.max_queue = max(1, int(max_queue))
+        self.retry_after = retry_after
+        self.keep_finished = keep_finished
+        self._queue = None
+        self._tasks = []
+        self._cond = None
+        self._states = OrderedDict()
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        if self._tasks and all(not t.done() and t.get_loop() is loop for t in self._tasks):
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._cond = asyncio.Condition()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info("Job manager started with %d workers (max_queue=%d)", self.workers, self.max_queue)
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        for t in self._tasks:
+            try:
+                await t
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        logger.info("Job manager stopped")
+
+    def admit(self):
+        """ตรวจตอนรับงาน (ก่อนสร้าง run): raise QueueFullError ถ้าคิวเต็ม"""
+        if self._queue is not None and self._queue.full():
+            raise QueueFullError(self.retry_after)
+
+    async def submit(self, run_id, **job):
+        """ใส่งานลงคิว; ถ้าคิวเต็มจะ raise QueueFullError"""
+        await self.start()
+        job['run_id'] = run_id
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError(self.retry_after)
+        await self._set(run_id, 'pending')
+
+    def get(self, run_id):
+        """สถานะล่าสุดในหน่วยความจำ หรือ None ถ้าไม่รู้จักงานนี้ (เช่นอยู่ใน worker process อื่น)"""
+        return self._states.get(run_id)
+
+    async def wait_for_change(self, run_id, since, timeout):
+        """รอจนสถานะของ run_id เปลี่ยนจาก since หรือหมดเวลา แล้วคืนสถานะล่าสุด"""
+        if self._cond is None:
+            return self.get(run_id)
+        async with self._cond:
+            try:
+                await asyncio.wait_for(
+                    self._cond.wait_for(lambda: self._states.get(run_id) != since), timeout
+                )
+            except asyncio.TimeoutError:
+                pass
+            return self._states.get(run_id)
+
+    async def _set(self, run_id, status, error=None):
+        async with self._cond:
+            self._states[run_id] = {'status': status, 'error_msg': error, 'updated_at': time.time()}
+            self._states.move_to_end(run_id)
+            self._prune()
+            self._cond.notify_all()
+
+    def _prune(self):
+        finished = [k for k, v in self._states.items() if v['status'] in FINAL_STATUSES]
+        for k in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._states[k]
+
+    async def _worker(self, index):
+        while True:
+            job = await self._queue.get()
+            run_id = job['run_id']
+            await self._set(run_id, 'running')
+            try:
+                await self.handler(job)
+            except Exception as err:
+                logger.exception("Async job for run_id=%s failed: %s", run_id, err)
+                await self._set(run_id, 'error', str(err))
+            else:
+                await self._set(run_id, 'done')
+            finally:
+                self._queue.task_done()
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'max_queue': self.max_queue,
+            'tracked': len(self._states),
+        }
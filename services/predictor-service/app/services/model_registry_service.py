@@ -0,0 +1,254 @@
+## app/services/model_registry_service.py
+import os
+import json
+import time
+import threading
+import logging
+import numpy as np
+
+# ตั้งค่า logging
+logger = logging.getLogger(__name__)
+
+
+class ModelEntry:
+    """ข้อมูลของโมเดลหนึ่งเวอร์ชันใน registry"""
+    def __init__(self, version, path, backend):
+        self.version = version
+        self.path = path
+        self.backend = backend
+        self.status = 'registered'   # registered -> loading -> ready / failed
+        self.predictor = None
+        self.error = None
+        self.loaded_at = None
+        self.load_ms = None
+        self.warmup_ms = None
+
+    def info(self):
+        return {
+            'version': self.version,
+            'path': self.path,
+            'backend': self.backend,
+            'status': self.status,
+            'error': self.error,
+            'loaded_at': self.loaded_at,
+            'load_ms': self.load_ms,
+            'warmup_ms': self.warmup_ms,
+        }
+
+
+def model_path_in_dir(path, model_dir):
+    """path ที่ resolve แล้ว (symlink / '..') ถ้าอยู่ใน model_dir มิฉะนั้น None (path สัมพัทธ์นับจาก model_dir)"""
+    model_dir = os.path.realpath(model_dir)
+    resolved = os.path.realpath(os.path.join(model_dir, path))
+    if os.path.commonpath([model_dir, resolved]) != model_dir:
+        return None
+    return resolved
+
+
+class ModelRegistry:
+    """
+    จัดการโมเดลหลายเวอร์ชัน:
+    - โหลดแบบ lazy เมื่อมีการใช้งานครั้งแรก
+    - รัน warm-up inference ก่อนจะถือว่า ready
+    - สลับเวอร์ชัน (activate) แบบ atomic โดยไม่ต้อง restart: batch ที่กำลังรันอยู่ใช้โมเดลเดิมจนจบ
+    - หลาย worker process: activate เขียนเวอร์ชันที่ active ลง state_path แล้วทุก worker เรียก sync()
+      เป็นระยะเพื่อโหลด + สลับตาม (worker ที่ start ทีหลังก็เริ่มจากเวอร์ชันนั้น)
+    factory(path, backend) -> Predictor
+    """
+    def __init__(self, factory, warmup_shape=(1080, 1440), state_path=None, model_dir=None):
+        self.factory = factory
+        self.warmup_shape = warmup_shape
+        self.state_path = state_path
+        self.model_dir = model_dir  # sync() โหลดได้เฉพาะไฟล์ใน model_dir (หรือเวอร์ชันที่ลงทะเบียนไว้แล้ว)
+        self._entries = {}
+        self._active = None
+        self._default = None        # เวอร์ชันแรกที่ลงทะเบียน (จาก config ตอน start)
+        self._state_seen = None     # (inode, mtime) ของ state file ที่อ่าน/เขียนล่าสุด
+        self._lock = threading.Lock()        # ป้องกันการสลับ active พร้อมกัน
+        self._load_lock = threading.Lock()   # โหลดทีละโมเดล
+
+    def register(self, version, path, backend):
+        """เพิ่มเวอร์ชันเข้า registry (ยังไม่โหลด)"""
+        with self._lock:
+            entry = self._entries.get(version)
+            if entry is None or entry.path != path or entry.backend != backend:
+                entry = ModelEntry(version, path, backend)
+                self._entries[version] = entry
+            if self._active is None:
+                self._active = entry
+            if self._default is None:
+                self._default = entry
+        return entry
+
+    @property
+    def active_version(self):
+        return self._active.version if self._active is not None else None
+
+    def is_ready(self):
+        return self._active is not None and self._active.status == 'ready'
+
+    def active_info(self):
+        return self._active.info() if self._active is not None else None
+
+    def _load(self, entry):
+        """โหลดและ warm-up โมเดล; ไม่แตะ active"""
+        with self._load_lock:
+            if entry.status == 'ready':
+                return entry
+            entry.status = 'loading'
+            entry.error = None
+            try:
+                start = time.perf_counter()
+                predictor = self.factory(entry.path, entry.backend)
+                entry.load_ms = round((time.perf_counter() - start) * 1000, 1)
+
+                start = time.perf_counter()
+                dummy = np.zeros((*self.warmup_shape, 3), dtype=np.uint8)
+                predictor.backend.predict_batch([dummy])
+                entry.warmup_ms = round((time.perf_counter() - start) * 1000, 1)
+            except Exception as err:
+                entry.status = 'failed'
+                entry.error = str(err)
+                logger.exception("Failed to load model version %s from %s", entry.version, entry.path)
+                raise
+            entry.predictor = predictor
+            entry.loaded_at = time.time()
+            entry.status = 'ready'
+            logger.info("Model %s ready (load %.1f ms, warm-up %.1f ms)",
+                        entry.version, entry.load_ms, entry.warmup_ms)
+            return entry
+
+    def acquire(self):
+        """
+        คืน (version, predictor) ของโมเดลที่ active และพร้อมใช้งาน (โหลดให้ถ้ายังไม่ได้โหลด)
+        ผู้เรียกถือ reference ของ predictor ไว้เอง จึงใช้งานต่อได้แม้มีการสลับเวอร์ชันระหว่างนั้น
+        """
+        while True:
+            entry = self._active
+            if entry is None:
+                raise RuntimeError("No model registered")
+            if entry.status != 'ready':
+                self._load(entry)
+            with self._lock:
+                entry = self._active
+                predictor = entry.predictor
+            if predictor is not None:
+                return entry.version, predictor
+
+    def activate(self, version, path=None, backend=None):
+        """
+        โหลด + warm-up เวอร์ชันใหม่ก่อน แล้วค่อยสลับ active แบบ atomic
+        ถ้าโหลดไม่สำเร็จ active เดิมยังคงใช้งานต่อ
+        สำเร็จแล้วเขียนลง state_path เพื่อให้ worker อื่นสลับตาม (sync)
+        """
+        entry = self._swap(version, path, backend)
+        self._publish(entry)
+        return entry
+
+    def _swap(self, version, path=None, backend=None):
+        if path is not None:
+            entry = self.register(version, path, backend or (self._active.backend if self._active else 'torch'))
+        else:
+            entry = self._entries.get(version)
+            if entry is None:
+                raise KeyError(f"Model version '{version}' is not registered")
+        self._load(entry)
+        with self._lock:
+            previous, self._active = self._active, entry
+            if previous is not None and previous is not entry:
+                # ปล่อยหน่วยความจำของโมเดลเดิม (batch ที่ถือ reference อยู่ยังรันจนจบได้)
+                previous.predictor = None
+                previous.status = 'registered'
+        logger.info("Activated model version %s (previous: %s)",
+                    version, previous.version if previous else None)
+        return entry
+
+    def _state_stat(self):
+        try:
+            st = os.stat(self.state_path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def _publish(self, entry):
+        """เขียนเวอร์ชันที่ active ลง state_path (atomic)"""
+        if not self.state_path:
+            return
+        state = {
+            'version': entry.version,
+            'path': entry.path,
+            'backend': entry.backend,
+            'activated_at': time.time(),
+            'pid': os.getpid(),
+            # state นี้ใช้กับ config ชุดที่มี default เดียวกันเท่านั้น
+            'default': [self._default.version, self._default.path],
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+        self._state_seen = self._state_stat()
+
+    def sync(self):
+        """
+        สลับไปใช้เวอร์ชันที่ worker อื่น activate ไว้ใน state_path (ถ้าเปลี่ยนตั้งแต่ครั้งก่อน); คืน True ถ้าสลับ
+        state ที่เขียนไว้ก่อนเปลี่ยน MODEL_VERSION / MODEL_PATH ใน config ถูกข้าม
+        โหลดไม่สำเร็จ: ใช้เวอร์ชันเดิมต่อ และไม่ลองใหม่จนกว่า state จะเปลี่ยนอีกครั้ง
+        """
+        if not self.state_path:
+            return False
+        seen = self._state_stat()
+        if seen is None or seen == self._state_seen:
+            return False
+        self._state_seen = seen
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+            version, path, backend = state['version'], state['path'], state['backend']
+        except (OSError, ValueError, KeyError) as err:
+            logger.warning("Ignoring unreadable model state %s: %s", self.state_path, err)
+            return False
+        default = self._default
+        if default is None or state.get('default') != [default.version, default.path]:
+            logger.info("Ignoring model state %s written for a different configuration", self.state_path)
+            return False
+        active = self._active
+        if active is not None and (active.version, active.path, active.backend) == (version, path, backend):
+            return False
+        if not self._trusted_path(version, path):
+            # การโหลด torch model คือการ unpickle: state file ต้องไม่ข้ามการจำกัด MODEL_DIR ของ activate
+            logger.warning("Ignoring model state %s: %s is not a registered model or a file in MODEL_DIR",
+                           self.state_path, path)
+            return False
+        try:
+            self._swap(version, path, backend)
+        except Exception:
+            logger.exception("Could not switch to model version %s published by another worker", version)
+            return False
+        return True
+
+    def _trusted_path(self, version, path):
+        entry = self._entries.get(version)
+        if entry is not None and entry.path == path:
+            return True
+        if not self.model_dir or not isinstance(path, str):
+            return False
+        resolved = model_path_in_dir(path, self.model_dir)
+        return resolved == path and os.path.isfile(resolved)
+
+    def predict_batch(self, images, wells_list, origins=None):
+        """รัน batch ด้วยโมเดลที่ active ณ ตอนเริ่ม batch; คืน (outputs, version)"""
+        version, predictor = self.acquire()
+        return predictor.predict_batch(images, wells_list, origins), version
+
+    def class_ids(self):
+        """ชื่อคลาส -> class id ของโมเดลที่ active (ใช้เลือกสีตอนวาดภาพ annotated)"""
+        _, predictor = self.acquire()
+        return {name: cid for cid, name in predictor.names.items()}
+
+    def list(self):
+        return {
+            'active': self.active_version,
+            'models': [e.info() for e in self._entries.values()],
+        }
@@ -0,0 +1,163 @@
+## app/services/plate_locator_service.py
+import cv2
+import time
+import threading
+import numpy as np
+import logging
+
+# ตั้งค่า logging
+logger = logging.getLogger(__name__)
+
+MODES = ('off', 'fixed', 'auto')
+REFRESH = ('once', 'per_frame')
+
+
+def parse_roi(text):
+    """แปลง "x0,y0,x1,y1" -> tuple ของ int (None ถ้าว่าง)"""
+    if not text:
+        return None
+    values = tuple(int(v) for v in text.split(','))
+    if len(values) != 4:
+        raise ValueError(f"ROI must be 'x0,y0,x1,y1', got '{text}'")
+    return values
+
+
+class PlateLocator:
+    """
+    หาบริเวณของเพลต (ROI) ในเฟรมกล้อง เพื่อส่งเฉพาะส่วนนั้นเข้าโมเดล
+    - off:   ใช้ทั้งเฟรม (พฤติกรรมเดิม)
+    - fixed: ใช้ ROI จาก config
+    - auto:  หาเพลตจากสี (แผ่นรองเพลตมีความอิ่มตัวของสีสูงกว่าพื้นหลัง) บนภาพย่อ
+             refresh='once' หาครั้งเดียวต่อขนาดเฟรม (ต่อการตั้งกล้อง) แล้ว cache ไว้
+             refresh='per_frame' หาใหม่ทุกเฟรม เพื่อตามเพลตที่ขยับ
+    ถ้าหาไม่เจอ (พื้นที่เล็กกว่า min_area ของเฟรม) จะใช้ทั้งเฟรม
+    reference: ROI ของเพลต ณ ตำแหน่งที่ calibrate กริดไว้ (ต้องมีเมื่อ refresh='per_frame')
+               โหมด auto จะเลื่อน/ย่อขยายกริดตาม ROI ที่หาได้เทียบกับ reference เพื่อให้ well ตามเพลตไปด้วย
+    """
+    def __init__(self, mode='off', roi=None, refresh='once', padding=0.02, min_area=0.2, downscale=4,
+                 reference=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown plate ROI mode '{mode}', expected one of {MODES}")
+        if refresh not in REFRESH:
+            raise ValueError(f"Unknown plate ROI refresh '{refresh}', expected one of {REFRESH}")
+        if mode == 'fixed' and roi is None:
+            raise ValueError("Plate ROI mode 'fixed' requires PLATE_ROI")
+        if mode == 'auto' and refresh == 'per_frame' and reference is None:
+            # ถ้าไม่รู้ตำแหน่งที่ calibrate ไว้ crop จะตามเพลตแต่กริดไม่ตาม -> well ผิดตำแหน่ง
+            raise ValueError("Plate ROI refresh 'per_frame' requires PLATE_ROI_REFERENCE")
+        self.mode = mode
+        self.roi = roi
+        self.refresh = refresh
+        self.padding = padding
+        self.min_area = min_area
+        self.downscale = max(1, int(downscale))
+        self.reference = reference
+        self._cache = {}   # (h, w) -> roi
+        self._lock = threading.Lock()
+        # สถิติ
+        self._detections = 0
+        self._fallbacks = 0
+        self._detect_ms = 0.0
+        self._last_roi = None
+
+    @staticmethod
+    def _clip(roi, shape):
+        h, w = shape[:2]
+        x0, y0, x1, y1 = roi
+        x0, x1 = max(0, min(x0, w)), max(0, min(x1, w))
+        y0, y1 = max(0, min(y0, h)), max(0, min(y1, h))
+        if x1 - x0 < 2 or y1 - y0 < 2:
+            return 0, 0, w, h
+        return x0, y0, x1, y1
+
+    def detect(self, image):
+        """หา bounding box ของเพลตจากภาพ (x0, y0, x1, y1) ในพิกัดเฟรมเต็ม"""
+        start = time.perf_counter()
+        h, w = image.shape[:2]
+        small = cv2.resize(image, (max(1, w // self.downscale), max(1, h // self.downscale)),
+                           interpolation=cv2.INTER_AREA)
+        saturation = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)[:, :, 1]
+        saturation = cv2.GaussianBlur(saturation, (5, 5), 0)
+        _, mask = cv2.threshold(saturation, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((9, 9), np.uint8))
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        roi, found = (0, 0, w, h), False
+        if contours:
+            x, y, cw, ch = cv2.boundingRect(max(contours, key=cv2.contourArea))
+            if cw * ch >= self.min_area * small.shape[0] * small.shape[1]:
+                pad_x, pad_y = int(w * self.padding), int(h * self.padding)
+                roi = self._clip((x * self.downscale - pad_x, y * self.downscale - pad_y,
+                                  (x + cw) * self.downscale + pad_x, (y + ch) * self.downscale + pad_y), image.shape)
+                found = True
+        with self._lock:
+            self._detections += 1
+            self._detect_ms += (time.perf_counter() - start) * 1000
+            if not found:
+                self._fallbacks += 1
+        if not found:
+            logger.warning("Plate not found in %dx%d frame, using full frame", w, h)
+        return roi
+
+    def locate(self, image):
+        """ROI ที่จะใช้กับเฟรมนี้ (x0, y0, x1, y1)"""
+        h, w = image.shape[:2]
+        if self.mode == 'off':
+            roi = (0, 0, w, h)
+        elif self.mode == 'fixed':
+            roi = self._clip(self.roi, image.shape)
+        elif self.refresh == 'per_frame':
+            roi = self.detect(image)
+        else:
+            with self._lock:
+                roi = self._cache.get((h, w))
+            if roi is None:
+                roi = self.detect(image)
+                with self._lock:
+                    self._cache[(h, w)] = roi
+                logger.info("Plate ROI cached for %dx%d frames: %s", w, h, roi)
+        self._last_roi = roi
+        return roi
+
+    def grid_shift(self, roi, shape):
+        """
+        การเลื่อน/ย่อขยายของเพลตเทียบกับ reference: (sx, sy, dx, dy) ในพิกัดเฟรม (x' = x * sx + dx)
+        None ถ้ากริดอยู่ที่ตำแหน่งที่ calibrate ไว้ (ไม่ใช่โหมด auto, ไม่มี reference หรือหาเพลตไม่เจอ)
+        """
+        if self.mode != 'auto' or self.reference is None or roi == (0, 0, shape[1], shape[0]):
+            return None
+        rx0, ry0, rx1, ry1 = self.reference
+        x0, y0, x1, y1 = roi
+        sx = (x1 - x0) / (rx1 - rx0)
+        sy = (y1 - y0) / (ry1 - ry0)
+        return sx, sy, x0 - rx0 * sx, y0 - ry0 * sy
+
+    def crop(self, image):
+        """
+        ตัดเฉพาะ ROI; คืน (ภาพที่ตัด, (x0, y0), shift)
+        (x0, y0) ใช้เลื่อนพิกัด bbox กลับสู่เฟรมเต็ม, shift ใช้เลื่อนกริดตามเพลต (GridBuilder.wells)
+        """
+        roi = self.locate(image)
+        shift = self.grid_shift(roi, image.shape)
+        x0, y0, x1, y1 = roi
+        if roi == (0, 0, image.shape[1], image.shape[0]):
+            return image, (0, 0), shift
+        return np.ascontiguousarray(image[y0:y1, x0:x1]), (x0, y0), shift
+
+    def reset(self):
+        """ล้าง ROI ที่ cache ไว้ (เช่นหลังปรับตำแหน่งกล้อง)"""
+        with self._lock:
+            self._cache.clear()
+        logger.info("Plate ROI cache cleared")
+
+    def stats(self):
+        return {
+            'mode': self.mode,
+            'refresh': self.refresh,
+            'reference': self.reference,
+            'last_roi': self._last_roi,
+            'cached': {f"{w}x{h}": roi for (h, w), roi in self._cache.items()},
+            'detections': self._detections,
+            'fallbacks': self._fallbacks,
+            'avg_detect_ms': round(self._detect_ms / self._detections, 2) if self._detections else 0.0,
+        }
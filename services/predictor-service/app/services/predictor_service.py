@@ -1,61 +1,83 @@
 ## app/services/predictor_service.py
-import os
-import cv2
-import tempfile
-from ultralytics import YOLO
+import numpy as np
 import logging
 
+from app.services.inference_backend_service import InferenceBackend, create_backend
+
 # ตั้งค่า logging
 logger = logging.getLogger(__name__)
 
-# กำหนดสีสำหรับแต่ละคลาส
-COLORS = {0: (255, 0, 0), 1: (0, 255, 0), 2: (0, 0, 255)}
-
 class Predictor:
     """
-    รัน YOLO prediction และ annotate บนภาพ
+    รัน YOLO prediction แล้วจับคู่ bbox กับ well (ไม่วาดภาพ; การวาดอยู่ที่ annotation_service)
+    backend: ชื่อ backend ('torch' / 'onnx') หรือ instance ของ InferenceBackend
+    box_scale: ตัวคูณพิกัดจากภาพ input -> พิกัดของกริด (เช่น 1.2 เมื่อโมเดลรันบนภาพขนาดจริง
+               แต่กริดถูกวาดบนภาพที่ขยาย 1.2 เท่า)
     """
-    def __init__(self, model_path):
-        self.model = YOLO(model_path)
-        self.model.to('cpu')  # บังคับใช้ CPU
-
-    def predict(self, image, wells):
-        # บันทึกเป็นไฟล์ชั่วคราว
-        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp:
-            cv2.imwrite(tmp.name, image)
-            results = self.model.predict(source=tmp.name, conf=0.4, device='cpu')
-        os.remove(tmp.name)
-
-        for res in results:
-            for box in res.boxes:
-                cid     = int(box.cls[0])
-                cls_name= res.names[cid]
-                conf    = float(box.conf[0])
-                bbox    = box.xyxy[0].cpu().numpy().astype(int).tolist()
-                label   = self._find_well(bbox, wells)
-                if label:
-                    for well in wells:
-                        if well['label'] == label:
-                            well['predictions'].append({
-                                'class':      cls_name,
-                                'confidence': conf,
-                                'bbox':       bbox
-                            })
-                            cv2.rectangle(image, tuple(bbox[:2]), tuple(bbox[2:]), COLORS[cid], 2)
-                            cv2.putText(image, f"{cls_name} {conf:.2f}",
-                                        (bbox[0], bbox[1]-10),
-                                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, COLORS[cid], 2)
-                            logger.debug(f"Detected {cls_name} in {label}: {conf:.2f}")
-        return image, wells
+    def __init__(self, model_path, backend='torch', box_scale=1.0, **backend_kwargs):
+        if isinstance(backend, InferenceBackend):
+            self.backend = backend
+        else:
+            self.backend = create_backend(backend, model_path, **backend_kwargs)
+        self.names = self.backend.names
+        self.box_scale = box_scale
+
+    def predict(self, image, wells, origin=(0, 0)):
+        return self.predict_batch([image], [wells], [origin])[0]
+
+    def predict_batch(self, images, wells_list, origins=None):
+        """
+        รันโมเดลครั้งเดียวกับหลายภาพ (batch) แล้วคืน [wells, ...] ตามลำดับ input
+        origins: ตำแหน่ง (x, y) ของแต่ละภาพในเฟรมเต็ม (เมื่อส่งเฉพาะ ROI ของเพลตเข้าโมเดล)
+        """
+        if not images:
+            return []
+        if origins is None:
+            origins = [(0, 0)] * len(images)
+        detections = self.backend.predict_batch(list(images))
+        return [self._assign(wells, det, origin)
+                for wells, det, origin in zip(wells_list, detections, origins)]
+
+    def _assign(self, wells, det, origin=(0, 0)):
+        if len(det) == 0 or not wells:
+            return wells
+        # พิกัดใน ROI -> เฟรมเต็ม -> พิกัดกริด
+        offset = np.array([origin[0], origin[1], origin[0], origin[1]], dtype=np.float32)
+        xyxy  = ((det.xyxy + offset) * self.box_scale).astype(int)
+        cids  = det.cls
+        confs = det.conf
+        # จับคู่ทุก bbox ของเฟรมกับ well ในครั้งเดียว
+        well_idx = self._assign_wells(xyxy, self._well_bounds(wells))
+
+        for bbox, cid, conf, wi in zip(xyxy.tolist(), cids.tolist(), confs.tolist(), well_idx.tolist()):
+            if wi < 0:
+                continue
+            well     = wells[wi]
+            cls_name = self.names[cid]
+            well['predictions'].append({
+                'class':      cls_name,
+                'confidence': conf,
+                'bbox':       bbox
+            })
+            logger.debug(f"Detected {cls_name} in {well['label']}: {conf:.2f}")
+        return wells
+
+    @staticmethod
+    def _well_bounds(wells):
+        """
+        สร้าง array ขอบเขตของทุก well รูปทรง (W, 4) = [x1, y1, x2, y2]
+        """
+        return np.array([(*w['top_left'], *w['bottom_right']) for w in wells], dtype=int).reshape(-1, 4)
 
     @staticmethod
-    def _find_well(bbox, wells):
+    def _assign_wells(boxes, bounds):
         """
-        หาว่า bbox นี้อยู่ในกรอบของ well ไหน
+        หาว่าแต่ละ bbox อยู่ในกรอบของ well ไหน (ทดสอบทุก bbox กับทุก well พร้อมกันด้วย NumPy)
+        คืน index ของ well แรกที่ครอบ bbox ได้ หรือ -1 ถ้าไม่อยู่ใน well ใดเลย
         """
-        x1, y1, x2, y2 = bbox
-        for well in wells:
-            tl, br = well['top_left'], well['bottom_right']
-            if x1 >= tl[0] and y1 >= tl[1] and x2 <= br[0] and y2 <= br[1]:
-                return well['label']
-        return None
+        b = boxes[:, None, :]
+        w = bounds[None, :, :]
+        inside = ((b[..., 0] >= w[..., 0]) & (b[..., 1] >= w[..., 1]) &
+                  (b[..., 2] <= w[..., 2]) & (b[..., 3] <= w[..., 3]))
+        idx = inside.argmax(axis=1)
+        return np.where(inside.any(axis=1), idx, -1)
@@ -0,0 +1,188 @@
+## app/services/profiling_service.py
+import os
+import re
+import json
+import time
+import uuid
+import threading
+import logging
+from datetime import datetime, timezone
+
+from app.utils.profiling import StageLog, activate, deactivate
+
+# ตั้งค่า logging
+logger = logging.getLogger(__name__)
+
+PROFILE_ID = re.compile(r'^[A-Za-z0-9_-]+$')
+# รูปแบบไฟล์ที่ดาวน์โหลดได้ -> (นามสกุลไฟล์, media type)
+FORMATS = {
+    'html': ('.html', 'text/html'),
+    'json': ('.json', 'application/json'),
+    'pyisession': ('.pyisession', 'application/json'),
+}
+
+
+class RateLimiter:
+    """token bucket: เฉลี่ยไม่เกิน per_minute ครั้งต่อนาที (burst ได้ถึง per_minute)"""
+    def __init__(self, per_minute):
+        self.capacity = max(0.0, float(per_minute))
+        self.rate = self.capacity / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class ActiveProfile:
+    """profile ของ request หนึ่งที่กำลังรันอยู่: sampling profiler + stage log"""
+    def __init__(self, profiler, log, token):
+        self.id = None
+        self.profiler = profiler
+        self.log = log
+        self.token = token
+        self.started_at = datetime.now(timezone.utc)
+
+
+class RequestProfiler:
+    """
+    Profile /predict ทีละ request แบบ opt-in ด้วย pyinstrument (sampling profiler, async-aware)
+    - จำกัดอัตรา (RateLimiter) และรันได้ทีละ request เพื่อให้เปิดไว้บน production ได้
+    - เวลาของแต่ละขั้น (stage_timer) ถูกบันทึกคู่กับ profile รวมถึงงานบน thread pool ที่ sampler มองไม่เห็น
+    - เก็บไฟล์ใน directory: <id>.html (flame/call tree), <id>.pyisession และ <id>.json (metadata + stages)
+      เก็บไว้ไม่เกิน keep ชุด (ลบชุดเก่าสุด)
+    """
+    def __init__(self, directory, per_minute=6, interval=0.001, keep=200, enabled=False):
+        self.enabled = enabled
+        self.directory = directory
+        self.interval = interval
+        self.keep = keep
+        self.limiter = RateLimiter(per_minute)
+        self._active = 0
+        self._lock = threading.Lock()
+        # สถิติ
+        self._captured = 0
+        self._rate_limited = 0
+        self._busy = 0
+
+    def begin(self):
+        """เริ่ม profile request ปัจจุบัน; คืน (ActiveProfile หรือ None, เหตุผลถ้าไม่ได้ profile)"""
+        with self._lock:
+            if self._active:
+                self._busy += 1
+                return None, 'busy'
+            if not self.limiter.acquire():
+                self._rate_limited += 1
+                return None, 'rate_limited'
+            self._active += 1
+        try:
+            from pyinstrument import Profiler
+
+            profiler = Profiler(interval=self.interval, async_mode='enabled')
+            profiler.start()
+        except Exception:
+            with self._lock:
+                self._active -= 1
+            logger.exception("Could not start the profiler")
+            return None, 'unavailable'
+        log = StageLog()
+        return ActiveProfile(profiler, log, activate(log)), 'ok'
+
+    def stop(self, active):
+        """หยุด sampling (เรียกใน task เดียวกับ begin)"""
+        try:
+            active.profiler.stop()
+        finally:
+            deactivate(active.token)
+            with self._lock:
+                self._active -= 1
+
+    def save(self, active, run_id=None, status=None, meta=None):
+        """เขียนไฟล์ของ profile ลงดิสก์ (ใช้เวลา render จึงควรเรียกบน thread pool); คืน profile id"""
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = active.started_at.strftime('%Y%m%dT%H%M%S')
+        profile_id = f"{run_id if run_id is not None else 'norun'}-{stamp}-{uuid.uuid4().hex[:6]}"
+        session = active.profiler.last_session
+        base = os.path.join(self.directory, profile_id)
+        with open(base + '.html', 'w', encoding='utf-8') as f:
+            f.write(active.profiler.output_html())
+        session.save(base + '.pyisession')
+        info = {
+            'id': profile_id,
+            'run_id': run_id,
+            'status': status,
+            'started_at': active.started_at.isoformat(),
+            'duration_ms': round(session.duration * 1000, 3),
+            'sample_count': session.sample_count,
+            'stages': sorted(active.log.stages, key=lambda s: s['start_ms']),
+            **(meta or {}),
+        }
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            json.dump(info, f, indent=2)
+        with self._lock:
+            self._captured += 1
+        self._evict()
+        logger.info("Saved profile %s for run_id=%s (%.1f ms)", profile_id, run_id, info['duration_ms'])
+        return profile_id
+
+    def _evict(self):
+        files = sorted(
+            (os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith('.json')),
+            key=os.path.getmtime,
+        )
+        for path in files[:max(0, len(files) - self.keep)]:
+            base = path[:-len('.json')]
+            for ext, _ in FORMATS.values():
+                try:
+                    os.remove(base + ext)
+                except FileNotFoundError:
+                    pass
+
+    def list(self, run_id=None, limit=50):
+        """metadata ของ profile ที่เก็บไว้ (ใหม่ -> เก่า) ไม่รวมรายละเอียด stages"""
+        if not os.path.isdir(self.directory):
+            return []
+        files = sorted(
+            (os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith('.json')),
+            key=os.path.getmtime, reverse=True,
+        )
+        items = []
+        for path in files:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    info = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if run_id is not None and info.get('run_id') != run_id:
+                continue
+            items.append({k: v for k, v in info.items() if k != 'stages'})
+            if len(items) >= limit:
+                break
+        return items
+
+    def path(self, profile_id, fmt='html'):
+        """path ของไฟล์ profile (None ถ้าไม่มี); raise ValueError ถ้า id / format ไม่ถูกต้อง"""
+        if not PROFILE_ID.match(profile_id):
+            raise ValueError(f"Invalid profile id '{profile_id}'")
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown profile format '{fmt}', expected one of {sorted(FORMATS)}")
+        path = os.path.join(self.directory, profile_id + FORMATS[fmt][0])
+        return path if os.path.exists(path) else None
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'per_minute': self.limiter.capacity,
+            'active': self._active,
+            'captured': self._captured,
+            'rate_limited': self._rate_limited,
+            'busy': self._busy,
+        }
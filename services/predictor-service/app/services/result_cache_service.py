@@ -0,0 +1,127 @@
+## app/services/result_cache_service.py
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from app.models.predict_result_model import PredictionRun, PredictionCache
+
+# ตั้งค่า logging
+logger = logging.getLogger(__name__)
+
+
+def content_hash(data):
+    """sha256 ของไฟล์ที่อัปโหลด (hex)"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class ResultCache:
+    """
+    Cache ผลลัพธ์ตาม hash ของไฟล์ภาพ + sample_no + model version + threshold
+    - เก็บใน memory แบบ LRU จำกัดจำนวน และหมดอายุตาม TTL
+    - in-flight: ถ้าภาพเดียวกันกำลังประมวลผลอยู่ (เช่น client timeout แล้วส่งซ้ำ) ให้รอผลของงานแรกแทนการรันซ้ำ
+    - ใช้งานบน event loop เท่านั้น (ไม่ thread-safe)
+    """
+    def __init__(self, max_entries=1024, ttl_seconds=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._entries = OrderedDict()   # key -> (expires_at, body)
+        self._inflight = {}             # key -> asyncio.Future
+        self.hits = 0
+        self.misses = 0
+        self.inflight_hits = 0
+        self.index_hits = 0
+
+    @staticmethod
+    def key(digest, sample_no, model_version, params):
+        """digest: content_hash ของไฟล์; params: tuple ของค่าที่มีผลต่อผลลัพธ์ (conf, iou, imgsz)"""
+        suffix = ':'.join(str(p) for p in params)
+        return f"{digest}:{sample_no}:{model_version}:{suffix}"
+
+    def _peek(self, key):
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        expires_at, body = item
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        return body
+
+    def get(self, key):
+        body = self._peek(key)
+        if body is not None:
+            self._entries.move_to_end(key)
+        return body
+
+    def put(self, key, body):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, body)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def lookup(self, key, load_index=None):
+        """
+        หา body ที่เคยคำนวณแล้ว: memory -> index ใน DB (ถ้าส่ง load_index มา) -> งานที่กำลังรันอยู่
+        คืน None ถ้าไม่พบ (นับเป็น miss)
+        """
+        body = self.get(key)
+        if body is None and load_index is not None and key not in self._inflight:
+            body = await load_index(key)
+            if body is not None:
+                self.index_hits += 1
+                self.put(key, body)
+        # ตรวจ in-flight หลังสุด (ไม่มี await คั่นก่อนผู้เรียก begin) เพื่อไม่ให้ request ซ้ำหลุดไปรันพร้อมกัน
+        if body is None and key in self._inflight:
+            body = await asyncio.shield(self._inflight[key])
+            if body is not None:
+                self.inflight_hits += 1
+        if body is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return body
+
+    def begin(self, key):
+        """ประกาศว่ากำลังคำนวณ key นี้ (request อื่นที่ key ตรงกันจะรอผล)"""
+        if key not in self._inflight:
+            self._inflight[key] = asyncio.get_running_loop().create_future()
+
+    def end(self, key):
+        """จบการคำนวณ: ปลุก request ที่รออยู่ด้วยผลลัพธ์ที่ put ไว้ (หรือ None ถ้าล้มเหลว)"""
+        future = self._inflight.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(self._peek(key))
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl,
+            'inflight': len(self._inflight),
+            'hits': self.hits,
+            'misses': self.misses,
+            'inflight_hits': self.inflight_hits,
+            'index_hits': self.index_hits,
+            'hit_ratio': round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+async def find_cached_run(db, cache_key):
+    """หา PredictionRun ที่สำเร็จแล้วจาก index ใน DB (microplates.prediction_cache) พร้อม counts/results"""
+    query = (
+        select(PredictionRun)
+        .options(selectinload(PredictionRun.row_counts), selectinload(PredictionRun.interface_results))
+        .join(PredictionCache, PredictionCache.run_id == PredictionRun.id)
+        .where(PredictionCache.cache_key == cache_key, PredictionRun.status == 'done')
+        .order_by(PredictionCache.id.desc())
+        .limit(1)
+    )
+    return (await db.scalars(query)).first()
@@ -1,9 +1,7 @@
 ## /app/services/result_processor_service.py
 import os
 import warnings
-from ultralytics import YOLO
-from collections import defaultdict
-import pandas as pd
+import numpy as np
 
 import logging
 
@@ -16,23 +14,90 @@ os.environ['KMP_DUPLICATE_LIB_OK'] = 'TRUE'
 # กำหนดสีสำหรับแต่ละคลาส
 COLORS = {0: (255, 0, 0), 1: (0, 255, 0), 2: (0, 0, 255)}
 
+ROW_LABELS = "ABCDEFGH"
+
+
+class PlateResult:
+    """
+    ผลลัพธ์ของหนึ่งเพลตในรูป array: จำนวน detection ต่อ well แยกตามคลาส
+    counts[class_name] -> int array ขนาด (rows, cols) เช่น 8x12
+    """
+    __slots__ = ('counts', 'rows', 'cols')
+
+    def __init__(self, counts, rows=8, cols=12):
+        self.counts = counts
+        self.rows = rows
+        self.cols = cols
+
+    @classmethod
+    def from_wells(cls, wells, rows=8, cols=12):
+        counts = {}
+        for well in wells:
+            preds = well.get('predictions')
+            if not preds:
+                continue
+            r = ROW_LABELS.index(well['label'][0])
+            c = int(well['label'][1:]) - 1
+            for pred in preds:
+                grid = counts.get(pred['class'])
+                if grid is None:
+                    grid = counts[pred['class']] = np.zeros((rows, cols), dtype=np.int32)
+                grid[r, c] += 1
+        return cls(counts, rows, cols)
+
+    def grid(self, class_name):
+        grid = self.counts.get(class_name)
+        return grid if grid is not None else np.zeros((self.rows, self.cols), dtype=np.int32)
+
+    @staticmethod
+    def last_columns(grid):
+        """ตำแหน่งคอลัมน์สุดท้ายที่มีค่า > 0 ของแต่ละแถว (1-based, 0 = ไม่มี)"""
+        nonzero = grid > 0
+        last = grid.shape[1] - nonzero[:, ::-1].argmax(axis=1)
+        return np.where(nonzero.any(axis=1), last, 0)
+
+    def row_counts(self, class_name):
+        """{'A': [...], ...} ตัดท้ายที่คอลัมน์สุดท้ายที่มีค่า เฉพาะแถวที่มีค่า"""
+        grid = self.grid(class_name)
+        last = self.last_columns(grid)
+        return {ROW_LABELS[r]: grid[r, :last[r]].tolist() for r in np.flatnonzero(last)}
+
+    def last_positions(self, class_name):
+        last = self.last_columns(self.grid(class_name))
+        return {ROW_LABELS[r]: int(last[r]) for r in np.flatnonzero(last)}
+
+    def distribution(self, class_name):
+        return distribution_of(self.last_columns(self.grid(class_name)), self.cols)
+
+
+def distribution_of(last_columns, cols=12):
+    """
+    จำนวนแถวที่จบที่แต่ละคอลัมน์: {'total': n, 1: ..., cols: ...}
+    last_columns: ตำแหน่งสุดท้ายของแต่ละแถว (1-based, 0 = ไม่มี)
+    """
+    hist = np.bincount(np.asarray(last_columns, dtype=int), minlength=cols + 1)[1:cols + 1]
+    total = {'total': int(hist.sum())}
+    total.update({c: int(v) for c, v in enumerate(hist.tolist(), start=1)})
+    logger.info(f"Result JSON: {total}")
+    return total
+
+
 class ResultProcessor:
     """
-    ประมวลผลผลลัพธ์จาก predictions
+    ประมวลผลผลลัพธ์จาก predictions (ใช้ PlateResult แทน pandas)
     """
     def __init__(self, target_class="Flowing"):
         self.target = target_class
 
+    def process(self, wells):
+        """คืน (row_counts, last_positions, distribution) ของคลาสเป้าหมายจากการสร้าง array ครั้งเดียว"""
+        plate = PlateResult.from_wells(wells)
+        final = plate.row_counts(self.target)
+        logger.info(f"Final row counts: {final}")
+        return final, plate.last_positions(self.target), plate.distribution(self.target)
+
     def count_by_row(self, wells):
-        counts = defaultdict(lambda: [0] * 12)
-        for well in wells:
-            for pred in well.get('predictions', []):
-                if pred['class'] == self.target:
-                    row = well['label'][0]
-                    col = int(well['label'][1:]) - 1
-                    counts[row][col] += 1
-        final = {r: c[:max(i for i, v in enumerate(c) if v > 0) + 1]
-                 for r, c in counts.items() if any(c)}
+        final = PlateResult.from_wells(wells).row_counts(self.target)
         logger.info(f"Final row counts: {final}")
         return final
 
@@ -41,13 +106,5 @@ class ResultProcessor:
                 for r, vs in row_counts.items()}
 
     def to_dataframe(self, last_positions):
-        cols = list(range(1, 13))
-        df = pd.DataFrame(0, index=list("ABCDEFGH"), columns=cols)
-        for r, c in last_positions.items():
-            df.at[r, c] = 1
-        df.loc['Total'] = df.sum()
-        df['total'] = df.sum(axis=1)
-        df = df[['total'] + cols]
-        total = df.loc['Total'].to_dict()
-        logger.info(f"Result JSON: {total}")
-        return total
\ No newline at end of file
+        """distribution จาก last_positions (ชื่อเดิม คงไว้เพื่อความเข้ากันได้)"""
+        return distribution_of(list(last_positions.values()))
@@ -0,0 +1,193 @@
+## app/services/run_persistence_service.py
+import logging
+
+from sqlalchemy import insert, delete, select, update, or_
+
+from app.models.predict_result_model import (PredictionRun, RowCounts, InterfaceResults, WellPrediction, ImageFile,
+                                             PredictionCache)
+
+# ตั้งค่า logging
+logger = logging.getLogger(__name__)
+
+
+def well_prediction_rows(run_id, wells):
+    """แปลง wells -> list ของ mapping สำหรับ bulk insert ลง well_prediction"""
+    return [
+        {
+            'run_id':     run_id,
+            'label':      well['label'],
+            'class_name': pred['class'],
+            'confidence': int(pred['confidence'] * 100),
+            'bbox':       pred['bbox'],
+        }
+        for well in wells
+        for pred in well.get('predictions', [])
+    ]
+
+
+async def persist_run(db, sample_no, wells, counts, last_positions, distribution,
+                image_files, annotated_image_path, model_version=None, run=None, cache_key=None,
+                grid_shift=None):
+    """
+    บันทึก PredictionRun และ child rows ทั้งหมดใน transaction เดียว (commit ครั้งเดียว)
+    child rows ใช้ ORM bulk insert (executemany) ผ่าน AsyncSession
+    - run=None: สร้าง PredictionRun ใหม่; ถ้าส่ง run เข้ามา (เช่นงาน async ที่สร้างไว้แล้ว) จะอัปเดตแถวนั้น
+    - image_files: list ของ (file_type, path)
+    - cache_key: ถ้าส่งมา จะบันทึก index ของ result cache ใน transaction เดียวกัน
+    - grid_shift: การเลื่อนกริดตามเพลต (PlateLocator.grid_shift) เก็บใน interface_results เพื่อวาดภาพ annotated
+    คืน PredictionRun ที่มีสถานะ 'done'
+    """
+    try:
+        if run is None:
+            run = PredictionRun(sample_no=sample_no, description=None)
+            db.add(run)
+        run.annotated_image_path = annotated_image_path
+        run.model_version = model_version
+        run.status = 'done'
+        run.error_msg = None
+        await db.flush()  # ได้ run.id โดยยังไม่ commit
+
+        rows = well_prediction_rows(run.id, wells)
+        if rows:
+            await db.execute(insert(WellPrediction), rows)
+        if image_files:
+            await db.execute(insert(ImageFile), [
+                {'run_id': run.id, 'sample_no': sample_no, 'file_type': file_type, 'path': path}
+                for file_type, path in image_files
+            ])
+        await db.execute(insert(RowCounts), [
+            {'run_id': run.id, 'counts': {'raw_count': counts, 'last_positions': last_positions}}
+        ])
+        results = {'distribution': distribution}
+        if grid_shift is not None:
+            results['grid_shift'] = grid_shift
+        await db.execute(insert(InterfaceResults), [{'run_id': run.id, 'results': results}])
+        if cache_key:
+            db.add(PredictionCache(cache_key=cache_key, run_id=run.id))
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    logger.info("Persisted run_id=%s with %d well predictions in one transaction", run.id, len(rows))
+    return run
+
+
+async def persist_failed_run(db, sample_no, err, image_files=(), model_version=None, run=None):
+    """บันทึก run ที่ผิดพลาด (status 'error') พร้อมไฟล์ภาพต้นฉบับ ใน transaction เดียว"""
+    try:
+        if run is None:
+            path = image_files[0][1] if image_files else ''
+            run = PredictionRun(sample_no=sample_no, description=None, annotated_image_path=path)
+            db.add(run)
+        run.model_version = model_version
+        run.status = 'error'
+        run.error_msg = str(err)
+        await db.flush()
+        if image_files:
+            await db.execute(insert(ImageFile), [
+                {'run_id': run.id, 'sample_no': sample_no, 'file_type': file_type, 'path': path}
+                for file_type, path in image_files
+            ])
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        logger.exception("Failed to record error for sample_no=%s", sample_no)
+        return None
+    return run
+
+
+async def create_pending_run(db, sample_no, file_path, model_version=None):
+    """สร้าง PredictionRun สถานะ 'pending' พร้อมบันทึกไฟล์ต้นฉบับ ใน transaction เดียว (ใช้กับ mode=async)"""
+    try:
+        run = PredictionRun(
+            sample_no=sample_no,
+            description=None,
+            annotated_image_path=file_path,
+            model_version=model_version,
+            status='pending',
+        )
+        db.add(run)
+        await db.flush()
+        db.add(ImageFile(run_id=run.id, sample_no=sample_no, file_type='original', path=file_path))
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    logger.info("Created pending PredictionRun id=%s", run.id)
+    return run
+
+
+async def set_run_status(db, run, status):
+    """อัปเดตสถานะของ run (เช่น pending -> running)"""
+    run.status = status
+    await db.commit()
+    return run
+
+
+async def forget_image_files(db, paths, chunk_size=500):
+    """ลบแถว image_file ที่อ้างถึงไฟล์ที่ถูกลบออกจาก image store แล้ว (ไฟล์เดียวอาจถูกหลาย run ใช้ร่วมกัน)"""
+    paths = list(paths)
+    deleted = 0
+    try:
+        for i in range(0, len(paths), chunk_size):
+            result = await db.execute(delete(ImageFile).where(ImageFile.path.in_(paths[i:i + chunk_size])))
+            deleted += result.rowcount
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    logger.info("Removed %d image_file rows for %d evicted files", deleted, len(paths))
+    return deleted
+
+
+UNFINISHED_STATUSES = ('pending', 'running')
+
+
+async def claim_interrupted_runs(db, started_before, marker):
+    """
+    run ที่ค้าง pending / running ตั้งแต่ก่อน service start (คิวงานในหน่วยความจำของ process เดิมหายไปแล้ว)
+    claim ทีละแถวด้วย UPDATE แบบมีเงื่อนไข: ตั้ง status = 'pending' และ error_msg = marker
+    worker ที่ start พร้อมกัน (marker เดียวกัน) จึงไม่ได้ run ซ้ำกัน; start ครั้งถัดไปใช้ marker ใหม่
+    คืน [(PredictionRun, path ของภาพต้นฉบับหรือ None), ...]
+    """
+    try:
+        candidates = (await db.execute(
+            select(PredictionRun.id)
+            .where(PredictionRun.status.in_(UNFINISHED_STATUSES), PredictionRun.predict_at < started_before)
+            .order_by(PredictionRun.id)
+        )).scalars().all()
+        claimed = []
+        for run_id in candidates:
+            result = await db.execute(
+                update(PredictionRun)
+                .where(PredictionRun.id == run_id,
+                       PredictionRun.status.in_(UNFINISHED_STATUSES),
+                       or_(PredictionRun.error_msg.is_(None), PredictionRun.error_msg != marker))
+                .values(status='pending', error_msg=marker)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount:
+                claimed.append(run_id)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    if not claimed:
+        return []
+    runs = (await db.execute(select(PredictionRun).where(PredictionRun.id.in_(claimed)))).scalars().all()
+    originals = dict((await db.execute(
+        select(ImageFile.run_id, ImageFile.path)
+        .where(ImageFile.run_id.in_(claimed), ImageFile.file_type == 'original')
+    )).all())
+    logger.info("Claimed %d interrupted runs", len(runs))
+    return [(run, originals.get(run.id)) for run in runs]
+
+
+async def unfinished_originals(db):
+    """path ของภาพต้นฉบับที่ run ยังไม่จบ (pending / running) อ้างถึง; ต้องเก็บไว้จนกว่างานจะจบ"""
+    rows = await db.execute(
+        select(ImageFile.path).distinct()
+        .join(PredictionRun, PredictionRun.id == ImageFile.run_id)
+        .where(PredictionRun.status.in_(UNFINISHED_STATUSES), ImageFile.file_type == 'original')
+    )
+    return set(rows.scalars().all())
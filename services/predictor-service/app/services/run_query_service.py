@@ -0,0 +1,64 @@
+## app/services/run_query_service.py
+import base64
+import logging
+from datetime import datetime
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import selectinload
+
+from app.models.predict_result_model import PredictionRun
+
+# ตั้งค่า logging
+logger = logging.getLogger(__name__)
+
+
+def encode_cursor(run):
+    """cursor ของหน้าถัดไป = (predict_at, id) ของแถวสุดท้าย เข้ารหัสแบบ urlsafe base64"""
+    raw = f"{run.predict_at.isoformat()}|{run.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """คืน (predict_at, id); raise ValueError ถ้า cursor ไม่ถูกต้อง"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        predict_at, run_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(predict_at), int(run_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor '{cursor}'")
+
+
+async def list_runs(db, sample_no=None, status=None, since=None, until=None, cursor=None, limit=50):
+    """
+    รายการ run เรียงจากใหม่ไปเก่า แบบ keyset pagination บน (predict_at, id)
+    (ใช้ index ของ predict_at / sample_no แทน OFFSET ที่ต้องสแกนแถวที่ข้ามไปทั้งหมด)
+    interface_results ถูกโหลดล่วงหน้าด้วย selectinload ในคิวรีเดียวต่อหน้า
+    คืน (runs, next_cursor หรือ None ถ้าเป็นหน้าสุดท้าย)
+    """
+    query = select(PredictionRun).options(selectinload(PredictionRun.interface_results))
+    if sample_no:
+        query = query.where(PredictionRun.sample_no == sample_no)
+    if status:
+        query = query.where(PredictionRun.status == status)
+    if since:
+        query = query.where(PredictionRun.predict_at >= since)
+    if until:
+        query = query.where(PredictionRun.predict_at < until)
+    if cursor:
+        predict_at, run_id = decode_cursor(cursor)
+        query = query.where(tuple_(PredictionRun.predict_at, PredictionRun.id) < tuple_(predict_at, run_id))
+    query = query.order_by(PredictionRun.predict_at.desc(), PredictionRun.id.desc()).limit(limit + 1)
+    runs = (await db.scalars(query)).all()
+    next_cursor = encode_cursor(runs[limit - 1]) if len(runs) > limit else None
+    return runs[:limit], next_cursor
+
+
+async def get_run(db, run_id, details=False):
+    """
+    โหลด run พร้อม row_counts / interface_results (และ well_predictions / image_files เมื่อ details=True)
+    ด้วย selectinload เพื่อไม่ให้เกิด lazy load ทีละความสัมพันธ์ (N+1)
+    """
+    options = [selectinload(PredictionRun.row_counts), selectinload(PredictionRun.interface_results)]
+    if details:
+        options += [selectinload(PredictionRun.well_predictions), selectinload(PredictionRun.image_files)]
+    return (await db.scalars(select(PredictionRun).options(*options).where(PredictionRun.id == run_id))).one_or_none()
@@ -0,0 +1,79 @@
+"""
+รายงานเวลา import ตอน start predictor (python -X importtime) รวมตาม package
+
+    python -m app.tools.import_report
+    python -m app.tools.import_report --top 30 --module app.main
+    python -m app.tools.import_report --forbid torch,ultralytics,pandas,onnxruntime
+
+--forbid: คืน exit code 1 ถ้า package เหล่านี้ถูก import ตอน start (ควรถูกโหลดเมื่อโหลดโมเดลเท่านั้น)
+"""
+import os
+import sys
+import argparse
+import subprocess
+from collections import defaultdict
+from pathlib import Path
+
+SERVICE_DIR = Path(__file__).resolve().parents[2]
+HEAVY = ('torch', 'torchvision', 'ultralytics', 'pandas', 'onnxruntime', 'matplotlib', 'scipy', 'pyinstrument')
+
+
+def measure(module):
+    """import module ใน process ใหม่; คืน [(ชื่อ module, self_us, cumulative_us, depth), ...]"""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+        cwd=SERVICE_DIR, env={**os.environ, 'PYTHONDONTWRITEBYTECODE': '1'},
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def by_package(rows):
+    """เวลา self รวมต่อ top-level package (ms)"""
+    totals = defaultdict(int)
+    for name, self_us, _, _ in rows:
+        totals[name.split('.')[0]] += self_us
+    return {pkg: us / 1000 for pkg, us in totals.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time report for the predictor startup path")
+    parser.add_argument('--module', default='app.main')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--forbid', default='', help="packages that must not be imported at startup (comma separated)")
+    args = parser.parse_args(argv)
+
+    rows = measure(args.module)
+    total_ms = sum(self_us for _, self_us, _, _ in rows) / 1000
+    packages = by_package(rows)
+    print(f"import {args.module}: {total_ms:.1f} ms, {len(rows)} modules")
+
+    print(f"\nTop {args.top} packages (self time)")
+    for pkg, ms in sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:args.top]:
+        print(f"  {pkg:<28} {ms:>9.1f} ms")
+
+    print(f"\nTop {args.top} imports (cumulative)")
+    for name, _, cumulative_us, depth in sorted(rows, key=lambda r: r[2], reverse=True)[:args.top]:
+        print(f"  {name:<48} {cumulative_us / 1000:>9.1f} ms  (depth {depth})")
+
+    heavy = sorted(pkg for pkg in packages if pkg in HEAVY)
+    print(f"\nHeavy packages imported at startup: {', '.join(heavy) or 'none'}")
+    forbid = {p.strip() for p in args.forbid.split(',') if p.strip()}
+    forbidden = sorted(forbid & packages.keys())
+    if forbidden:
+        print(f"FAIL: {', '.join(forbidden)} imported by {args.module}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+ย้ายไฟล์ภาพเดิม (ไฟล์ {uuid}_{filename} ใน UPLOAD_DIR) เข้า image store แบบ content-addressed
+แล้วอัปเดต image_file.path และ prediction_run.annotated_image_path ให้ชี้ไฟล์ใหม่
+
+    python -m app.tools.migrate_storage --dry-run
+    python -m app.tools.migrate_storage [--prune-missing]
+
+--prune-missing: ลบแถว image_file ที่ไฟล์ไม่มีอยู่บนดิสก์แล้ว
+ไฟล์ที่เนื้อหาซ้ำกันจะเหลือไฟล์เดียวใน store
+"""
+import os
+import sys
+import shutil
+import asyncio
+import hashlib
+import argparse
+import logging
+
+from sqlalchemy import select, update, delete
+
+from app.config import Config
+from app.database import engine, SessionLocal
+from app.models.predict_result_model import ImageFile, PredictionRun
+from app.services.image_store_service import ImageStore, sniff_extension
+from app.services.image_writer_service import ImageWriter
+
+# ตั้งค่า logging
+logger = logging.getLogger(__name__)
+
+
+def _target(store, path, file_type):
+    with open(path, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    if file_type == 'original':
+        return store.path_for(digest, ext=sniff_extension(data, path))
+    return store.path_for(digest, f"_{file_type}", os.path.splitext(path)[1].lower())
+
+
+def _move(src, dst):
+    """ย้ายไฟล์เข้า store; ถ้ามีไฟล์เนื้อหาเดียวกันอยู่แล้วจะลบต้นทางทิ้ง"""
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    if os.path.exists(dst):
+        os.remove(src)
+    else:
+        shutil.move(src, dst)
+
+
+async def _repath(db, old, new):
+    await db.execute(update(ImageFile).where(ImageFile.path == old).values(path=new))
+    await db.execute(update(PredictionRun).where(PredictionRun.annotated_image_path == old)
+                     .values(annotated_image_path=new))
+
+
+async def migrate_files(db, store, dry_run=False, prune_missing=False):
+    rows = (await db.execute(
+        select(ImageFile.path, ImageFile.file_type).distinct().where(~ImageFile.path.startswith(store.root + os.sep))
+    )).all()
+    moved = missing = 0
+    for path, file_type in rows:
+        if not os.path.isfile(path):
+            missing += 1
+            if prune_missing and not dry_run:
+                await db.execute(delete(ImageFile).where(ImageFile.path == path))
+            continue
+        target = await asyncio.to_thread(_target, store, path, file_type)
+        print(f"{path} -> {target}")
+        if not dry_run:
+            await asyncio.to_thread(_move, path, target)
+            await _repath(db, path, target)
+            # commit ทีละไฟล์: ไฟล์ถูกย้ายแล้ว DB ต้องตามทันแม้ไฟล์ถัดไปจะล้มเหลว
+            await db.commit()
+        moved += 1
+    if not dry_run:
+        await db.commit()
+    return moved, missing
+
+
+async def migrate_pending_annotated(db, store, dry_run=False):
+    """run ที่ยังไม่เคย render ภาพ annotated: ย้ายปลายทางของการ render เข้า store"""
+    runs = (await db.execute(
+        select(PredictionRun.id, PredictionRun.annotated_image_path)
+        .where(PredictionRun.status == 'done',
+               ~PredictionRun.annotated_image_path.startswith(store.root + os.sep))
+    )).all()
+    count = 0
+    for run_id, path in runs:
+        if os.path.exists(path):
+            continue
+        count += 1
+        if not dry_run:
+            await db.execute(update(PredictionRun).where(PredictionRun.id == run_id)
+                             .values(annotated_image_path=store.derived_path(f"run:{run_id}", 'annotated')))
+    if not dry_run:
+        await db.commit()
+    return count
+
+
+async def run(dry_run=False, prune_missing=False):
+    writer = ImageWriter(fmt=Config.IMAGE_FORMAT)
+    store = ImageStore(Config.IMAGE_STORE_DIR, writer)
+    try:
+        async with SessionLocal() as db:
+            moved, missing = await migrate_files(db, store, dry_run, prune_missing)
+            pending = await migrate_pending_annotated(db, store, dry_run)
+    finally:
+        writer.shutdown()
+        await engine.dispose()
+    action = "Would move" if dry_run else "Moved"
+    print(f"{action} {moved} file(s) into {store.root}; "
+          f"{pending} unrendered annotated path(s) {'to update' if dry_run else 'updated'}")
+    if missing:
+        pruned = "pruned" if prune_missing and not dry_run else "use --prune-missing to remove their rows"
+        print(f"{missing} image_file path(s) no longer exist on disk ({pruned})")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move legacy upload files into the content-addressed image store")
+    parser.add_argument('--dry-run', action='store_true', help="only print what would be moved")
+    parser.add_argument('--prune-missing', action='store_true', help="delete image_file rows whose file is gone")
+    args = parser.parse_args(argv)
+    return asyncio.run(run(args.dry_run, args.prune_missing))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
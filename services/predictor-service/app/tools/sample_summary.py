@@ -0,0 +1,62 @@
+## app/tools/sample_summary.py
+"""
+ตรวจสอบ / สร้างใหม่ microplates.sample_summary จาก interface_results
+
+    python -m app.tools.sample_summary verify
+    python -m app.tools.sample_summary rebuild [--sample-no S1]
+
+verify คืน exit code 1 ถ้ามี sample ที่ summary ไม่ตรงกับค่าที่คำนวณใหม่
+"""
+import sys
+import json
+import asyncio
+import argparse
+import logging
+
+from sqlalchemy import text
+
+from app.database import engine
+
+# ตั้งค่า logging
+logger = logging.getLogger(__name__)
+
+
+async def verify(conn):
+    rows = (await conn.execute(text("SELECT * FROM microplates.fn_verify_sample_summary()"))).fetchall()
+    for sample_no, expected, actual in rows:
+        print(f"MISMATCH {sample_no}: expected={json.dumps(expected)} actual={json.dumps(actual)}")
+    print(f"{len(rows)} sample(s) out of sync")
+    return len(rows)
+
+
+async def rebuild(conn, sample_no=None):
+    n = (await conn.execute(
+        text("SELECT microplates.fn_rebuild_sample_summary(:sample_no)"), {'sample_no': sample_no}
+    )).scalar()
+    print(f"Rebuilt summary for {n} sample(s)")
+    return n
+
+
+async def run(command, sample_no=None):
+    try:
+        if command == 'verify':
+            async with engine.connect() as conn:
+                return 1 if await verify(conn) else 0
+        async with engine.begin() as conn:
+            await rebuild(conn, sample_no)
+        return 0
+    finally:
+        await engine.dispose()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verify or rebuild microplates.sample_summary")
+    parser.add_argument('command', choices=['verify', 'rebuild'])
+    parser.add_argument('--sample-no', help="rebuild only this sample")
+    args = parser.parse_args(argv)
+    return asyncio.run(run(args.command, args.sample_no))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
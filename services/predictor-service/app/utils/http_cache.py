@@ -0,0 +1,58 @@
+## app/utils/http_cache.py
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from fastapi.responses import JSONResponse, Response
+
+
+class TTLCache:
+    """cache ขนาดจำกัด หมดอายุตาม TTL (thread-safe) สำหรับ response ของ read API"""
+    def __init__(self, ttl_seconds=2.0, max_entries=512):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and item[0] >= time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            if item is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        return {'entries': len(self._entries), 'ttl_seconds': self.ttl, 'hits': self.hits, 'misses': self.misses}
+
+
+def make_etag(body):
+    """weak ETag จากเนื้อหา JSON"""
+    raw = json.dumps(body, sort_keys=True, separators=(',', ':'), default=str)
+    return f'W/"{hashlib.sha1(raw.encode()).hexdigest()}"'
+
+
+def conditional_json(request, body, etag, max_age=0):
+    """คืน 304 ถ้า If-None-Match ตรงกับ ETag ไม่เช่นนั้นคืน JSON พร้อม ETag"""
+    headers = {'ETag': etag, 'Cache-Control': f'private, max-age={int(max_age)}'}
+    if_none_match = request.headers.get('if-none-match', '')
+    if etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=body, headers=headers)
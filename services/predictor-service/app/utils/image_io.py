@@ -0,0 +1,32 @@
+## app/utils/image_io.py
+import os
+import cv2
+import numpy as np
+import logging
+
+# ตั้งค่า logging
+logger = logging.getLogger(__name__)
+
+
+def decode_image(data: bytes):
+    """
+    แปลง bytes ของไฟล์ภาพเป็น ndarray (BGR) ในหน่วยความจำ โดยไม่ต้องเขียนลงดิสก์
+    คืน None ถ้า decode ไม่ได้
+    """
+    if not data:
+        return None
+    buf = np.frombuffer(data, dtype=np.uint8)
+    return cv2.imdecode(buf, cv2.IMREAD_COLOR)
+
+
+def save_bytes(path: str, data: bytes):
+    """
+    เขียน bytes ลงไฟล์ (ใช้โดย ImageWriter ซึ่งรันนอก critical path ของ request)
+    """
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        logger.debug("Saved %d bytes to %s", len(data), path)
+    except OSError as err:
+        logger.error("Failed to save file %s: %s", path, err)
@@ -0,0 +1,143 @@
+## app/utils/metrics.py
+import os
+import time
+import logging
+from contextlib import contextmanager
+
+from fastapi import Request, Response
+from prometheus_client import (Counter, Gauge, Histogram, CollectorRegistry, generate_latest,
+                               CONTENT_TYPE_LATEST, REGISTRY)
+
+from app.utils.profiling import current_log, record_stage
+
+# ตั้งค่า logging
+logger = logging.getLogger(__name__)
+
+# ช่วงเวลาของ histogram (วินาที): ตั้งแต่ decode ไม่กี่ ms จนถึง inference หลายวินาทีบน CPU
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REQUEST_LATENCY = Histogram(
+    'predictor_http_request_duration_seconds', 'HTTP request latency',
+    ['method', 'route', 'status'], buckets=BUCKETS,
+)
+IN_FLIGHT = Gauge('predictor_http_requests_in_flight', 'HTTP requests currently being served',
+                  multiprocess_mode='livesum')
+STAGE_LATENCY = Histogram(
+    'predictor_stage_duration_seconds',
+    'Latency of one pipeline stage (upload, decode, plate_roi, inference, grid, db_write, image_encode)',
+    ['stage'], buckets=BUCKETS,
+)
+ERRORS = Counter('predictor_errors_total', 'Errors by pipeline stage', ['stage'])
+# หน่วยความจำ / thread ต่อ worker process (multiprocess: แยกตาม pid)
+PROCESS_MEMORY = Gauge('predictor_process_memory_bytes', 'Worker memory by kind (rss, pss, shared, private)',
+                       ['kind'], multiprocess_mode='all')
+PROCESS_THREADS = Gauge('predictor_process_threads', 'Worker threads by kind (os, python, torch, cv2)',
+                        ['kind'], multiprocess_mode='all')
+# gauge ที่อ่านค่าจาก stats() ของ service (ดู register_gauges)
+_sources = {}
+
+
+@contextmanager
+def stage_timer(stage, log=None):
+    """
+    จับเวลาหนึ่งขั้นของ pipeline; ถ้ามี exception จะนับเป็น error ของขั้นนั้นด้วย
+    ถ้า request นี้ถูก profile อยู่ (หรือส่ง log มา) จะบันทึกขั้นนี้ลง profile ด้วย
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.labels(stage).inc()
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_LATENCY.labels(stage).observe(duration)
+        record_stage(stage, start, duration, log)
+
+
+def timed(stage, fn):
+    """
+    ห่อ fn ให้จับเวลาเป็น stage (ใช้กับงานที่ส่งไปรันบน thread pool)
+    profile ของ request ถูกจับไว้ตอนห่อ เพราะ thread ของ pool ไม่เห็น context ของ request
+    """
+    log = current_log()
+
+    def wrapper(*args, **kwargs):
+        with stage_timer(stage, log):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def _route(request):
+    # ใช้ path template ของ route (เช่น /runs/{run_id}) เพื่อไม่ให้ label มีค่าไม่จำกัด
+    route = request.scope.get('route')
+    return getattr(route, 'path', 'unmatched')
+
+
+async def metrics_middleware(request: Request, call_next):
+    """latency / in-flight / error ของทุก request (ยกเว้น /metrics เอง)"""
+    if request.url.path == '/metrics':
+        return await call_next(request)
+    IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        IN_FLIGHT.dec()
+        if status >= 500:
+            ERRORS.labels('http').inc()
+        REQUEST_LATENCY.labels(request.method, _route(request), str(status)).observe(time.perf_counter() - start)
+
+
+def _multiprocess():
+    return bool(os.getenv('PROMETHEUS_MULTIPROC_DIR'))
+
+
+def register_gauges(sources):
+    """
+    export ค่าจาก stats() ของ service ต่าง ๆ เป็น gauge
+    sources: {ชื่อ metric: callable ที่คืนตัวเลข}
+    process เดียว: อ่านค่าตอน scrape; หลาย worker: ค่าถูกเขียนโดย refresh_gauges() (รวมทุก worker)
+    """
+    for name, fn in sources.items():
+        if _multiprocess():
+            _sources[name] = (Gauge(f'predictor_{name}', name.replace('_', ' '), multiprocess_mode='livesum'), fn)
+        else:
+            Gauge(f'predictor_{name}', name.replace('_', ' ')).set_function(fn)
+
+
+def refresh_gauges():
+    """อัปเดต gauge ของ register_gauges (ใช้เมื่อรันหลาย worker ซึ่งอ่านค่าตอน scrape ข้าม process ไม่ได้)"""
+    for name, (gauge, fn) in _sources.items():
+        try:
+            gauge.set(fn())
+        except Exception:
+            logger.exception("Failed to refresh gauge %s", name)
+
+
+def observe_process(snapshot):
+    """บันทึก snapshot จาก process_stats.snapshot() เป็น gauge"""
+    for kind in ('rss', 'pss', 'shared', 'private'):
+        if snapshot.get(f'{kind}_kb') is not None:
+            PROCESS_MEMORY.labels(kind).set(snapshot[f'{kind}_kb'] * 1024)
+    for kind in ('os', 'python', 'torch', 'cv2'):
+        if snapshot.get(f'{kind}_threads') is not None:
+            PROCESS_THREADS.labels(kind).set(snapshot[f'{kind}_threads'])
+
+
+def metrics_response():
+    """
+    ข้อมูลสำหรับ Prometheus scrape
+    ถ้ารันหลาย worker process (ตั้ง PROMETHEUS_MULTIPROC_DIR) จะรวมค่าจากทุก process
+    """
+    if _multiprocess():
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,123 @@
+## app/utils/process_stats.py
+import os
+import sys
+import json
+import time
+import threading
+import logging
+
+# ตั้งค่า logging
+logger = logging.getLogger(__name__)
+
+
+def memory():
+    """
+    หน่วยความจำของ process นี้ (KiB) จาก /proc/self/smaps_rollup
+    - pss: หน้าที่ share กับ process อื่น (เช่น weights ที่ fork มาจาก process แม่) ถูกหารตามจำนวน process
+      ผลรวม pss ของทุก worker = หน่วยความจำที่ใช้จริงของทั้งกลุ่ม
+    - shared / private: หน้าที่ยัง share อยู่ / ถูกเขียนแล้ว (copy-on-write) หรือเป็นของ process นี้เอง
+    """
+    fields = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        # ไม่ใช่ Linux: มีแค่ peak RSS
+        import resource
+
+        return {'rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+    return {
+        'rss_kb': fields.get('Rss'),
+        'pss_kb': fields.get('Pss'),
+        'shared_kb': fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0),
+        'private_kb': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+    }
+
+
+def _os_threads():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('Threads:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def threads():
+    """จำนวน thread: ทั้ง process (รวม thread pool ของ torch / OpenMP), Python, และค่าที่ตั้งให้ torch / OpenCV"""
+    info = {'os_threads': _os_threads(), 'python_threads': threading.active_count()}
+    # module อาจยัง import ไม่เสร็จ (เช่นระหว่างโหลดโมเดลใน background) จึงใช้ getattr แทนการเรียกตรง ๆ
+    get_torch_threads = getattr(sys.modules.get('torch'), 'get_num_threads', None)
+    if get_torch_threads is not None:
+        info['torch_threads'] = get_torch_threads()
+    get_cv2_threads = getattr(sys.modules.get('cv2'), 'getNumThreads', None)
+    if get_cv2_threads is not None:
+        info['cv2_threads'] = get_cv2_threads()
+    return info
+
+
+def snapshot(role='worker'):
+    return {'pid': os.getpid(), 'role': role, 'time': time.time(), **memory(), **threads()}
+
+
+def write_report(directory, snap):
+    """เขียน snapshot ของ process นี้เป็น <directory>/<role>-<pid>.json (atomic)"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{snap['role']}-{snap['pid']}.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(snap, f)
+    os.replace(tmp_path, path)
+
+
+def remove_report(directory, pid, role='worker'):
+    try:
+        os.remove(os.path.join(directory, f"{role}-{pid}.json"))
+    except FileNotFoundError:
+        pass
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read_reports(directory):
+    """snapshot ล่าสุดของทุก process ที่ยังทำงานอยู่ (เรียงตาม role, pid)"""
+    reports = []
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return reports
+    for name in names:
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                snap = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if _alive(snap['pid']):
+            reports.append(snap)
+    return sorted(reports, key=lambda s: (s['role'] != 'parent', s['pid']))
+
+
+def summarize(reports):
+    """รวมหน่วยความจำของ worker ทั้งหมด: pss รวมคือหน่วยความจำจริงของทั้งกลุ่ม"""
+    workers = [r for r in reports if r['role'] == 'worker']
+    total = {'workers': len(workers)}
+    for key in ('rss_kb', 'pss_kb', 'private_kb'):
+        values = [r[key] for r in workers if r.get(key) is not None]
+        if values:
+            total[key] = sum(values)
+    return total
@@ -0,0 +1,49 @@
+## app/utils/profiling.py
+import time
+import threading
+import contextvars
+
+# profile ของ request ปัจจุบัน (None = ไม่ได้ profile) — ผูกกับ asyncio task ของ request
+_current = contextvars.ContextVar('request_profile', default=None)
+
+
+class StageLog:
+    """บันทึกเวลาของแต่ละขั้นใน request ที่ถูก profile (เขียนได้จากหลาย thread)"""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self.stages = []
+
+    def add(self, stage, start, duration, **extra):
+        entry = {
+            'stage': stage,
+            'start_ms': round((start - self.started) * 1000, 3),
+            'duration_ms': round(duration * 1000, 3),
+            'thread': threading.current_thread().name,
+            **extra,
+        }
+        with self._lock:
+            self.stages.append(entry)
+
+
+def current_log():
+    return _current.get()
+
+
+def activate(log):
+    """ตั้ง log ให้ task ปัจจุบัน; คืน token สำหรับ deactivate"""
+    return _current.set(log)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def record_stage(stage, start, duration, log=None, **extra):
+    """
+    บันทึกขั้นลง profile ของ request (ถ้ามี)
+    log: ส่งมาเองเมื่อรันบน thread อื่นที่ไม่เห็น context ของ request (เช่น inference pool)
+    """
+    log = log or _current.get()
+    if log is not None:
+        log.add(stage, start, duration, **extra)
@@ -0,0 +1,69 @@
+## benchmarks/compare.py
+"""
+เทียบผล benchmark สองไฟล์ (เช่นก่อน/หลัง commit) ต่อ input / density / stage
+
+    python -m benchmarks.compare benchmarks/results/abc123.json benchmarks/results/def456.json --threshold 0.15
+
+คืน exit code 1 ถ้ามีขั้นใดที่ p95 latency หรือ peak memory เพิ่มเกิน threshold (สัดส่วน)
+"""
+import sys
+import json
+import argparse
+
+METRICS = ('p50_ms', 'p95_ms', 'peak_mem_kb')
+# ไม่นับการเปลี่ยนแปลงที่เล็กกว่านี้ (ms / KiB) ว่าเป็น regression เพราะอยู่ในระดับ noise
+MIN_DELTA = {'p50_ms': 0.05, 'p95_ms': 0.1, 'peak_mem_kb': 64}
+
+
+def _index(report):
+    return {
+        (case['input'], case['density'], stage): values
+        for case in report['cases']
+        for stage, values in case['stages'].items()
+    }
+
+
+def compare(base, head, threshold):
+    """คืน (rows, regressions); rows = [(input, density, stage, metric, base, head, ratio), ...]"""
+    base_idx, head_idx = _index(base), _index(head)
+    rows, regressions = [], []
+    for key in sorted(base_idx.keys() & head_idx.keys(), key=str):
+        for metric in METRICS:
+            old, new = base_idx[key][metric], head_idx[key][metric]
+            ratio = new / old if old else None
+            row = (*key, metric, old, new, ratio)
+            rows.append(row)
+            if metric != 'p50_ms' and ratio is not None and ratio > 1 + threshold \
+                    and new - old > MIN_DELTA[metric]:
+                regressions.append(row)
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark JSON reports")
+    parser.add_argument('base')
+    parser.add_argument('head')
+    parser.add_argument('--threshold', type=float, default=0.1, help="allowed relative increase (0.1 = 10%%)")
+    args = parser.parse_args(argv)
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+    print(f"base {base['meta'].get('commit')}  ->  head {head['meta'].get('commit')}")
+
+    rows, regressions = compare(base, head, args.threshold)
+    for name, density, stage, metric, old, new, ratio in rows:
+        change = f"{(ratio - 1) * 100:+.1f}%" if ratio is not None else "n/a"
+        print(f"{name:<28} {str(density):<6} {stage:<17} {metric:<12} {old:>10} -> {new:>10}  {change}")
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}:")
+        for name, density, stage, metric, old, new, ratio in regressions:
+            print(f"  {name} density={density} {stage} {metric}: {old} -> {new} ({(ratio - 1) * 100:+.1f}%)")
+        return 1
+    print("\nNo regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
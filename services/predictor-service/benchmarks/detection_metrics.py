@@ -0,0 +1,85 @@
+## benchmarks/detection_metrics.py
+"""
+mAP ของ detection เทียบกับ ground truth (แบบเดียวกับ ultralytics val: AP แบบ 101 จุด, IoU 0.50:0.95)
+"""
+import numpy as np
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+
+
+def box_iou(a, b):
+    """IoU ระหว่างกล่อง xyxy สองชุด: (N, 4), (M, 4) -> (N, M)"""
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float64).reshape(-1, 4)
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(rb - lt, 0, None).prod(axis=2)
+    area_a = (a[:, 2:] - a[:, :2]).prod(axis=1)
+    area_b = (b[:, 2:] - b[:, :2]).prod(axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def match(pred_xyxy, pred_cls, pred_conf, gt_xyxy, gt_cls, thresholds=IOU_THRESHOLDS):
+    """
+    จับคู่ prediction กับ ground truth ของหนึ่งภาพ (greedy ตาม confidence, class ต้องตรงกัน)
+    คืน tp: (N, T) bool ว่า prediction แต่ละกล่องเป็น true positive ที่ IoU threshold ใด
+    """
+    tp = np.zeros((len(pred_cls), len(thresholds)), dtype=bool)
+    if not len(pred_cls) or not len(gt_cls):
+        return tp
+    iou = box_iou(pred_xyxy, gt_xyxy)
+    iou[np.asarray(pred_cls)[:, None] != np.asarray(gt_cls)[None, :]] = 0
+    order = np.argsort(-np.asarray(pred_conf), kind='stable')
+    for t, threshold in enumerate(thresholds):
+        taken = np.zeros(len(gt_cls), dtype=bool)
+        for i in order:
+            candidates = np.where(~taken & (iou[i] >= threshold), iou[i], -1)
+            j = candidates.argmax()
+            if candidates[j] >= 0:
+                taken[j] = True
+                tp[i, t] = True
+    return tp
+
+
+def average_precision(recall, precision):
+    """พื้นที่ใต้ precision envelope แบบ 101 จุด (COCO)"""
+    mrec = np.concatenate(([0.0], recall, [1.0]))
+    mpre = np.concatenate(([1.0], precision, [0.0]))
+    mpre = np.flip(np.maximum.accumulate(np.flip(mpre)))
+    x = np.linspace(0, 1, 101)
+    y = np.interp(x, mrec, mpre)
+    return float(((x[1:] - x[:-1]) * (y[1:] + y[:-1]) / 2).sum())
+
+
+def mean_average_precision(tp, conf, pred_cls, gt_cls):
+    """
+    tp / conf / pred_cls: ของทุก prediction ในชุดข้อมูล (ต่อกันทุกภาพ), gt_cls: class ของทุก ground truth
+    คืน {'map50', 'map50_95', 'per_class': {class_id: {'ap50', 'ap50_95', 'gt', 'pred'}}}
+    class ที่ไม่มี ground truth ไม่ถูกนับ
+    """
+    tp, conf = np.asarray(tp, dtype=bool).reshape(-1, len(IOU_THRESHOLDS)), np.asarray(conf)
+    pred_cls, gt_cls = np.asarray(pred_cls, dtype=int), np.asarray(gt_cls, dtype=int)
+    order = np.argsort(-conf, kind='stable')
+    tp, pred_cls = tp[order], pred_cls[order]
+
+    per_class = {}
+    for c in np.unique(gt_cls):
+        mask = pred_cls == c
+        n_gt = int((gt_cls == c).sum())
+        hits = tp[mask]
+        ap = np.zeros(len(IOU_THRESHOLDS))
+        if len(hits):
+            tpc = hits.cumsum(axis=0)
+            fpc = (~hits).cumsum(axis=0)
+            recall = tpc / n_gt
+            precision = tpc / (tpc + fpc)
+            ap = np.array([average_precision(recall[:, t], precision[:, t]) for t in range(len(IOU_THRESHOLDS))])
+        per_class[int(c)] = {'ap50': round(float(ap[0]), 4), 'ap50_95': round(float(ap.mean()), 4),
+                             'gt': n_gt, 'pred': int(mask.sum())}
+    if not per_class:
+        return {'map50': None, 'map50_95': None, 'per_class': {}}
+    return {
+        'map50': round(float(np.mean([v['ap50'] for v in per_class.values()])), 4),
+        'map50_95': round(float(np.mean([v['ap50_95'] for v in per_class.values()])), 4),
+        'per_class': per_class,
+    }
@@ -0,0 +1,462 @@
+## benchmarks/evaluate.py
+"""
+เทียบ backend / ขนาด input / confidence threshold / โมเดล quantized บนชุดข้อมูลที่มี label
+รายงาน mAP, ความตรงกันของจำนวนต่อ well และผลต่อเพลต (ResultProcessor), latency และหน่วยความจำ เทียบกันทีละ config
+
+    cd services/predictor-service
+    pip install -r benchmarks/requirements.txt          # onnx (--variants int8) และ PyYAML (data.yaml) เพิ่มจาก service
+    python -m benchmarks.evaluate --data datasets/train-service/dataset/data.yaml.zip
+    python -m benchmarks.evaluate --data /data/microplate/data.yaml --split val \\
+        --backends torch,onnx --imgsz 640,960,1280 --conf 0.25,0.4 --variants fp32,int8
+    python -m benchmarks.evaluate --data ../../raw_images       # ไม่มี label: วัดเฉพาะความตรงกัน / latency / memory
+
+--data: data.yaml ของ YOLO, zip ที่มี data.yaml หรือ directory ของภาพ (label อยู่ใน labels/ คู่กับ images/)
+config แรก (ค่าแรกของ --backends / --variants / --imgsz / --conf) เป็นค่าอ้างอิงของความตรงกันต่อ well / เพลต
+และถ้ามี label จะเทียบกับ ground truth (label ที่ผ่านการจับคู่ well แบบเดียวกับโมเดล) ด้วย
+แต่ละ config รันใน process แยก เพื่อให้ RSS ของโมเดลและ peak RSS เป็นของ config นั้นเท่านั้น
+int8: dynamic quantization ของ ONNX Runtime (เฉพาะ backend onnx) เก็บไว้ข้างโมเดลเป็น <ชื่อ>.int8.onnx
+ผลลัพธ์เขียนเป็น JSON ที่ benchmarks/results/eval-<commit>.json
+"""
+import sys
+import json
+import time
+import zipfile
+import argparse
+import resource
+import tempfile
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from app.config import Config
+from app.services.grid_builder_service import GridBuilder
+from app.services.inference_backend_service import InferenceBackend, Detections, create_backend
+from app.services.predictor_service import Predictor
+from app.services.result_processor_service import ResultProcessor, PlateResult
+from app.utils.process_stats import memory
+from benchmarks.detection_metrics import match, mean_average_precision
+from benchmarks.pipeline import SERVICE_DIR, RESULTS_DIR, summarize, git_commit
+
+BUNDLED_DATASET = SERVICE_DIR / "datasets" / "train-service" / "dataset" / "data.yaml.zip"
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff')
+VARIANTS = ('fp32', 'int8')
+
+
+# ---------------------------------------------------------------- dataset
+
+def open_dataset(data, split, workdir):
+    """คืน (รายการ path ของภาพ, names จาก data.yaml หรือ None)"""
+    path = Path(data)
+    if not path.exists():
+        raise SystemExit(f"Dataset {path} does not exist")
+    if path.suffix == '.zip':
+        if not zipfile.is_zipfile(path):
+            head = path.read_bytes()[:32]
+            raise SystemExit(
+                f"{path} is not a zip archive ({path.stat().st_size} bytes: {head!r}), so the labelled dataset "
+                "is not in this checkout. Pass --data with a YOLO data.yaml, a zip of the dataset or a directory "
+                "of plate images (e.g. ../../raw_images for agreement/latency/memory without mAP)."
+            )
+        with zipfile.ZipFile(path) as zf:
+            zf.extractall(workdir)
+        yamls = sorted(Path(workdir).rglob('data.yaml')) or sorted(Path(workdir).rglob('*.y*ml'))
+        path = yamls[0] if yamls else Path(workdir)
+    if path.suffix in ('.yaml', '.yml'):
+        return _from_yaml(path, split)
+    return image_files(path, split), None
+
+
+def _from_yaml(path, split):
+    import yaml
+
+    cfg = yaml.safe_load(path.read_text())
+    root = Path(cfg.get('path') or path.parent)
+    if not root.is_absolute():
+        root = path.parent / root
+    if not root.exists():
+        # path ใน data.yaml มักเป็น path บนเครื่องที่ใช้ train
+        root = path.parent
+    entries = cfg.get(split)
+    if not entries:
+        raise SystemExit(f"{path} has no '{split}' split (available: {[k for k in ('train', 'val', 'test') if k in cfg]})")
+    images = []
+    for entry in entries if isinstance(entries, list) else [entries]:
+        target = root / entry
+        if target.suffix == '.txt':
+            images += [root / line.strip() for line in target.read_text().splitlines() if line.strip()]
+        else:
+            images += image_files(target)
+    names = cfg.get('names')
+    if isinstance(names, list):
+        names = dict(enumerate(names))
+    return images, names
+
+
+def image_files(directory, split=None):
+    directory = Path(directory)
+    candidates = [directory / 'images' / split, directory / split / 'images'] if split else []
+    for candidate in candidates + [directory / 'images', directory]:
+        if candidate.is_dir():
+            files = sorted(p for p in candidate.rglob('*') if p.suffix.lower() in IMAGE_SUFFIXES)
+            if files:
+                return files
+    return []
+
+
+def load_labels(image_path, shape):
+    """label แบบ YOLO (.../labels/<ชื่อ>.txt, bbox หรือ polygon) -> (xyxy พิกเซล, cls) หรือ None ถ้าไม่มี label"""
+    parts = list(Path(image_path).parts)
+    if 'images' not in parts:
+        return None
+    index = len(parts) - 1 - parts[::-1].index('images')
+    parts[index] = 'labels'
+    label = Path(*parts).with_suffix('.txt')
+    if not label.exists():
+        return None
+    h, w = shape[:2]
+    boxes, classes = [], []
+    for line in label.read_text().splitlines():
+        values = [float(v) for v in line.split()]
+        if len(values) < 5:
+            continue
+        coords = np.asarray(values[1:]).reshape(-1, 2) * (w, h)
+        if len(values) == 5:
+            (cx, cy), (bw, bh) = coords
+            boxes.append((cx - bw / 2, cy - bh / 2, cx + bw / 2, cy + bh / 2))
+        else:
+            boxes.append((*coords.min(axis=0), *coords.max(axis=0)))
+        classes.append(int(values[0]))
+    return np.asarray(boxes, dtype=np.float32).reshape(-1, 4), np.asarray(classes, dtype=int)
+
+
+# ---------------------------------------------------------------- backends
+
+class Recorder(InferenceBackend):
+    """ห่อ backend จริง: เก็บ detection ดิบ (ใช้คำนวณ mAP) และเวลาของโมเดลใน batch ล่าสุด"""
+    def __init__(self, backend):
+        self.backend = backend
+        self.name = backend.name
+        self.names = backend.names
+        self.last = None
+        self.elapsed = 0.0
+
+    def predict_batch(self, images):
+        start = time.perf_counter()
+        self.last = self.backend.predict_batch(images)
+        self.elapsed = time.perf_counter() - start
+        return self.last
+
+
+class FixedBackend(InferenceBackend):
+    """คืน detection ที่กำหนด (ground truth) เพื่อผ่านการจับคู่ well แบบเดียวกับโมเดล"""
+    name = 'ground_truth'
+
+    def __init__(self, names):
+        self.names = names
+        self.detections = Detections.empty()
+
+    def predict_batch(self, images):
+        return [self.detections for _ in images]
+
+
+def quantized_model(path):
+    """ONNX dynamic quantization (weights เป็น uint8) คงชื่อคลาส / imgsz ใน metadata ของโมเดลเดิม"""
+    import onnx
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    path = Path(path)
+    out = path.with_suffix('.int8.onnx')
+    if not out.exists() or out.stat().st_mtime < path.stat().st_mtime:
+        quantize_dynamic(str(path), str(out), weight_type=QuantType.QUInt8)
+        source, quantized = onnx.load(str(path)), onnx.load(str(out))
+        if not quantized.metadata_props:
+            quantized.metadata_props.extend(source.metadata_props)
+            onnx.save(quantized, str(out))
+    return out
+
+
+def build_configs(args):
+    configs, skipped = [], []
+    for backend, variant, imgsz, conf in itertools.product(args.backends, args.variants, args.imgsz, args.conf):
+        config = {'backend': backend, 'variant': variant, 'imgsz': imgsz, 'conf': conf, 'iou': args.iou}
+        if variant == 'int8' and backend != 'onnx':
+            skipped.append({**config, 'reason': "int8 is only available for the onnx backend"})
+            continue
+        model = args.torch_model if backend == 'torch' else args.onnx_model
+        if not model or not Path(model).exists():
+            skipped.append({**config, 'reason': f"model not found: {model!r}"})
+            continue
+        config['model'] = str(quantized_model(model) if variant == 'int8' else model)
+        configs.append(config)
+    return configs, skipped
+
+
+def config_name(config):
+    return f"{config['backend']}/{config['variant']}/imgsz={config['imgsz'] or 'model'}/conf={config['conf']}"
+
+
+# ---------------------------------------------------------------- per-config run (child process)
+
+def evaluate_config(config, image_paths, warmup, threads):
+    """รันหนึ่ง config กับทุกภาพ (ใน process ของตัวเอง); คืนผลต่อภาพ + latency + memory"""
+    if threads:
+        cv2.setNumThreads(threads)
+        if config['backend'] == 'torch':
+            import torch
+
+            torch.set_num_threads(threads)
+    grid = GridBuilder()
+    processor = ResultProcessor()
+    kwargs = {'conf': config['conf'], 'iou': config['iou'], 'imgsz': config['imgsz'] or None}
+    if config['backend'] == 'onnx':
+        kwargs['threads'] = threads
+
+    rss_before = memory()['rss_kb']
+    start = time.perf_counter()
+    recorder = Recorder(create_backend(config['backend'], config['model'], **kwargs))
+    load_s = time.perf_counter() - start
+    predictor = Predictor(None, backend=recorder, box_scale=grid.scale)
+
+    first = cv2.imread(str(image_paths[0]))
+    for _ in range(warmup):
+        predictor.predict(first, grid.wells())
+    model_rss = memory()['rss_kb'] - rss_before
+
+    infer, plate, images = [], [], []
+    for path in image_paths:
+        img = cv2.imread(str(path))
+        start = time.perf_counter()
+        wells = predictor.predict(img, grid.wells())
+        processed = processor.process(wells)
+        plate.append(time.perf_counter() - start)
+        infer.append(recorder.elapsed)
+        det = recorder.last[0]
+        images.append({
+            'xyxy': det.xyxy, 'cls': det.cls.astype(int), 'conf': det.conf,
+            'wells': PlateResult.from_wells(wells).counts,
+            'plate': processed,
+        })
+    return {
+        'load_s': round(load_s, 3),
+        'model_rss_kb': model_rss,
+        # ru_maxrss เป็น KiB บน Linux; process นี้รันแค่ config เดียว
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'input_size': getattr(recorder.backend, 'imgsz', None),
+        'names': recorder.names,
+        'latency': summarize(infer),
+        'plate_latency': summarize(plate),
+        'images': images,
+    }
+
+
+def run_isolated(config, image_paths, warmup, threads):
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(evaluate_config, config, [str(p) for p in image_paths], warmup, threads).result()
+
+
+# ---------------------------------------------------------------- comparison
+
+def ground_truth(image_paths, names):
+    """ground truth ต่อภาพ: กล่อง + ผลต่อ well / เพลตจากการจับคู่ well แบบเดียวกับโมเดล (None ถ้าไม่มี label)"""
+    grid = GridBuilder()
+    processor = ResultProcessor()
+    fixed = FixedBackend(names or {})
+    predictor = Predictor(None, backend=fixed, box_scale=grid.scale)
+    truth = []
+    for path in image_paths:
+        img = cv2.imread(str(path))
+        if img is None:
+            raise SystemExit(f"Cannot read image {path}")
+        labels = load_labels(path, img.shape)
+        if labels is None:
+            truth.append(None)
+            continue
+        xyxy, cls = labels
+        fixed.detections = Detections(xyxy, cls, np.ones(len(cls), dtype=np.float32))
+        wells = predictor.predict(img, grid.wells()) if names else None
+        truth.append({
+            'xyxy': xyxy, 'cls': cls,
+            'wells': PlateResult.from_wells(wells).counts if wells is not None else None,
+            'plate': processor.process(wells) if wells is not None else None,
+        })
+    return truth
+
+
+def well_agreement(a, b):
+    """สัดส่วน well ที่จำนวน detection ทุกคลาสตรงกัน (a, b: PlateResult.counts)"""
+    zeros = np.zeros((8, 12), dtype=np.int32)
+    agree = np.ones((8, 12), dtype=bool)
+    for name in set(a) | set(b):
+        agree &= a.get(name, zeros) == b.get(name, zeros)
+    return float(agree.mean())
+
+
+def agreement(images, reference, names):
+    """ความตรงกันต่อ well (เฉลี่ย) และต่อเพลต (ผลของ ResultProcessor เหมือนกันทั้งหมด) เทียบกับ reference"""
+    wells, plates, mismatched = [], [], []
+    for name, mine, ref in zip(names, images, reference):
+        if ref is None or ref['wells'] is None:
+            continue
+        wells.append(well_agreement(mine['wells'], ref['wells']))
+        same = mine['plate'] == ref['plate']
+        plates.append(same)
+        if not same:
+            mismatched.append(name)
+    if not plates:
+        return None
+    return {
+        'well_agreement': round(float(np.mean(wells)), 4),
+        'plate_identical': round(float(np.mean(plates)), 4),
+        'mismatched_plates': mismatched[:20],
+    }
+
+
+def detection_map(images, truth):
+    tp, conf, pred_cls, gt_cls = [], [], [], []
+    for mine, gt in zip(images, truth):
+        if gt is None:
+            continue
+        tp.append(match(mine['xyxy'], mine['cls'], mine['conf'], gt['xyxy'], gt['cls']))
+        conf.append(mine['conf'])
+        pred_cls.append(mine['cls'])
+        gt_cls.append(gt['cls'])
+    if not gt_cls:
+        return None
+    return mean_average_precision(np.concatenate(tp), np.concatenate(conf),
+                                  np.concatenate(pred_cls), np.concatenate(gt_cls))
+
+
+def recommend(results):
+    """config ที่เร็วที่สุด (p50 ของโมเดล) ที่ผลต่อเพลตเหมือน config อ้างอิงทุกภาพ"""
+    candidates = [r for r in results if r['vs_reference'] and r['vs_reference']['plate_identical'] == 1.0]
+    return min(candidates, key=lambda r: r['latency']['p50_ms'])['name'] if candidates else None
+
+
+def print_table(results):
+    header = (f"{'config':<40} {'mAP50':>6} {'mAP50-95':>8} {'well=':>6} {'plate=':>6} {'well=gt':>7} "
+              f"{'plate=gt':>8} {'p50 ms':>8} {'p95 ms':>8} {'model MiB':>9} {'peak MiB':>8}")
+    print(header)
+    print('-' * len(header))
+
+    def fmt(value, width, digits=3):
+        return f"{value:>{width}.{digits}f}" if value is not None else f"{'-':>{width}}"
+
+    for r in results:
+        det = r['map'] or {}
+        ref = r['vs_reference'] or {}
+        gt = r['vs_ground_truth'] or {}
+        print(f"{r['name']:<40} {fmt(det.get('map50'), 6)} {fmt(det.get('map50_95'), 8)} "
+              f"{fmt(ref.get('well_agreement'), 6)} {fmt(ref.get('plate_identical'), 6)} "
+              f"{fmt(gt.get('well_agreement'), 7)} {fmt(gt.get('plate_identical'), 8)} "
+              f"{fmt(r['latency']['p50_ms'], 8, 1)} {fmt(r['latency']['p95_ms'], 8, 1)} "
+              f"{fmt(r['model_rss_kb'] / 1024, 9, 1)} {fmt(r['peak_rss_kb'] / 1024, 8, 1)}")
+
+
+# ---------------------------------------------------------------- main
+
+def run(args):
+    with tempfile.TemporaryDirectory(prefix="eval-data-") as workdir:
+        image_paths, names = open_dataset(args.data, args.split, workdir)
+        if args.limit:
+            image_paths = image_paths[:args.limit]
+        if not image_paths:
+            raise SystemExit(f"No images found in {args.data} (split '{args.split}')")
+        configs, skipped = build_configs(args)
+        for item in skipped:
+            print(f"skip {config_name(item)}: {item['reason']}")
+        if not configs:
+            raise SystemExit("Nothing to evaluate (check --backends / --torch-model / --onnx-model)")
+
+        labels = [p.name for p in image_paths]
+        truth = ground_truth(image_paths, names)
+        labelled = sum(t is not None for t in truth)
+        print(f"{len(image_paths)} images ({labelled} labelled), {len(configs)} configs\n")
+
+        results, reference = [], None
+        for config in configs:
+            name = config_name(config)
+            print(f"running {name} ...", flush=True)
+            out = run_isolated(config, image_paths, args.warmup, args.threads)
+            if names is None and truth and out['names']:
+                # data.yaml ไม่มีชื่อคลาส: ใช้ชื่อจากโมเดลเพื่อจับคู่ ground truth กับ well
+                names = out['names']
+                truth = ground_truth(image_paths, names)
+            images = out.pop('images')
+            if reference is None:
+                reference = images
+            results.append({
+                'name': name,
+                **config,
+                **{k: v for k, v in out.items() if k != 'names'},
+                'map': detection_map(images, truth) if labelled else None,
+                'vs_reference': agreement(images, reference, labels),
+                'vs_ground_truth': agreement(images, truth, labels) if labelled else None,
+            })
+
+    print()
+    print_table(results)
+    best = recommend(results)
+    print(f"\nreference: {results[0]['name']}")
+    print(f"fastest config with identical plate results: {best or 'none'}")
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'dataset': str(args.data),
+            'split': args.split,
+            'images': len(image_paths),
+            'labelled': labelled,
+            'threads': args.threads,
+            'warmup': args.warmup,
+        },
+        'reference': results[0]['name'],
+        'recommended': best,
+        'results': results,
+        'skipped': skipped,
+    }
+
+
+def _csv(cast):
+    return lambda text: [cast(v) for v in text.split(',') if v != '']
+
+
+def parse_args(argv=None):
+    default_onnx = Config.ONNX_MODEL_PATH or (
+        str(Path(Config.MODEL_PATH).with_suffix('.onnx')) if Config.MODEL_PATH else '')
+    parser = argparse.ArgumentParser(description="Accuracy vs speed of inference backends and settings")
+    parser.add_argument('--data', default=str(BUNDLED_DATASET), help="data.yaml, dataset zip or image directory")
+    parser.add_argument('--split', default='val')
+    parser.add_argument('--limit', type=int, default=0, help="evaluate only the first N images (0 = all)")
+    parser.add_argument('--backends', type=_csv(str), default=['torch'], help="torch,onnx")
+    parser.add_argument('--variants', type=_csv(str), default=['fp32'], help="fp32,int8 (int8: onnx only)")
+    parser.add_argument('--imgsz', type=_csv(int), default=[0], help="input sizes, 0 = model default")
+    parser.add_argument('--conf', type=_csv(float), default=[Config.CONF_THRESHOLD])
+    parser.add_argument('--iou', type=float, default=Config.IOU_THRESHOLD)
+    parser.add_argument('--torch-model', default=Config.MODEL_PATH)
+    parser.add_argument('--onnx-model', default=default_onnx)
+    parser.add_argument('--threads', type=int, default=0, help="torch / ONNX Runtime / OpenCV threads (0 = default)")
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--out', help="output JSON (default: benchmarks/results/eval-<commit>.json)")
+    args = parser.parse_args(argv)
+    unknown = set(args.variants) - set(VARIANTS)
+    if unknown:
+        parser.error(f"unknown variants {sorted(unknown)}, expected {VARIANTS}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run(args)
+    out = Path(args.out) if args.out else RESULTS_DIR / f"eval-{report['meta']['commit'] or 'local'}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2, default=str))
+    print(f"Wrote {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+## benchmarks/stub_backend.py
+import zlib
+import numpy as np
+
+from app.services.inference_backend_service import InferenceBackend, Detections
+
+NAMES = {0: 'Flowing', 1: 'Other'}
+
+
+class StubBackend(InferenceBackend):
+    """
+    backend จำลองที่ให้ผลเหมือนเดิมทุกครั้ง (ไม่ต้องมีโมเดลจริง) สำหรับ benchmark
+    - สร้าง density bbox ต่อภาพ วางอยู่ใน well ของกริด (จึงผ่านการจับคู่ well ทุกกล่อง)
+    - seed มาจาก crc32 ของ pixel ภาพ: ภาพเดียวกันได้ผลเดียวกันเสมอ
+    grid_builder: ใช้หาตำแหน่ง well ในพิกัดของภาพ input (หารด้วย scale ของกริด)
+    """
+    name = 'stub'
+    names = NAMES
+
+    def __init__(self, grid_builder, density=30, box_size=40):
+        self.density = density
+        self.box_size = box_size
+        bounds = np.array([(*w['top_left'], *w['bottom_right']) for w in grid_builder.wells()], dtype=np.float32)
+        self.bounds = bounds / grid_builder.scale
+
+    def detect(self, image):
+        if self.density <= 0:
+            return Detections.empty()
+        rng = np.random.default_rng(zlib.crc32(image[::16, ::16].tobytes()))
+        wells = self.bounds[rng.integers(0, len(self.bounds), self.density)]
+        size = np.minimum(self.box_size, (wells[:, 2:] - wells[:, :2]).min(axis=1) - 2)[:, None]
+        # มุมซ้ายบนสุ่มภายใน well โดยให้กล่องยังอยู่ใน well ทั้งกล่อง
+        room = (wells[:, 2:] - wells[:, :2]) - size - 2
+        x0y0 = wells[:, :2] + 1 + rng.random((self.density, 2)) * room
+        xyxy = np.hstack([x0y0, x0y0 + size])
+        cls = rng.integers(0, len(NAMES), self.density)
+        conf = rng.uniform(0.4, 1.0, self.density)
+        return Detections(xyxy, cls, conf)
+
+    def predict_batch(self, images):
+        return [self.detect(image) for image in images]